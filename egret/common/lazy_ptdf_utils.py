@@ -66,6 +66,16 @@ def populate_default_ptdf_options(ptdf_options):
         ptdf_options['active_flow_tol'] = 50.
     if 'lp_cleanup_phase' not in ptdf_options:
         ptdf_options['lp_cleanup_phase'] = True
+    if 'save_factorization_path' not in ptdf_options:
+        ptdf_options['save_factorization_path'] = None
+    if 'linear_solver' not in ptdf_options:
+        ptdf_options['linear_solver'] = 'superlu'
+    if 'row_cache_size' not in ptdf_options:
+        ptdf_options['row_cache_size'] = None
+    if 'dense_ptdf_dtype' not in ptdf_options:
+        ptdf_options['dense_ptdf_dtype'] = 'float64'
+    if 'cycle_space_ptdf' not in ptdf_options:
+        ptdf_options['cycle_space_ptdf'] = False
     return ptdf_options
 
 def check_and_scale_ptdf_options(ptdf_options, baseMVA):
@@ -433,8 +443,7 @@ def check_violations(mb, md, PTDF, max_viol_add, time=None, prepend_str=""):
         lazy_contingency_limits_lower = -PTDF.lazy_contingency_limits - PFV
         enforced_contingency_limits_upper = PTDF.enforced_contingency_limits - PFV
         enforced_contingency_limits_lower = -PTDF.enforced_contingency_limits - PFV
-        for cn in PTDF.contingency_compensators:
-            PFV_delta = PTDF.calculate_masked_PFV_delta(cn, PFV, VA)
+        for cn, PFV_delta in PTDF.calculate_masked_PFV_deltas(PFV, VA):
             violations_store.check_and_add_violations('contingency', PFV_delta, mb.pfc,
                                                       lazy_contingency_limits_upper, enforced_contingency_limits_upper,
                                                       lazy_contingency_limits_lower, enforced_contingency_limits_lower,
@@ -590,6 +599,15 @@ def _iter_over_viol_set(viol_set, mb, PTDF, abs_ptdf_tol, rel_ptdf_tol, solver=N
     else:
         persistent_solver = False
 
+    ## calculate all the PTDF rows we need at once
+    PTDF._get_ptdf_rows(PTDF.branches_keys_masked[i] for i in viol_set)
+    if pq_model:
+        PTDF._get_qtdf_rows(PTDF.branches_keys_masked[i] for i in viol_set)
+    if pfl_in_mb:
+        PTDF._get_pldf_rows(PTDF.branches_keys_masked[i] for i in viol_set)
+    if qfl_in_mb:
+        PTDF._get_qldf_rows(PTDF.branches_keys_masked[i] for i in viol_set)
+
     for i in viol_set:
         bn = PTDF.branches_keys_masked[i]
         if pf_is_var and mb.pf[bn].value is None:
@@ -659,6 +677,7 @@ def _iter_over_vm_viol_set(vm_viol_set, mb, PTDF, abs_ptdf_tol, rel_ptdf_tol, so
 
 ## helper for generating pfi
 def _iter_over_int_viol_set(int_viol_set, mb, PTDF, abs_ptdf_tol, rel_ptdf_tol):
+    PTDF._get_interface_rows(PTDF.interface_keys[i] for i in int_viol_set)
     for i in int_viol_set:
         i_n = PTDF.interface_keys[i]
         if mb.pfi[i_n].expr is None:
@@ -668,6 +687,7 @@ def _iter_over_int_viol_set(int_viol_set, mb, PTDF, abs_ptdf_tol, rel_ptdf_tol):
 
 ## helper for generating pfc
 def _iter_over_cont_viol_set(cont_viol_set, mb, PTDF, abs_ptdf_tol, rel_ptdf_tol):
+    PTDF._get_contingency_rows((cn, PTDF.branches_keys_masked[i_b]) for (cn, i_b) in cont_viol_set)
     for (cn, i_b) in cont_viol_set:
         bn = PTDF.branches_keys_masked[i_b]
         if (cn, bn) not in mb._contingency_set:
@@ -12,15 +12,141 @@ This module contains several helper functions and classes that are useful when
 modifying the data dictionary
 """
 import abc
+import os
 import pickle
+import hashlib
+import threading
+import weakref
 import numpy as np
 import scipy.sparse as sp
+try:
+    ## private scipy routine; B_dA@VA_delta is used if it moves
+    from scipy.sparse._sparsetools import csr_matvec
+    csr_matvec_available = True
+except ImportError:
+    csr_matvec_available = False
 import egret.model_library.transmission.tx_calc as tx_calc
 
 from egret.model_library.defn import BasePointType, ApproximationType
 from egret.common.log import logger
-from math import radians
-from pyomo.environ import value
+from functools import partial
+from itertools import compress
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from pyomo.environ import value, Var
+
+PTDFRowData = namedtuple('PTDFRowData', ['buses', 'row', 'abs_max', 'const'])
+
+class _lazy_attribute:
+    '''
+    Decorator for a method computing an attribute on first access;
+    the result is stored on the instance, so later accesses are plain
+    attribute lookups (functools.cached_property needs Python 3.8)
+    '''
+    def __init__(self, func):
+        self._func = func
+        self._name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self._func(instance)
+        instance.__dict__[self._name] = value
+        return value
+
+class _LRURowCache(OrderedDict):
+    '''
+    dict of rows holding at most maxsize of them; once full,
+    setting a new row evicts the least recently used one, and
+    calls on_evict with its key (if given)
+    '''
+    def __init__(self, maxsize, on_evict=None):
+        super().__init__()
+        self.maxsize = maxsize
+        self._on_evict = on_evict
+
+    def __getitem__(self, key):
+        row = super().__getitem__(key)
+        self.move_to_end(key)
+        return row
+
+    def __setitem__(self, key, row):
+        super().__setitem__(key, row)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            evicted, _ = self.popitem(last=False)
+            if self._on_evict is not None:
+                self._on_evict(evicted)
+
+def _row_cache(maxsize, on_evict=None):
+    ## plain dicts when the cache is unbounded
+    if maxsize is None:
+        return dict()
+    return _LRURowCache(maxsize, on_evict)
+
+class _DenseRowCache(Mapping):
+    '''
+    Cache of sensitivity rows, stored in dense blocks of consecutive
+    rows that are allocated the first time one of their rows is set,
+    plus a mask of the rows computed so far. Behaves like a dict from
+    key to row.
+    '''
+    ## target size of one block of rows, in bytes
+    _block_bytes = 1 << 22
+
+    def __init__(self, key_to_index, row_len):
+        self._key_to_index = key_to_index
+        self._keys = tuple(key_to_index.keys())
+        self._row_len = row_len
+        ## as many rows per block as fit in _block_bytes, so large
+        ## networks hold little more than the rows actually computed
+        self._block_rows = int(min(max(self._block_bytes // (8*max(row_len,1)), 1), 256))
+        self._blocks = dict()
+        self.computed = np.zeros(len(key_to_index), dtype=bool)
+
+    def __getitem__(self, key):
+        idx = self._key_to_index[key]
+        if not self.computed[idx]:
+            raise KeyError(key)
+        block_idx, row_idx = divmod(idx, self._block_rows)
+        return self._blocks[block_idx][row_idx]
+
+    def __setitem__(self, key, row):
+        idx = self._key_to_index[key]
+        block_idx, row_idx = divmod(idx, self._block_rows)
+        block = self._blocks.get(block_idx)
+        if block is None:
+            block = self._blocks[block_idx] = np.empty((self._block_rows, self._row_len))
+        block[row_idx] = row
+        self.computed[idx] = True
+
+    def __contains__(self, key):
+        idx = self._key_to_index.get(key)
+        return idx is not None and self.computed[idx]
+
+    def __iter__(self):
+        return (self._keys[idx] for idx in np.flatnonzero(self.computed))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.computed))
+
+    def row_sum(self):
+        '''
+        returns the sum of the computed rows, accumulated in place
+        one block at a time
+        '''
+        total = np.zeros(self._row_len)
+        for block_idx, block in self._blocks.items():
+            start = block_idx*self._block_rows
+            computed = self.computed[start:start+self._block_rows]
+            total += block[:len(computed)][computed].sum(axis=0)
+        return total
+
+def _factorization_header(topology_hash):
+    ## first line of a saved factorization file
+    return b'egret-ptdf-factorization ' + topology_hash.encode('ascii') + b'\n'
 
 class _PTDFManagerBase(abc.ABC):
     @abc.abstractmethod
@@ -35,6 +161,37 @@ class _PTDFManagerBase(abc.ABC):
     def get_branch_ptdf_const(self, branch_name):
         pass
 
+    def _get_nw_array(self, mb, component_name, keys):
+        '''
+        returns the values of mb.<component_name> over keys
+        as an array
+        '''
+        ## cache the component data for each block, so we only
+        ## index into the component once; only the data objects
+        ## are cached, and their values are read on every call.
+        ## The data are gathered again if the component is replaced
+        block_cache = self._nw_cache.get(mb)
+        if block_cache is None:
+            block_cache = self._nw_cache[mb] = dict()
+        component = getattr(mb, component_name)
+        cached = block_cache.get(component_name)
+        if cached is None or cached[0] is not component:
+            cached = block_cache[component_name] = (component, [ component[k] for k in keys ], isinstance(component, Var))
+        _, data, is_var = cached
+        if is_var:
+            return np.fromiter((v.value for v in data), float, count=len(data))
+        return np.fromiter((value(v) for v in data), float, count=len(data))
+
+    def get_branch_ptdf_data(self, branch_name):
+        '''
+        returns a PTDFRowData (buses, row, abs_max, const)
+        for a given branch_name
+        '''
+        buses, row = zip(*self.get_branch_ptdf_iterator(branch_name))
+        return PTDFRowData(buses, np.array(row),
+                           self.get_branch_ptdf_abs_max(branch_name),
+                           self.get_branch_ptdf_const(branch_name))
+
     @abc.abstractmethod
     def get_interface_const(self, interface_name):
         pass
@@ -111,10 +268,17 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         # the PTDF factorization code eliminates the reference bus from the associated
         # matrices, so we need to handle that fact smoothly
         self.buses_keys_no_ref = tuple( bus for bus in self.buses_keys if bus != reference_bus )
+        self._ref_bus_idx = self._busname_to_index_map[reference_bus]
 
         self.branch_limits_array = np.fromiter((branches[branch]['rating_long_term'] for branch in self.branches_keys), float, count=len(self.branches_keys))
         self.branch_limits_array.flags.writeable = False
 
+        ## bus indices of each branch, and the base kV of
+        ## each bus (inf where missing), for filtering
+        self._from_idx = np.fromiter((self._busname_to_index_map[branches[bn]['from_bus']] for bn in self.branches_keys), np.int64, count=len(self.branches_keys))
+        self._to_idx = np.fromiter((self._busname_to_index_map[branches[bn]['to_bus']] for bn in self.branches_keys), np.int64, count=len(self.branches_keys))
+        self._bus_kv = np.fromiter((buses[b].get('base_kv', np.inf) for b in self.buses_keys), float, count=len(self.buses_keys))
+
         if interfaces is None:
             interfaces = dict()
         self.interfaces = interfaces
@@ -126,26 +290,93 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         self._calculate_contingency_limits()
 
         self._base_point = base_point
+        self._ptdf_options = ptdf_options
         self._calculate_factorization()
         self._mw_only = True
 
         self._set_lazy_limits(ptdf_options)
-        self._ptdf_options = ptdf_options
 
         # we'll cache the PTDF rows
         # we've calculated thus far
         # to prevent doing extra work
-        # (esp. important for UC)
-        self._ptdf_rows = dict()
-        self._interface_rows = dict()
-        self._contingency_rows = dict()
-
-        # dense array write buffer
-        self._bus_sensi_buffer = np.empty((1,len(self.buses_keys_no_ref)), dtype=np.float64)
+        # (esp. important for UC),
+        # optionally bounded by ptdf_options['row_cache_size']
+        row_cache_size = ptdf_options.get('row_cache_size')
+        self._ptdf_rows = _row_cache(row_cache_size, self._evict_ptdf_row)
+        self._ptdf_abs_max = dict()
+        self._interface_rows = _row_cache(row_cache_size)
+        self._interface_abs_max = dict()
+        self._contingency_rows = _row_cache(row_cache_size)
+        self._contingency_abs_max = dict()
+
+        # constant cache
+        self._ptdf_const = dict()
+        self._ptdf_data = dict()
+        self._interface_const = dict()
+        self._contingency_const = dict()
+
+        # net withdrawal component data, by block
+        self._nw_cache = weakref.WeakKeyDictionary()
+
+        # dense array write buffer; the first row is used
+        # for single solves, and the whole pool for batches
+        self._rhs_pool = np.empty((64,len(self.buses_keys_no_ref)), dtype=np.float64)
+
+    def _topology_hash(self):
+        ## everything which determines the factorization
+        topology = (self.branches_keys, self.buses_keys, self._reference_bus, self._base_point,
+                    tuple(self._branches[bn] for bn in self.branches_keys),
+                    tuple(self._buses[b] for b in self.buses_keys),
+                    self.contingencies, self.interfaces)
+        return hashlib.blake2b(pickle.dumps(topology)).hexdigest()
+
+    def _load_factorization(self, path, topology_hash):
+        if not os.path.exists(path):
+            return None
+        ## the topology hash is stored as a header line, so
+        ## a factorization for another network is never unpickled
+        with open(path, 'rb') as f:
+            if f.readline() != _factorization_header(topology_hash):
+                return None
+            saved = pickle.load(f)
+        logger.info("Loading PTDF Matrix Factorization from {}".format(path))
+        MLU = tx_calc._TriangularLU(saved['L'], saved['U'], saved['perm_r'], saved['perm_c'])
+        contingency_compensators = tx_calc.rebuild_contingency_compensators(MLU, saved['compensators'])
+        return MLU, saved['B_dA'], saved['ref_bus_mask'], contingency_compensators, saved['B_dA_I'], saved['I']
+
+    def _save_factorization(self, path, topology_hash, MLU, B_dA, ref_bus_mask, contingency_compensators, B_dA_I, I):
+        if not hasattr(MLU, 'perm_r'):
+            logger.warning("WARNING: can only save SuperLU factorizations, not saving to {}".format(path))
+            return
+        ## SuperLU objects cannot be pickled, so we save
+        ## their factors and permutations instead
+        compensators = { cn : (cc.M, cc.c, cc.W, cc.Wbar, cc.phi_compensator, cc.VA_compensator, cc.branch_out)
+                            for cn, cc in contingency_compensators.items() }
+        saved = { 'L' : MLU.L.tocsc(),
+                  'U' : MLU.U.tocsc(),
+                  'perm_r' : MLU.perm_r,
+                  'perm_c' : MLU.perm_c,
+                  'B_dA' : B_dA,
+                  'ref_bus_mask' : ref_bus_mask,
+                  'compensators' : compensators,
+                  'B_dA_I' : B_dA_I,
+                  'I' : I,
+                }
+        with open(path, 'wb') as f:
+            f.write(_factorization_header(topology_hash))
+            pickle.dump(saved, f)
 
     def _calculate_factorization(self):
-        logger.info("Calculating PTDF Matrix Factorization")
-        MLU, B_dA, ref_bus_mask, contingency_compensators, B_dA_I, I = \
+        path = self._ptdf_options.get('save_factorization_path')
+        if path is not None:
+            topology_hash = self._topology_hash()
+            factorization = self._load_factorization(path, topology_hash)
+        else:
+            factorization = None
+
+        if factorization is None:
+            logger.info("Calculating PTDF Matrix Factorization")
+            factorization = \
                 tx_calc.calculate_ptdf_factorization(self._branches,
                                                      self._buses,self.branches_keys,
                                                      self.buses_keys,
@@ -155,10 +386,20 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
                                                      mapping_bus_to_idx=self._busname_to_index_map,
                                                      mapping_branch_to_idx=self._branchname_to_index_map,
                                                      interfaces = self.interfaces,
-                                                     index_set_interface = self.interface_keys,)
+                                                     index_set_interface = self.interface_keys,
+                                                     linear_solver = self._ptdf_options.get('linear_solver', 'superlu'))
+            if path is not None:
+                self._save_factorization(path, topology_hash, *factorization)
+
+        MLU, B_dA, ref_bus_mask, contingency_compensators, B_dA_I, I = factorization
 
         self.MLU = MLU
+        self._set_solvers()
         self.B_dA = B_dA
+        ## B_dA comes back in CSC, which is efficient for the
+        ## matrix-vector products; keep a CSR copy for row access
+        self.B_dA_csr = B_dA.tocsr()
+        self.B_dA_csr.sum_duplicates()
         self.ref_bus_mask = ref_bus_mask
         self.contingency_compensators = contingency_compensators
         self.B_dA_I = B_dA_I
@@ -167,6 +408,13 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         self._calculate_phi_adjust(ref_bus_mask)
 
         self.phase_shift_flow_adjuster_array_interface = I@self.phase_shift_flow_adjuster_array
+        self._psfa_interface_flat = self.phase_shift_flow_adjuster_array_interface.toarray().ravel()
+
+    def _set_solvers(self):
+        ## bind the transposed and non-transposed solves
+        ## once, for use in the hot loops below
+        self._solve_T = partial(self.MLU.solve, trans='T')
+        self._solve_N = partial(self.MLU.solve, trans='N')
 
     def _calculate_interface_limits(self):
         self.interface_keys = tuple(self.interfaces.keys())
@@ -174,26 +422,15 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         self.interfacename_to_index_map = \
                 { i_n: idx for idx, i_n in enumerate(self.interface_keys) }
 
-        def _interface_limit_iter(limit, inf):
-            for i_n in self.interface_keys:
-                interface = self.interfaces[i_n]
-                if limit in interface and interface[limit] is not None:
-                    yield interface[limit]
-                else:
-                    yield inf
-        self.interface_max_limits = np.fromiter(_interface_limit_iter('maximum_limit', np.inf), float, count=len(self.interface_keys))
-        self.interface_min_limits = np.fromiter(_interface_limit_iter('minimum_limit', -np.inf), float, count=len(self.interface_keys))
+        def _interface_limits(limit, inf):
+            limits = [ self.interfaces[i_n].get(limit) for i_n in self.interface_keys ]
+            return np.array([ inf if l is None else l for l in limits ], dtype=float)
+        self.interface_max_limits = _interface_limits('maximum_limit', np.inf)
+        self.interface_min_limits = _interface_limits('minimum_limit', -np.inf)
 
     def _calculate_contingency_limits(self):
         if self.contingencies:
-            def _contingency_limit_iter():
-                for bn in self.branches_keys:
-                    branch = self._branches[bn]
-                    if 'rating_emergency' in branch:
-                        yield branch['rating_emergency']
-                    else:
-                        yield np.inf
-            self.contingency_limits_array = np.fromiter(_contingency_limit_iter(), float, count=len(self.branches_keys))
+            self.contingency_limits_array = np.array([ self._branches[bn].get('rating_emergency', np.inf) for bn in self.branches_keys ], dtype=float)
         else:
             self.contingency_limits_array = np.empty(shape=(len(self.branches_keys),0)) # create an empty array for slicing on
         self.branch_limits_array.flags.writeable = False
@@ -205,10 +442,12 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
                                                         mapping_bus_to_idx=self._busname_to_index_map)
 
         self.phi_adjust_array = phi_adjust_array[ref_bus_mask]
+        self._phi_adjust_dense = self.phi_adjust_array.toarray().ravel()
 
     def _calculate_phase_shift_flow_adjuster(self):
         self.phase_shift_flow_adjuster_array = \
                 tx_calc.calculate_phase_shift_flow_adjuster(self._branches, self.branches_keys)
+        self._psfa_flat = self.phase_shift_flow_adjuster_array.toarray().ravel()
 
     def _get_filtered_lines(self, ptdf_options):
         if ptdf_options['branch_kv_threshold'] is None:
@@ -217,47 +456,38 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
             self.branches_keys_masked = self.branches_keys
             self.branchname_to_index_masked_map = self._branchname_to_index_map
             self.B_dA_masked = self.B_dA
+            self.B_dA_masked_csr = self.B_dA_csr
             self.phase_shift_flow_adjuster_array_masked = self.phase_shift_flow_adjuster_array
+            self._psfa_masked_flat = self._psfa_flat
             self.branch_limits_array_masked = self.branch_limits_array
             self.contingency_limits_array_masked = self.contingency_limits_array
             return
 
-        branches = self._branches
-        buses = self._buses
-        branch_mask = list()
         one = (ptdf_options['kv_threshold_type'] == 'one')
         kv_limit = ptdf_options['branch_kv_threshold']
 
-        for i, bn in enumerate(self.branches_keys):
-            branch = branches[bn]
-            fb = buses[branch['from_bus']]
-
-            fbt = True
-            ## NOTE: this warning will be printed only once if we just check the from_bus
-            if 'base_kv' not in fb:
+        for i in np.flatnonzero(np.isinf(self._bus_kv[self._from_idx])):
+            branch = self._branches[self.branches_keys[i]]
+            if 'base_kv' not in self._buses[branch['from_bus']]:
                 logger.warning("WARNING: did not find 'base_kv' for bus {}, considering it large for the purposes of filtering".format(branch['from_bus']))
-            elif fb['base_kv'] < kv_limit:
-                fbt = False
-
-            if fbt and one:
-                branch_mask.append(i)
-                continue
 
-            tb = buses[branch['to_bus']]
-            tbt = False
-            if ('base_kv' not in tb) or tb['base_kv'] >= kv_limit:
-                tbt = True
-
-            if fbt and tbt:
-                branch_mask.append(i)
-            elif one and tbt:
-                branch_mask.append(i)
+        ## per-bus bitmap, gathered onto the branch endpoints
+        kv_ok = self._bus_kv >= kv_limit
+        fbt = kv_ok[self._from_idx]
+        tbt = kv_ok[self._to_idx]
+        if one:
+            keep = fbt | tbt
+        else:
+            keep = fbt & tbt
+        branch_mask = np.flatnonzero(keep)
 
-        self.branch_mask = np.array(branch_mask)
-        self.branches_keys_masked = tuple(self.branches_keys[i] for i in self.branch_mask)
+        self.branch_mask = branch_mask
+        self.branches_keys_masked = tuple(compress(self.branches_keys, keep))
         self.branchname_to_index_masked_map = { bn : i for i,bn in enumerate(self.branches_keys_masked) }
         self.B_dA_masked = self.B_dA[branch_mask]
+        self.B_dA_masked_csr = self.B_dA_masked.tocsr()
         self.phase_shift_flow_adjuster_array_masked = self.phase_shift_flow_adjuster_array[branch_mask]
+        self._psfa_masked_flat = self._psfa_flat[branch_mask]
         self.branch_limits_array_masked = self.branch_limits_array[branch_mask]
         self.contingency_limits_array_masked = self.contingency_limits_array[branch_mask]
 
@@ -274,29 +504,40 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
             lazy_flow_tol = ptdf_options['lazy_rel_flow_tol']
 
             ## only enforce the relative and absolute, within tollerance
-            self.enforced_branch_limits = np.maximum(branch_limits*(1+rel_flow_tol), branch_limits+abs_flow_tol)
-            self.enforced_contingency_limits = np.maximum(contingency_limits*(1+rel_flow_tol), contingency_limits+abs_flow_tol)
+            ## (computed in place to avoid full-length temporaries)
+            tmp = np.add(branch_limits, abs_flow_tol)
+            self.enforced_branch_limits = np.multiply(branch_limits, 1+rel_flow_tol)
+            np.maximum(self.enforced_branch_limits, tmp, out=self.enforced_branch_limits)
+            tmp = np.add(contingency_limits, abs_flow_tol)
+            self.enforced_contingency_limits = np.multiply(contingency_limits, 1+rel_flow_tol)
+            np.maximum(self.enforced_contingency_limits, tmp, out=self.enforced_contingency_limits)
+
             ## make sure the lazy limits are a superset of the enforce limits
-            self.lazy_branch_limits = np.minimum(branch_limits*(1+lazy_flow_tol), self.enforced_branch_limits)
-            self.lazy_contingency_limits = np.minimum(contingency_limits*(1+lazy_flow_tol), self.enforced_contingency_limits)
+            self.lazy_branch_limits = np.multiply(branch_limits, 1+lazy_flow_tol)
+            np.minimum(self.lazy_branch_limits, self.enforced_branch_limits, out=self.lazy_branch_limits)
+            self.lazy_contingency_limits = np.multiply(contingency_limits, 1+lazy_flow_tol)
+            np.minimum(self.lazy_contingency_limits, self.enforced_contingency_limits, out=self.lazy_contingency_limits)
+
             abs_max_limits_i = np.abs(interface_max_limits)
             abs_min_limits_i = np.abs(interface_min_limits)
 
-            self.enforced_interface_max_limits = \
-                np.maximum(interface_max_limits+rel_flow_tol*abs_max_limits_i,
-                            interface_max_limits+abs_flow_tol)
+            tmp = np.add(interface_max_limits, abs_flow_tol)
+            self.enforced_interface_max_limits = np.multiply(abs_max_limits_i, rel_flow_tol)
+            self.enforced_interface_max_limits += interface_max_limits
+            np.maximum(self.enforced_interface_max_limits, tmp, out=self.enforced_interface_max_limits)
 
-            self.enforced_interface_min_limits = \
-                np.minimum(interface_min_limits-rel_flow_tol*abs_min_limits_i,
-                            interface_min_limits-abs_flow_tol)
+            tmp = np.subtract(interface_min_limits, abs_flow_tol)
+            self.enforced_interface_min_limits = np.multiply(abs_min_limits_i, -rel_flow_tol)
+            self.enforced_interface_min_limits += interface_min_limits
+            np.minimum(self.enforced_interface_min_limits, tmp, out=self.enforced_interface_min_limits)
 
-            self.lazy_interface_max_limits = \
-                    np.minimum(interface_max_limits+lazy_flow_tol*abs_max_limits_i,
-                                self.enforced_interface_max_limits)
+            self.lazy_interface_max_limits = np.multiply(abs_max_limits_i, lazy_flow_tol, out=abs_max_limits_i)
+            self.lazy_interface_max_limits += interface_max_limits
+            np.minimum(self.lazy_interface_max_limits, self.enforced_interface_max_limits, out=self.lazy_interface_max_limits)
 
-            self.lazy_interface_min_limits = \
-                    np.maximum(interface_min_limits-lazy_flow_tol*abs_min_limits_i,
-                                self.enforced_interface_min_limits)
+            self.lazy_interface_min_limits = np.multiply(abs_min_limits_i, -lazy_flow_tol, out=abs_min_limits_i)
+            self.lazy_interface_min_limits += interface_min_limits
+            np.maximum(self.lazy_interface_min_limits, self.enforced_interface_min_limits, out=self.lazy_interface_min_limits)
 
     def _get_ptdf_row(self, branch_name):
         if branch_name in self._ptdf_rows:
@@ -304,10 +545,27 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         else:
             # calculate row
             branch_idx = self._branchname_to_index_map[branch_name]
-            PTDF_row = -self.MLU.solve(self.B_dA[branch_idx].toarray(out=self._bus_sensi_buffer)[0], trans='T')
+            PTDF_row = -self._solve_T(self._fill_rhs(self.B_dA_csr, branch_idx))
             self._ptdf_rows[branch_name] = PTDF_row
+            self._ptdf_abs_max[branch_name] = np.abs(PTDF_row).max()
         return PTDF_row
 
+    def _evict_ptdf_row(self, branch_name):
+        ## the cached PTDFRowData also holds the row
+        self._ptdf_data.pop(branch_name, None)
+
+    def _fill_rhs(self, sensi_csr, idx):
+        '''
+        writes row idx of the (canonical) CSR matrix sensi_csr
+        into the dense write buffer straight from its indices
+        and data, and returns the buffer
+        '''
+        rhs = self._rhs_pool[0]
+        rhs.fill(0.)
+        start, end = sensi_csr.indptr[idx], sensi_csr.indptr[idx+1]
+        rhs[sensi_csr.indices[start:end]] = sensi_csr.data[start:end]
+        return rhs
+
     def _get_contingency_row(self, contingency_name, branch_name):
         if (contingency_name, branch_name) in self._contingency_rows:
             cont_PTDF_row = self._contingency_rows[contingency_name,branch_name]
@@ -315,11 +573,18 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
             ## TODO: should we be using post-compensation if the PTDF row is already calculated?
             branch_idx = self._branchname_to_index_map[branch_name]
             cc = self.contingency_compensators[contingency_name]
-            hatF = cc.U.solve((self.B_dA[branch_idx]@cc.Pc).toarray(out=self._bus_sensi_buffer)[0], 'T')
+            ## permute the right-hand side by index rather than
+            ## through the sparse permutation matrices
+            rhs = self._rhs_pool[0]
+            rhs.fill(0.)
+            start, end = self.B_dA_csr.indptr[branch_idx], self.B_dA_csr.indptr[branch_idx+1]
+            rhs[cc.perm_c[self.B_dA_csr.indices[start:end]]] = self.B_dA_csr.data[start:end]
+            hatF = cc.U.solve(rhs, 'T')
             delF = cc.Wbar*((-cc.c)*(cc.W.T@hatF))
-            cont_PTDF_row = cc.Pr.T@cc.L.solve(hatF+delF, 'T')
+            cont_PTDF_row = cc.L.solve(hatF+delF, 'T')[cc.perm_r]
             #print(f"contingency row: {cont_PTDF_row}")
             self._contingency_rows[contingency_name, branch_name] = cont_PTDF_row
+            self._contingency_abs_max[contingency_name, branch_name] = np.abs(cont_PTDF_row).max()
         return cont_PTDF_row
 
     def _get_interface_row(self, interface_name):
@@ -328,10 +593,131 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
             I_row = self._interface_rows[interface_name]
         else:
             interface_idx = self.interfacename_to_index_map[interface_name]
-            I_row = self.MLU.solve(self.B_dA_I[interface_idx].toarray(out=self._bus_sensi_buffer)[0], trans='T')
+            I_row = self._solve_T(self.B_dA_I[interface_idx].toarray(out=self._rhs_pool[0:1])[0])
             self._interface_rows[interface_name] = I_row
+            self._interface_abs_max[interface_name] = np.abs(I_row).max()
         return I_row
 
+    def _get_rhs_buffer(self, k):
+        '''
+        returns a (k, n_bus) view into the dense write buffer,
+        doubling the buffer until it has at least k rows
+        '''
+        pool_k = self._rhs_pool.shape[0]
+        if k > pool_k:
+            while pool_k < k:
+                pool_k *= 2
+            self._rhs_pool = np.empty((pool_k,self._rhs_pool.shape[1]), dtype=np.float64)
+        return self._rhs_pool[:k]
+
+    def _batch_solve(self, sensi_matrix, indices):
+        '''
+        solves against the rows sensi_matrix[indices] with a single
+        multiple right-hand side call to MLU.solve; returns one
+        solution per row
+        '''
+        RHS = sensi_matrix[indices].toarray(out=self._get_rhs_buffer(len(indices)))
+        return np.ascontiguousarray(self._solve_T(RHS.T).T)
+
+    def _get_ptdf_rows(self, branch_names):
+        '''
+        calculates and caches the PTDF rows for all of branch_names
+        not already in the cache
+        '''
+        to_calc = [ bn for bn in dict.fromkeys(branch_names) if bn not in self._ptdf_rows ]
+        if not to_calc:
+            return
+        branch_idxs = [ self._branchname_to_index_map[bn] for bn in to_calc ]
+        PTDF_rows = -self._batch_solve(self.B_dA_csr, branch_idxs)
+        abs_maxes = np.abs(PTDF_rows).max(axis=1)
+        for bn, PTDF_row, abs_max in zip(to_calc, PTDF_rows, abs_maxes):
+            self._ptdf_rows[bn] = PTDF_row
+            self._ptdf_abs_max[bn] = abs_max
+
+    def _calculate_contingency_rows(self, contingency_name, branch_names, out=None):
+        '''
+        returns the contingency PTDF rows for branch_names under
+        contingency_name, densifying the right-hand side into out
+        if it is given
+        '''
+        branch_idxs = [ self._branchname_to_index_map[bn] for bn in branch_names ]
+        cc = self.contingency_compensators[contingency_name]
+        RHS = (self.B_dA_csr[branch_idxs]@cc.Pc).toarray(out=out)
+        hatF = cc.U.solve(RHS.T, 'T')
+        delF = cc.Wbar@((-cc.c)*(cc.W.T@hatF))
+        return np.ascontiguousarray(cc.L.solve(hatF+delF, 'T')[cc.perm_r].T)
+
+    def _missing_contingency_rows(self, contingency_branch_names):
+        ## group the uncached (contingency_name, branch_name)
+        ## pairs by contingency
+        by_contingency = dict()
+        for cn, bn in dict.fromkeys(contingency_branch_names):
+            if (cn, bn) not in self._contingency_rows:
+                by_contingency.setdefault(cn, []).append(bn)
+        return by_contingency
+
+    def _get_contingency_rows(self, contingency_branch_names):
+        '''
+        calculates and caches the contingency PTDF rows for all the
+        (contingency_name, branch_name) pairs not already in the cache
+        '''
+        for cn, branch_names in self._missing_contingency_rows(contingency_branch_names).items():
+            cont_PTDF_rows = self._calculate_contingency_rows(cn, branch_names,
+                                                              out=self._get_rhs_buffer(len(branch_names)))
+            abs_maxes = np.abs(cont_PTDF_rows).max(axis=1)
+            for bn, cont_PTDF_row, abs_max in zip(branch_names, cont_PTDF_rows, abs_maxes):
+                self._contingency_rows[cn, bn] = cont_PTDF_row
+                self._contingency_abs_max[cn, bn] = abs_max
+
+    def precompute_contingency_rows(self, contingency_branch_names=None, max_workers=None):
+        '''
+        calculates and caches the contingency PTDF rows for the given
+        (contingency_name, branch_name) pairs, by default every monitored
+        branch under every contingency, using a thread pool with one
+        task per contingency (SuperLU releases the GIL while solving)
+
+        Parameters
+        ----------
+        contingency_branch_names : iterable of (contingency_name, branch_name) pairs, optional
+        max_workers : number of threads, optional (default os.cpu_count())
+        '''
+        if contingency_branch_names is None:
+            contingency_branch_names = ( (cn, bn) for cn in self.contingency_compensators
+                                                   for bn in self.branches_keys_masked )
+        by_contingency = self._missing_contingency_rows(contingency_branch_names)
+        if not by_contingency:
+            return
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        lock = threading.Lock()
+        def _worker(cn, branch_names):
+            cont_PTDF_rows = self._calculate_contingency_rows(cn, branch_names)
+            abs_maxes = np.abs(cont_PTDF_rows).max(axis=1)
+            with lock:
+                for bn, cont_PTDF_row, abs_max in zip(branch_names, cont_PTDF_rows, abs_maxes):
+                    self._contingency_rows[cn, bn] = cont_PTDF_row
+                    self._contingency_abs_max[cn, bn] = abs_max
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            ## list forces any exceptions to be raised here
+            list(executor.map(_worker, by_contingency.keys(), by_contingency.values()))
+
+    def _get_interface_rows(self, interface_names):
+        '''
+        calculates and caches the interface rows for all of interface_names
+        not already in the cache
+        '''
+        to_calc = [ i_n for i_n in dict.fromkeys(interface_names) if i_n not in self._interface_rows ]
+        if not to_calc:
+            return
+        interface_idxs = [ self.interfacename_to_index_map[i_n] for i_n in to_calc ]
+        I_rows = self._batch_solve(self.B_dA_I, interface_idxs)
+        abs_maxes = np.abs(I_rows).max(axis=1)
+        for i_n, I_row, abs_max in zip(to_calc, I_rows, abs_maxes):
+            self._interface_rows[i_n] = I_row
+            self._interface_abs_max[i_n] = abs_max
+
     def get_branch_ptdf_iterator(self, branch_name):
         '''
         returns a (bus_name, coefficient) iterator for a given branch_name
@@ -343,19 +729,36 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         returns the maximum of the absolute value for any coefficent
         in branch_name's ptdf row
         '''
-        ptdf_row = self._get_ptdf_row(branch_name)
-        return np.abs(ptdf_row).max()
+        if branch_name not in self._ptdf_abs_max:
+            self._get_ptdf_row(branch_name)
+        return self._ptdf_abs_max[branch_name]
 
     def get_branch_ptdf_const(self, branch_name):
         '''
         returns the constant coefficient for branch_name 's 
         power flow equation (given bus net withdrawls)
         '''
+        if branch_name in self._ptdf_const:
+            return self._ptdf_const[branch_name]
         ptdf_row = self._get_ptdf_row(branch_name)
         branch_idx = self._branchname_to_index_map[branch_name]
-        phi_adj = ptdf_row@self.phi_adjust_array
             ## phi adj   +     phase shift
-        return phi_adj[0]+self.phase_shift_flow_adjuster_array[branch_idx,0]
+        const = ptdf_row@self._phi_adjust_dense + self._psfa_flat[branch_idx]
+        self._ptdf_const[branch_name] = const
+        return const
+
+    def get_branch_ptdf_data(self, branch_name):
+        '''
+        returns a PTDFRowData (buses, row, abs_max, const)
+        for a given branch_name
+        '''
+        if branch_name in self._ptdf_data:
+            return self._ptdf_data[branch_name]
+        data = PTDFRowData(self.buses_keys_no_ref, self._get_ptdf_row(branch_name),
+                           self.get_branch_ptdf_abs_max(branch_name),
+                           self.get_branch_ptdf_const(branch_name))
+        self._ptdf_data[branch_name] = data
+        return data
 
     def get_contingency_branch_ptdf_iterator(self, contingency_name, branch_name):
         '''
@@ -368,41 +771,50 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         returns the maximum of the absolute value for any coefficent
         in branch_name's ptdf row
         '''
-        ptdf_row = self._get_contingency_row(contingency_name, branch_name)
-        return np.abs(ptdf_row).max()
+        if (contingency_name, branch_name) not in self._contingency_abs_max:
+            self._get_contingency_row(contingency_name, branch_name)
+        return self._contingency_abs_max[contingency_name, branch_name]
 
     def get_contingency_branch_const(self, contingency_name, branch_name):
         '''
         returns the constant coefficient for branch_name 's 
         power flow equation (given bus net withdrawls)
         '''
+        if (contingency_name, branch_name) in self._contingency_const:
+            return self._contingency_const[contingency_name, branch_name]
         ptdf_row = self._get_contingency_row(contingency_name, branch_name)
         branch_idx = self._branchname_to_index_map[branch_name]
 
         phi_compensator = self.contingency_compensators[contingency_name].phi_compensator
 
-        phi_adj = ptdf_row@(self.phi_adjust_array+phi_compensator)
+        phi_adj = ptdf_row@self._phi_adjust_dense + (ptdf_row@phi_compensator)[0]
             ## phi adj   +     phase shift
-        return phi_adj[0]+self.phase_shift_flow_adjuster_array[branch_idx,0]
+        const = phi_adj + self._psfa_flat[branch_idx]
+        self._contingency_const[contingency_name, branch_name] = const
+        return const
 
     def get_interface_const(self, interface_name):
         '''
         Returns the constant coefficient for interface_names 's 
         power flow equation (given bus net withdrawls)
         '''
+        if interface_name in self._interface_const:
+            return self._interface_const[interface_name]
         I_row = self._get_interface_row(interface_name)
         i_idx = self.interfacename_to_index_map[interface_name]
-        phi_adj = I_row@self.phi_adjust_array
             ## phi adj   +     phase shift
-        return phi_adj[0]+self.phase_shift_flow_adjuster_array_interface[i_idx,0]
+        const = I_row@self._phi_adjust_dense + self._psfa_interface_flat[i_idx]
+        self._interface_const[interface_name] = const
+        return const
 
     def get_interface_ptdf_abs_max(self, interface_name):
         '''
         Returns the maximum of the absolute value for any coefficent
         in branch_name's PTDF row
         '''
-        I_row = self._get_interface_row(interface_name)
-        return np.abs(I_row).max()
+        if interface_name not in self._interface_abs_max:
+            self._get_interface_row(interface_name)
+        return self._interface_abs_max[interface_name]
 
     def get_interface_ptdf_iterator(self, interface_name):
         '''
@@ -411,10 +823,13 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         yield from zip(self.buses_keys_no_ref, self._get_interface_row(interface_name))
 
     def _insert_reference_bus(self, bus_array, val):
-        return np.insert(bus_array, self._busname_to_index_map[self._reference_bus], val)
+        full_array = np.empty(len(self.buses_keys), dtype=np.result_type(bus_array, val))
+        full_array[self.ref_bus_mask] = bus_array
+        full_array[self._ref_bus_idx] = val
+        return full_array
 
     def _remove_reference_bus(self, bus_array):
-        return np.delete(bus_array, self._busname_to_index_map[self._reference_bus])
+        return bus_array[self.ref_bus_mask]
 
     def _calculate_PFV_delta(self, cn, PFV, VA, masked):
         comp = self.contingency_compensators[cn]
@@ -432,12 +847,19 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
             VA0 = VA
 
         #TODO: need to think about the VA_delta since base case is linear AC (from MLU) and contingency is DC power flow
-        VA_delta = self.MLU.solve( (comp.M *((-comp.c)*(comp.M.T@VA0))) )
+        VA_delta = self._solve_N( (comp.M *((-comp.c)*(comp.M.T@VA0))) )
         if VA_comp:
             VA_delta += comp.VA_compensator
 
-        if masked:
-            PF_delta = self.B_dA_masked@VA_delta
+        if masked and csr_matvec_available:
+            ## row-major product straight into the output;
+            ## csr_matvec accumulates, hence the zeros
+            B_dA = self.B_dA_masked_csr
+            PF_delta = np.zeros(B_dA.shape[0])
+            csr_matvec(B_dA.shape[0], B_dA.shape[1], B_dA.indptr, B_dA.indices,
+                       B_dA.data, VA_delta, PF_delta)
+        elif masked:
+            PF_delta = self.B_dA_masked_csr@VA_delta
         else:
             PF_delta = self.B_dA@VA_delta
         #print(f'PF_delta: {PF_delta}')
@@ -452,44 +874,91 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
 
         return PF_delta
 
+    def _calculate_contingency_arrays(self):
+        ## structure-of-arrays view of the contingency compensators,
+        ## for calculating the flows for many contingencies at once
+        compensators = tuple(self.contingency_compensators.values())
+        self._comp_keys = tuple(self.contingency_compensators.keys())
+        self._comp_index = { cn : j for j, cn in enumerate(self._comp_keys) }
+        if compensators:
+            self._comp_M = sp.hstack([comp.M for comp in compensators], format='csc')
+        else:
+            self._comp_M = sp.csc_matrix((len(self.buses_keys_no_ref), 0))
+        self._comp_c = np.array([comp.c for comp in compensators], dtype=float)
+        self._comp_branch_out = tuple(comp.branch_out for comp in compensators)
+        self._comp_VA_compensator = { j : comp.VA_compensator for j, comp in enumerate(compensators)
+                                        if comp.VA_compensator is not None }
+
+    def _calculate_PFV_deltas(self, PFV, VA, masked, contingencies=None, chunk_size=64):
+        if not hasattr(self, '_comp_M'):
+            self._calculate_contingency_arrays()
+        if contingencies is None:
+            comp_idxs = list(range(len(self._comp_keys)))
+        else:
+            comp_idxs = [ self._comp_index[cn] for cn in contingencies ]
+
+        if masked:
+            B_dA = self.B_dA_masked
+            branch_out_map = self.branchname_to_index_masked_map
+        else:
+            # fix VA
+            VA = -VA[self.ref_bus_mask]
+            B_dA = self.B_dA
+            branch_out_map = self._branchname_to_index_map
+
+        for start in range(0, len(comp_idxs), chunk_size):
+            J = comp_idxs[start:start+chunk_size]
+            M = self._comp_M[:,J]
+
+            # if a phase shifter is taken out, we have
+            # to do a bit more work
+            VA_comps = [ (col, self._comp_VA_compensator[j]) for col, j in enumerate(J)
+                            if j in self._comp_VA_compensator ]
+            MTVA0 = M.T@VA
+            for col, VA_comp in VA_comps:
+                MTVA0[col] += (M[:,col].T@VA_comp)[0]
+
+            RHS = (M@sp.diags((-self._comp_c[J])*MTVA0)).toarray()
+            VA_delta = self._solve_N(RHS)
+            for col, VA_comp in VA_comps:
+                VA_delta[:,col] += VA_comp
+
+            PF_delta = np.ascontiguousarray((B_dA@VA_delta).T)
+
+            for row, j in enumerate(J):
+                # zero-out the flow on this line, if we're monitoring it
+                branch_out = self._comp_branch_out[j]
+                if branch_out in branch_out_map:
+                    branch_out_idx = branch_out_map[branch_out]
+                    PF_delta[row, branch_out_idx] = -PFV[branch_out_idx]
+                yield self._comp_keys[j], PF_delta[row]
+
     def _calculate_PFV(self, mb, masked):
-        NWV = np.fromiter((value(mb.p_nw[b]) for b in self.buses_keys_no_ref), float, count=len(self.buses_keys_no_ref))
+        NWV = self._get_nw_array(mb, 'p_nw', self.buses_keys_no_ref)
         if isinstance(self, (VirtualFDFpMatrix,VirtualFDFpqMatrix)):
-            NWV = np.asmatrix(NWV) + self.M0
-            VA = self.MLU.solve(NWV.A[0])
+            NWV += np.ravel(self.M0)
         else:
-            NWV += self.phi_adjust_array.T
-            VA = self.MLU.solve(NWV.A[0])
-
-        # shape VA explicitly as a column vector
-        # (needed for some 0-dim arrays)
-#        VA = self._insert_reference_bus(VA,0)
-        VA.shape = (VA.shape[0],1)
+            NWV += self._phi_adjust_dense
+        VA = self._solve_N(NWV)
 
         if masked:
-            PFV  = np.asmatrix(self.B_dA_masked@VA)
+            PFV = self.B_dA_masked@VA
             if self.phase_shift_flow_adjuster_array is not None:
-                PFV += self.phase_shift_flow_adjuster_array_masked
+                PFV += self._psfa_masked_flat
         else:
-            PFV  = np.asmatrix(self.B_dA@VA)
+            PFV = self.B_dA@VA
             if self.phase_shift_flow_adjuster_array is not None:
-                PFV += self.phase_shift_flow_adjuster_array
+                PFV += self._psfa_flat
 
-        PFV_I = np.asmatrix(self.B_dA_I@VA)
+        PFV_I = self.B_dA_I@VA
         if self.phase_shift_flow_adjuster_array_interface is not None:
-            PFV_I += self.phase_shift_flow_adjuster_array_interface
-
-        ## make back to row-looking vectors
-        PFV = PFV.T
-        PFV_I = PFV_I.T
+            PFV_I += self._psfa_interface_flat
 
         ## VA is reversed in sign
-        if masked:
-            VA = VA.T[0]
-        else:
-            VA = -self._insert_reference_bus(VA.T[0], 0.)
+        if not masked:
+            VA = -self._insert_reference_bus(VA, 0.)
 
-        return PFV.A[0], PFV_I.A[0], VA
+        return PFV, PFV_I, VA
 
     def calculate_masked_PFV(self, mb):
         '''
@@ -556,31 +1025,37 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         LMP : np.array of LMPs indexed by buses_keys
         '''
         ## NOTE: unmonitored lines cannot contribute to LMPC
-        PFD = np.fromiter( ( value(dual[mb.ineq_branch_thermal_bounds[bn]])
-                              if bn in mb.ineq_branch_thermal_bounds else
-                              0. for i,bn in enumerate(self.branches_keys_masked) ),
-                              float, count=len(self.branches_keys_masked))
+        PFD = np.array([ value(dual[mb.ineq_branch_thermal_bounds[bn]])
+                          if bn in mb.ineq_branch_thermal_bounds else
+                          0. for bn in self.branches_keys_masked ], dtype=float)
 
         ## interface constributes to LMP
-        PFID = np.fromiter( ( value(dual[mb.ineq_pf_interface_bounds[i_n]])
-                               if i_n in mb.ineq_pf_interface_bounds else
-                               0. for i,i_n in enumerate(self.interface_keys) ),
-                               float, count=len(self.interface_keys))
+        PFID = np.array([ value(dual[mb.ineq_pf_interface_bounds[i_n]])
+                           if i_n in mb.ineq_pf_interface_bounds else
+                           0. for i_n in self.interface_keys ], dtype=float)
 
         B_PFD = -self.B_dA_masked.T@PFD
         I_PFD = -self.B_dA_I.T@PFID
 
-        LMPC = self.MLU.solve(B_PFD, trans='T')
-        LMPI = self.MLU.solve(I_PFD, trans='T')
+        LMPC = self._solve_T(B_PFD)
+        LMPI = self._solve_T(I_PFD)
 
         LMPE = value(dual[bus_balance_constr])
 
         if self.contingencies:
-            LMPCC = np.zeros_like(LMPC)
-            for (cn, bn), constr in mb.ineq_pf_contingency_branch_thermal_bounds.items():
+            ## stack the rows with non-zero duals for a single matrix-vector product
+            contingency_keys = []
+            contingency_duals = []
+            for key, constr in mb.ineq_pf_contingency_branch_thermal_bounds.items():
                 dual_value = value(dual[constr])
                 if dual_value != 0.:
-                    LMPCC += (-dual_value)*self._contingency_rows[cn, bn]
+                    contingency_keys.append(key)
+                    contingency_duals.append(dual_value)
+            if contingency_keys:
+                contingency_rows = np.stack([ self._get_contingency_row(*key) for key in contingency_keys ])
+                LMPCC = -(np.array(contingency_duals)@contingency_rows)
+            else:
+                LMPCC = np.zeros_like(LMPC)
 
             LMP = LMPE + LMPC + LMPI + LMPCC
         else:
@@ -589,13 +1064,12 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         return self._insert_reference_bus(LMP, LMPE)
 
     def calculate_monitored_contingency_flows(self, mb):
-        NWV = np.fromiter((value(mb.p_nw[b]) for b in self.buses_keys_no_ref), float, count=len(self.buses_keys_no_ref))
-        NWV += self.phi_adjust_array.T
-        NWV = NWV.A[0]
+        NWV = self._get_nw_array(mb, 'p_nw', self.buses_keys_no_ref)
+        NWV += self._phi_adjust_dense
 
         flows_dict = {}
         for name in mb.ineq_pf_contingency_branch_thermal_bounds:
-            flows_dict[name] = (self._contingency_rows[name])@NWV
+            flows_dict[name] = self._get_contingency_row(*name)@NWV
 
         return flows_dict
 
@@ -620,6 +1094,26 @@ class VirtualPTDFMatrix(_PTDFManagerBase):
         '''
         return self._calculate_PFV_delta(cn, PFV, VA, masked=True)
 
+    def calculate_masked_PFV_deltas(self, PFV, VA, contingencies=None):
+        '''
+        Iterate over (contingency name, PFV_delta) pairs, as
+        returned by calculate_masked_PFV_delta, for many contingencies
+        at once. The voltage angle solves for the contingencies are
+        batched together.
+
+        Parameters
+        ----------
+        PFV : vector of flows returned from calculate_masked_PFV
+        VA  : vector of voltage angles returned from calculate_masked_PFV
+        contingencies : iterable of contingency names, optional
+                        (default all contingencies)
+
+        Returns
+        -------
+        iterator of (cn, PFV_delta) pairs
+        '''
+        return self._calculate_PFV_deltas(PFV, VA, masked=True, contingencies=contingencies)
+
     def calculate_PFV_delta(self, cn, PFV, VA):
         '''
         Calculate a vector of real power
@@ -652,11 +1146,14 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
         self.phi_adjust_array = None
         self.phase_shift_flow_adjuster_array = None
         self.phase_shift_flow_adjuster_array_interface = None
+        self._phi_adjust_dense = None
+        self._psfa_flat = None
+        self._psfa_interface_flat = None
         super().__init__(branches, buses, reference_bus, base_point,
                        ptdf_options, branches_keys=branches_keys, buses_keys=buses_keys,
                        interfaces=interfaces, contingencies=contingencies)
         self._ptdf_const = dict()
-        self._pldf_rows = dict()
+        self._pldf_rows = _DenseRowCache(self._branchname_to_index_map, len(self.buses_keys_no_ref))
         self._pldf_const = dict()
 
     def _calculate_factorization(self):
@@ -674,7 +1171,12 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
                                                      index_set_interface=self.interface_keys)
 
         self.MLU = MLU
+        self._set_solvers()
         self.B_dA = B_dA
+        ## B_dA comes back in CSC, which is efficient for the
+        ## matrix-vector products; keep a CSR copy for row access
+        self.B_dA_csr = B_dA.tocsr()
+        self.B_dA_csr.sum_duplicates()
         self.G_dA = G_dA
         self.M0 = M0
         self.B0 = B0
@@ -684,6 +1186,10 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
         self.contingency_compensators = contingency_compensators
         self.B_dA_I = B_dA_I
 
+        # taylor series constants for every branch, computed in one pass
+        self._tseries_flow_const = tx_calc._calculate_F0_const_pflow(self._branches, self._buses, self.branches_keys, base_point=BasePointType.SOLUTION)
+        self._tseries_loss_const = tx_calc._calculate_L0_const_ploss(self._branches, self._buses, self.branches_keys, base_point=BasePointType.SOLUTION)
+
         # additional parameters for system losses
         self._calculate_loss_distribution()
         self._calculate_lossfactors()
@@ -707,14 +1213,12 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
         returns the constant coefficient for branch_name 's
         reactive power flow equation (given bus net withdrawls)
         '''
-        if branch_name in self._ptdf_const.keys():
+        if branch_name in self._ptdf_const:
             const = self._ptdf_const[branch_name]
         else:
             ptdf_row = self._get_ptdf_row(branch_name)
-            branch_idx = self._branchname_to_index_map[branch_name]
             const = ptdf_row@self.M0 + self._get_tseries_flow_const(branch_name)
-            self._ptdf_const[branch_name] = const[0]
-            const = const[0]
+            self._ptdf_const[branch_name] = const
 
         return const.item()
 
@@ -723,28 +1227,26 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
         returns the constant coefficient for branch_name 's
         power loss equation (given bus net withdrawls)
         '''
-        if branch_name in self._pldf_const.keys():
+        if branch_name in self._pldf_const:
             const = self._pldf_const[branch_name]
         else:
             pldf_row = self._get_pldf_row(branch_name)
-            branch_idx = self._branchname_to_index_map[branch_name]
             const = pldf_row@self.M0 + self._get_tseries_loss_const(branch_name)
-            self._pldf_const[branch_name] = const[0]
+            self._pldf_const[branch_name] = const
 
         return const.item()
 
     def get_lossfactor_iterator(self):
-        yield from self._lossfactor.items()
+        yield from zip(self.buses_keys, self._lossfactor)
 
     def get_lossfactor_abs_max(self):
-        LF = self._lossfactor
-        return np.abs([v for v in LF.values()]).max()
+        return self._lossfactor_abs_max
 
     def get_lossoffset(self):
         return self._lossoffset
 
     def get_lossfactor_resid_iterator(self):
-        yield from self._lossfactor_resid.items()
+        yield from zip(self.buses_keys, self._lossfactor_resid)
 
     def get_lossoffset_resid(self):
         return self._lossoffset_resid
@@ -759,35 +1261,58 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
         else:
             # calculate row
             branch_idx = self._branchname_to_index_map[branch_name]
-            PLDF_row = -self.MLU.solve(self.G_dA[branch_idx].toarray(out=self._bus_sensi_buffer)[0], trans='T')
+            PLDF_row = -self._solve_T(self.G_dA[branch_idx].toarray(out=self._rhs_pool[0:1])[0])
             self._pldf_rows[branch_name] = PLDF_row
             #TODO: find best spot to update loss factor residuals
         return PLDF_row
 
+    def _get_pldf_rows(self, branch_names):
+        '''
+        calculates and caches the PLDF rows for all of branch_names
+        not already in the cache
+        '''
+        to_calc = [ bn for bn in dict.fromkeys(branch_names) if bn not in self._pldf_rows ]
+        if not to_calc:
+            return
+        branch_idxs = [ self._branchname_to_index_map[bn] for bn in to_calc ]
+        PLDF_rows = -self._batch_solve(self.G_dA, branch_idxs)
+        for bn, PLDF_row in zip(to_calc, PLDF_rows):
+            self._pldf_rows[bn] = PLDF_row
+
     def add_q_correction(self):
         # Calculates thermal limit capacity that i "reserved" for reactive power.
         # This function should only be called in the P-LOPF.
-        from math import sqrt
         branches = self._branches
-        self._q_correction = dict()
-        for bn, branch in branches.items():
-            pmax = branch['rating_long_term']
-            if pmax is None:
-                self._q_correction[bn] = 0
-            else:
-                sf = branch['pf']**2 + branch['qf']**2
-                st = branch['pt']**2 + branch['qt']**2
-                if sf > st:
-                    self._q_correction[bn] = pmax - sqrt(pmax**2 - branch['qf']**2)
-                else:
-                    self._q_correction[bn] = pmax - sqrt(pmax**2 - branch['qt']**2)
+        self._q_correction = dict.fromkeys(branches, 0)
+        rated = [ bn for bn, branch in branches.items() if branch['rating_long_term'] is not None ]
+        if not rated:
+            return
+        def _rated_array(attr):
+            return np.fromiter((branches[bn][attr] for bn in rated), float, count=len(rated))
+        pmax = _rated_array('rating_long_term')
+        pf = _rated_array('pf')
+        qf = _rated_array('qf')
+        pt = _rated_array('pt')
+        qt = _rated_array('qt')
+
+        ## reserve capacity for the reactive flow
+        ## at the more heavily loaded end
+        q = np.where(pf**2 + qf**2 > pt**2 + qt**2, qf, qt)
+        p_avail_sq = pmax**2 - q**2
+        if (p_avail_sq < 0).any():
+            raise ValueError("Reactive power flow exceeds the thermal limit on some branches")
+        q_correction = pmax - np.sqrt(p_avail_sq)
+
+        self._q_correction.update(zip(rated, q_correction.tolist()))
 
     def _update_lossfactor_residuals(self):
         #TODO: also need to update the loss constraints for lazy/persistent solve
         logger.info("Updating Loss Residuals")
-        rows = self._pldf_rows.keys()
-        factor_adj = sum([self._pldf_rows[r] for r in rows])
-        offset_adj = sum(self._get_branch_pldf_const(r) for r in rows)
+        rows = tuple(self._pldf_rows.keys())
+        ## the PLDF rows are indexed by buses_keys_no_ref, and
+        ## the loss factors by buses_keys
+        factor_adj = self._insert_reference_bus(self._pldf_rows.row_sum(), 0.)
+        offset_adj = np.fromiter((self.get_branch_pldf_const(r) for r in rows), float, count=len(rows)).sum()
         self._lossfactor_resid = self._lossfactor - factor_adj
         self._lossoffset_resid = self._lossoffset - offset_adj
 
@@ -799,69 +1324,52 @@ class VirtualFDFpMatrix(VirtualPTDFMatrix):
     def _calculate_lossfactors(self):
         logger.info("Calculating Loss Factors")
         bus_map = self._busname_to_index_map
-        LF_mask = -self.MLU.solve(self.G_dA.toarray().sum(axis=0),trans='T')
-        LF = np.insert(LF_mask,bus_map[self._reference_bus],[0],axis=0)
-        LF_dict = {b:LF[i] for b,i in bus_map.items()}
+        LF_mask = -self._solve_T(self.G_dA.toarray().sum(axis=0))
+        ## loss factors are kept as arrays indexed like buses_keys
+        ref_idx = bus_map[self._reference_bus]
+        LF = np.empty(len(LF_mask)+1)
+        LF[:ref_idx] = LF_mask[:ref_idx]
+        LF[ref_idx] = 0.
+        LF[ref_idx+1:] = LF_mask[ref_idx:]
         offset = np.array(LF_mask.T@self.M0).item()
-        offset += sum([self._get_tseries_loss_const(bn) for bn in self._branches.keys()]).item()
-        self._lossfactor = LF_dict
+        offset += self._tseries_loss_const.sum()
+        self._lossfactor = LF
+        self._lossfactor_abs_max = np.abs(LF).max()
         self._lossoffset = offset
-        self._lossfactor_resid = LF_dict
+        self._lossfactor_resid = LF
         self._lossoffset_resid = offset
 
     def _get_tseries_flow_const(self, branch_name):
-        #TODO: ideally would only send one branch and the from/to buses, but need to add stripped down function to tx_calc
-        buses = self._buses
-        branches = self._branches
-        F0 = tx_calc._calculate_F0_const_pflow(branches, buses, [branch_name], base_point=BasePointType.SOLUTION)
-        return F0
+        return self._tseries_flow_const[self._branchname_to_index_map[branch_name]]
 
     def _get_tseries_loss_const(self, branch_name):
-        #TODO: ideally would only send one branch and the from/to buses, but need to add stripped down function to tx_calc
-        buses = self._buses
-        branches = self._branches
-        L0 = tx_calc._calculate_L0_const_ploss(branches, buses, [branch_name], base_point=BasePointType.SOLUTION)
-        return L0
+        return self._tseries_loss_const[self._branchname_to_index_map[branch_name]]
 
 
     def _calculate_PFV(self, mb, masked):
-        NWV = np.fromiter((value(mb.p_nw[b]) for b in self.buses_keys_no_ref), float, count=len(self.buses_keys_no_ref))
-        NWV = np.asmatrix(NWV + self.M0)
-        VA = self.MLU.solve(NWV.A[0])
-
-        # shape VA explicitly as a column vector
-        # (needed for some 0-dim arrays)
-#        VA = self._insert_reference_bus(VA,0)
-        VA.shape = (VA.shape[0],1)
+        NWV = self._get_nw_array(mb, 'p_nw', self.buses_keys_no_ref)
+        NWV += self.M0
+        VA = self._solve_N(NWV)
 
         if masked:
-            PFV  = -np.asmatrix(self.B_dA_masked@VA)
-            PFV += np.asmatrix(self.B0).T
+            PFV = self.B0 - self.B_dA_masked@VA
         else:
-            PFV  = -np.asmatrix(self.B_dA@VA)
-            PFV += np.asmatrix(self.B0).T
+            PFV = self.B0 - self.B_dA@VA
 
-        PFV_I = np.asmatrix(self.B_dA_I@VA)
-
-        ## make back to row-looking vectors
-        PFV = PFV.T
-        PFV_I = PFV_I.T
+        PFV_I = self.B_dA_I@VA
 
         ## VA is reversed in sign
-        if masked:
-            VA = VA.T[0]
-        else:
-            VA = -self._insert_reference_bus(VA.T[0], 0.)
+        if not masked:
+            VA = -self._insert_reference_bus(VA, 0.)
 
-        return PFV.A[0], PFV_I.A[0], VA
+        return PFV, PFV_I, VA
 
     def calculate_PLV(self, mb=None, VA=None):
 
         if VA is None:
-            NWV = np.fromiter((value(mb.p_nw[b]) for b in self.buses_keys_no_ref), float,
-                              count=len(self.buses_keys_no_ref))
-            NWV = np.asmatrix(NWV + self.M0)
-            VA = self.MLU.solve(NWV.A[0])
+            NWV = self._get_nw_array(mb, 'p_nw', self.buses_keys_no_ref)
+            NWV += self.M0
+            VA = self._solve_N(NWV)
 
         l,w = self.G_dA.shape
         if w < len(VA):
@@ -888,11 +1396,11 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         self.vm_limits_ub_array.flags.writeable = False
         self.vm_limits_lb_array.flags.writeable = False
         self._set_lazy_vm_limits(ptdf_options)
-        self._qtdf_rows = dict()
+        self._qtdf_rows = _DenseRowCache(self._branchname_to_index_map, len(self.buses_keys))
         self._qtdf_const = dict()
-        self._qldf_rows = dict()
+        self._qldf_rows = _DenseRowCache(self._branchname_to_index_map, len(self.buses_keys))
         self._qldf_const = dict()
-        self._vdf_rows = dict()
+        self._vdf_rows = _DenseRowCache(self._busname_to_index_map, len(self.buses_keys))
         self._vdf_const = dict()
         self._mw_only = False
 
@@ -908,12 +1416,21 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
                                                   mapping_branch_to_idx=self._branchname_to_index_map)
 
         self.QMLU = QMLU
+        self._solve_QT = partial(self.QMLU.solve, trans='T')
+        ## write buffers for single right-hand sides
+        ## (QMLU.solve does not hold on to its input)
+        self._q_rhs_buffer = np.empty((1,len(self.buses_keys)), dtype=np.float64)
+        self._vdf_rhs_buffer = np.zeros(len(self.buses_keys), dtype=np.float64)
         self.QB_dA = QB_dA  #TODO: consider renaming. These matrices no longer refer to susceptance and conductance
         self.QG_dA = QG_dA  # - I think they are now "swapped" but the B/G names are kept for consistency w/ PTDF functions
         self.QM0 = QM0
         self.QB0 = QB0
         self.QG0 = QG0
 
+        # taylor series constants for every branch, computed in one pass
+        self._tseries_qflow_const = tx_calc._calculate_H0_const_qflow(self._branches, self._buses, self.branches_keys, base_point=BasePointType.SOLUTION)
+        self._tseries_qloss_const = tx_calc._calculate_K0_const_qloss(self._branches, self._buses, self.branches_keys, base_point=BasePointType.SOLUTION)
+
         # additional parameters for system losses
         self._calculate_qloss_distribution()
         self._calculate_qlossfactors()
@@ -965,11 +1482,10 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         returns the constant coefficient for branch_name 's
         reactive power flow equation (given bus net withdrawls)
         '''
-        if branch_name in self._qtdf_const.keys():
+        if branch_name in self._qtdf_const:
             const = self._qtdf_const[branch_name]
         else:
             qtdf_row = self._get_qtdf_row(branch_name)
-            branch_idx = self._branchname_to_index_map[branch_name]
             const = qtdf_row@self.QM0 + self._get_tseries_qflow_const(branch_name)
             self._qtdf_const[branch_name] = const
 
@@ -980,11 +1496,10 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         returns the constant coefficient for branch_name 's
         reactive power loss equation (given bus net withdrawls)
         '''
-        if branch_name in self._qldf_const.keys():
+        if branch_name in self._qldf_const:
             const = self._qldf_const[branch_name]
         else:
             qldf_row = self._get_qldf_row(branch_name)
-            branch_idx = self._branchname_to_index_map[branch_name]
             const = qldf_row@self.QM0 + self._get_tseries_qloss_const(branch_name)
             self._qldf_const[branch_name] = const
 
@@ -995,28 +1510,26 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         returns the constant coefficient for bus_name 's
         voltage magnitude equation (given bus net withdrawls)
         '''
-        if bus_name in self._vdf_const.keys():
+        if bus_name in self._vdf_const:
             const = self._vdf_const[bus_name]
         else:
             vdf_row = self._get_vdf_row(bus_name)
-            bus_idx = self._busname_to_index_map[bus_name]
             const = vdf_row@self.QM0
             self._vdf_const[bus_name] = const
 
         return const
 
     def get_qlossfactor_iterator(self):
-        yield from self._qlossfactor.items()
+        yield from zip(self.buses_keys, self._qlossfactor)
 
     def get_qlossfactor_abs_max(self):
-        LF = self._qlossfactor
-        return np.abs([v for v in LF.values()]).max()
+        return self._qlossfactor_abs_max
 
     def get_qlossoffset(self):
         return self._qlossoffset
 
     def get_qlossfactor_resid_iterator(self):
-        yield from self._qlossfactor_resid.items()
+        yield from zip(self.buses_keys, self._qlossfactor_resid)
 
     def get_qlossoffset_resid(self):
         return self._qlossoffset_resid
@@ -1034,11 +1547,19 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
             lazy_flow_tol = ptdf_options['lazy_rel_vm_tol']
 
             ## only enforce the relative and absolute, within tollerance
-            self.enforced_vm_limits_ub = np.maximum(vm_ub*(1+rel_flow_tol), vm_ub+abs_flow_tol)
-            self.enforced_vm_limits_lb = np.minimum(vm_lb*(1-rel_flow_tol), vm_lb-abs_flow_tol)
+            ## (computed in place to avoid full-length temporaries)
+            tmp = np.add(vm_ub, abs_flow_tol)
+            self.enforced_vm_limits_ub = np.multiply(vm_ub, 1+rel_flow_tol)
+            np.maximum(self.enforced_vm_limits_ub, tmp, out=self.enforced_vm_limits_ub)
+            np.subtract(vm_lb, abs_flow_tol, out=tmp)
+            self.enforced_vm_limits_lb = np.multiply(vm_lb, 1-rel_flow_tol)
+            np.minimum(self.enforced_vm_limits_lb, tmp, out=self.enforced_vm_limits_lb)
+
             ## make sure the lazy limits are a superset of the enforce limits
-            self.lazy_vm_limits_ub = np.minimum(vm_ub*(1+lazy_flow_tol), self.enforced_vm_limits_ub)
-            self.lazy_vm_limits_lb = np.maximum(vm_lb*(1-lazy_flow_tol), self.enforced_vm_limits_lb)
+            self.lazy_vm_limits_ub = np.multiply(vm_ub, 1+lazy_flow_tol)
+            np.minimum(self.lazy_vm_limits_ub, self.enforced_vm_limits_ub, out=self.lazy_vm_limits_ub)
+            self.lazy_vm_limits_lb = np.multiply(vm_lb, 1-lazy_flow_tol)
+            np.maximum(self.lazy_vm_limits_lb, self.enforced_vm_limits_lb, out=self.lazy_vm_limits_lb)
 
     def _get_qtdf_row(self, branch_name):
         if branch_name in self._qtdf_rows:
@@ -1046,7 +1567,7 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         else:
             # calculate row
             branch_idx = self._branchname_to_index_map[branch_name]
-            QTDF_row = -self.QMLU.solve(self.QB_dA[branch_idx].toarray()[0], trans='T')
+            QTDF_row = -self._solve_QT(self.QB_dA[branch_idx].toarray(out=self._q_rhs_buffer)[0])
             self._qtdf_rows[branch_name] = QTDF_row
             #TODO: find best spot to update loss factor residuals
         return QTDF_row
@@ -1057,7 +1578,7 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         else:
             # calculate row
             branch_idx = self._branchname_to_index_map[branch_name]
-            QLDF_row = -self.QMLU.solve(self.QG_dA[branch_idx].toarray()[0], trans='T')
+            QLDF_row = -self._solve_QT(self.QG_dA[branch_idx].toarray(out=self._q_rhs_buffer)[0])
             self._qldf_rows[branch_name] = QLDF_row
             #TODO: find best spot to update loss factor residuals
         return QLDF_row
@@ -1068,18 +1589,73 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
         else:
             # calculate row
             bus_idx = self._busname_to_index_map[bus_name]
-            rhs = np.zeros(len(self.buses_keys))
-            rhs[bus_idx] = 1
-            VDF_row = -self.QMLU.solve(rhs, trans='T')
+            ## flip a single entry of the zero buffer
+            rhs = self._vdf_rhs_buffer
+            rhs[bus_idx] = 1.
+            try:
+                VDF_row = -self._solve_QT(rhs)
+            finally:
+                rhs[bus_idx] = 0.
             self._vdf_rows[bus_name] = VDF_row
         return VDF_row
 
+    def _batch_solve_q(self, sensi_matrix, indices):
+        '''
+        solves against the rows sensi_matrix[indices] with a single
+        multiple right-hand side call to QMLU.solve; returns one
+        solution per row
+        '''
+        RHS = sensi_matrix[indices].toarray()
+        return np.ascontiguousarray(self._solve_QT(RHS.T).T)
+
+    def _get_qtdf_rows(self, branch_names):
+        '''
+        calculates and caches the QTDF rows for all of branch_names
+        not already in the cache
+        '''
+        to_calc = [ bn for bn in dict.fromkeys(branch_names) if bn not in self._qtdf_rows ]
+        if not to_calc:
+            return
+        branch_idxs = [ self._branchname_to_index_map[bn] for bn in to_calc ]
+        QTDF_rows = -self._batch_solve_q(self.QB_dA, branch_idxs)
+        for bn, QTDF_row in zip(to_calc, QTDF_rows):
+            self._qtdf_rows[bn] = QTDF_row
+
+    def _get_qldf_rows(self, branch_names):
+        '''
+        calculates and caches the QLDF rows for all of branch_names
+        not already in the cache
+        '''
+        to_calc = [ bn for bn in dict.fromkeys(branch_names) if bn not in self._qldf_rows ]
+        if not to_calc:
+            return
+        branch_idxs = [ self._branchname_to_index_map[bn] for bn in to_calc ]
+        QLDF_rows = -self._batch_solve_q(self.QG_dA, branch_idxs)
+        for bn, QLDF_row in zip(to_calc, QLDF_rows):
+            self._qldf_rows[bn] = QLDF_row
+
+    def _get_vdf_rows(self, bus_names):
+        '''
+        calculates and caches the VDF rows for all of bus_names
+        not already in the cache
+        '''
+        to_calc = [ b for b in dict.fromkeys(bus_names) if b not in self._vdf_rows ]
+        if not to_calc:
+            return
+        bus_idxs = [ self._busname_to_index_map[b] for b in to_calc ]
+        ## the right-hand sides are the identity columns
+        RHS = np.zeros((len(self.buses_keys), len(bus_idxs)))
+        RHS[bus_idxs, np.arange(len(bus_idxs))] = 1.
+        VDF_rows = -np.ascontiguousarray(self._solve_QT(RHS).T)
+        for b, VDF_row in zip(to_calc, VDF_rows):
+            self._vdf_rows[b] = VDF_row
+
     def _update_qlossfactor_residuals(self):
         #TODO: also need to update the loss constraints for lazy/persistent solve
         logger.info("Updating Reactive Loss Residuals")
-        rows = self._qldf_rows.keys()
-        factor_adj = sum([self._qldf_rows[r] for r in rows])
-        offset_adj = sum(self._get_branch_qldf_const(r) for r in rows)
+        rows = tuple(self._qldf_rows.keys())
+        factor_adj = self._qldf_rows.row_sum()
+        offset_adj = np.fromiter((self.get_branch_qldf_const(r) for r in rows), float, count=len(rows)).sum()
         self._qlossfactor_resid = self._qlossfactor - factor_adj
         self._qlossoffset_resid = self._qlossoffset - offset_adj
 
@@ -1090,55 +1666,37 @@ class VirtualFDFpqMatrix(VirtualFDFpMatrix):
 
     def _calculate_qlossfactors(self):
         logger.info("Calculating Reactive Loss Factors")
-        bus_map = self._busname_to_index_map
+        ## loss factors are kept as arrays indexed like buses_keys
         QLF = self.QMLU.solve(self.QG_dA.toarray().sum(axis=0), trans='T')
-        QLF_dict = {b:QLF[i] for b,i in bus_map.items()}
         offset = np.array(QLF.T @ self.QM0).item()
-        offset += sum([self._get_tseries_qloss_const(bn) for bn in self._branches.keys()]).item()
-        self._qlossfactor = QLF_dict
+        offset += self._tseries_qloss_const.sum()
+        self._qlossfactor = QLF
+        self._qlossfactor_abs_max = np.abs(QLF).max()
         self._qlossoffset = offset
-        self._qlossfactor_resid = QLF_dict
+        self._qlossfactor_resid = QLF
         self._qlossoffset_resid = offset
 
     def _get_tseries_qflow_const(self, branch_name):
-        #TODO: ideally would only send one branch and the from/to buses, but need to add stripped down function to tx_calc
-        buses = self._buses
-        branches = self._branches
-        H0 = tx_calc._calculate_H0_const_qflow(branches, buses, [branch_name], base_point=BasePointType.SOLUTION)
-        return H0
+        return self._tseries_qflow_const[self._branchname_to_index_map[branch_name]]
 
     def _get_tseries_qloss_const(self, branch_name):
-        #TODO: ideally would only send one branch and the from/to buses, but need to add stripped down function to tx_calc
-        buses = self._buses
-        branches = self._branches
-        K0 = tx_calc._calculate_K0_const_qloss(branches, buses, [branch_name], base_point=BasePointType.SOLUTION)
-        return K0
+        return self._tseries_qloss_const[self._branchname_to_index_map[branch_name]]
 
     def calculate_QFV(self, mb):
-        NWV = np.fromiter((value(mb.q_nw[b]) for b in self.buses_keys), float,
-                          count=len(self.buses_keys))
-        NWV = np.asmatrix(NWV + self.QM0)
-        VM = -self.QMLU.solve(NWV.A[0])
-
-        # shape VM explicitly as a column vector
-        VM.shape = (VM.shape[0], 1)
+        NWV = self._get_nw_array(mb, 'q_nw', self.buses_keys)
+        NWV += self.QM0
+        VM = -self.QMLU.solve(NWV)
 
-        QFV = np.asmatrix(self.QB_dA @ VM)
-        QFV += np.asmatrix(self.QB0).T
+        QFV = self.QB_dA@VM + self.QB0
 
-        ## make back to row-looking vectors
-        QFV = QFV.T
-        VM.shape = (VM.shape[0],)
-
-        return QFV.A[0], VM
+        return QFV, VM
 
     def calculate_QLV(self, mb=None, VM=None):
 
         if VM is None:
-            NWV = np.fromiter((value(mb.q_nw[b]) for b in self.buses_keys), float,
-                              count=len(self.buses_keys))
-            NWV = np.asmatrix(NWV + self.QM0)
-            VM = self.MLU.solve(NWV.A[0])
+            NWV = self._get_nw_array(mb, 'q_nw', self.buses_keys)
+            NWV += self.QM0
+            VM = self._solve_N(NWV)
 
         l,w = self.QG_dA.shape
         if w < len(VM):
@@ -1180,8 +1738,22 @@ class PTDFMatrix(_PTDFManagerBase):
         self.branch_limits_array = np.fromiter((branches[branch]['rating_long_term'] for branch in self.branches_keys), float, count=len(self.branches_keys))
         self.branch_limits_array.flags.writeable = False
 
+        ## branch endpoints and bus voltages, for filtering by kV
+        self._from_idx = np.fromiter((self._busname_to_index_map[branches[bn]['from_bus']] for bn in self.branches_keys), np.int64, count=len(self.branches_keys))
+        self._to_idx = np.fromiter((self._busname_to_index_map[branches[bn]['to_bus']] for bn in self.branches_keys), np.int64, count=len(self.branches_keys))
+        self._bus_kv = np.fromiter((buses[b].get('base_kv', np.inf) for b in self.buses_keys), float, count=len(self.buses_keys))
+
         self._base_point = base_point
+        # storage type for the dense matrices; float32 halves the memory
+        # traffic of every row read and product at reduced precision
+        self._dense_dtype = np.dtype(ptdf_options.get('dense_ptdf_dtype', 'float64'))
+        # whether the PTDF matrix may be calculated in cycle space
+        self._cycle_space = ptdf_options.get('cycle_space_ptdf', False)
         self._calculate()
+        self._calculate_ptdf_const()
+
+        # net withdrawal component data, by block
+        self._nw_cache = weakref.WeakKeyDictionary()
 
         if interfaces is None:
             interfaces = dict()
@@ -1201,13 +1773,23 @@ class PTDFMatrix(_PTDFManagerBase):
         '''
         ## calculate and store the PTDF matrix
         PTDFM = tx_calc.calculate_ptdf(self._branches,self._buses,self.branches_keys,self.buses_keys,self._reference_bus,self._base_point,
-                                        mapping_bus_to_idx=self._busname_to_index_map)
+                                        mapping_bus_to_idx=self._busname_to_index_map, cycle_space=self._cycle_space)
 
-        self.PTDFM = PTDFM
+        self.PTDFM = np.ascontiguousarray(PTDFM, dtype=self._dense_dtype)
 
         ## protect the array using numpy
         self.PTDFM.flags.writeable = False
 
+    def _calculate_ptdf_const(self):
+        ## phi adj and phi adj + phase shift for every branch,
+        ## with a single matrix-vector product
+        self._phi_adj_array = self.PTDFM.dot(self.phi_adjust_array)
+        self._ptdf_const_array = self._phi_adj_array + self.phase_shift_array
+
+        ## protect the arrays using numpy
+        self._phi_adj_array.flags.writeable = False
+        self._ptdf_const_array.flags.writeable = False
+
     def _calculate_ptdf_interface(self, interfaces):
         self.interface_keys = tuple(interfaces.keys())
 
@@ -1250,64 +1832,83 @@ class PTDFMatrix(_PTDFManagerBase):
 
         ## sum across the rows to get the total impact, and convert
         ## to dense for fast operations later
-        self.phi_adjust_array = phi_adjust_array.sum(axis=1).T.A[0]
+        self.phi_adjust_array = np.asarray(phi_adjust_array.sum(axis=1)).ravel()
 
         ## protect the array using numpy
         self.phi_adjust_array.flags.writeable = False
 
+    def _get_transformer_shift_tap_arrays(self):
+        '''
+        gathers the phase shift and tap ratio for every branch,
+        backfilling non-transformer branches with a shift of 0
+        and a tap ratio of 1, so the phase shift terms can be
+        computed over all the branches at once
+        '''
+        branches = [ self._branches[bn] for bn in self.branches_keys ]
+        _len_branch = len(branches)
+        is_xfmr = np.fromiter((branch['branch_type'] == 'transformer' for branch in branches), bool, count=_len_branch)
+
+        shift = np.zeros(_len_branch)
+        tap = np.ones(_len_branch)
+
+        ## only the transformers, usually a small fraction of the
+        ## branches, need their data read out of the branch dicts
+        xfmr_idx = np.flatnonzero(is_xfmr)
+        if len(xfmr_idx) > 0:
+            xfmrs = [ branches[i] for i in xfmr_idx ]
+            shift[xfmr_idx] = np.fromiter((branch['transformer_phase_shift'] for branch in xfmrs), float, count=len(xfmrs))
+            tap[xfmr_idx] = np.fromiter((branch['transformer_tap_ratio'] for branch in xfmrs), float, count=len(xfmrs))
+        return branches, shift, tap
+
     def _calculate_phase_shift(self):
-        
-        phase_shift_array = np.fromiter(( -(1/branch['reactance']) * (radians(branch['transformer_phase_shift'])/branch['transformer_tap_ratio']) if (branch['branch_type'] == 'transformer') else 0. for branch in (self._branches[bn] for bn in self.branches_keys)), float, count=len(self.branches_keys))
+        branches, shift, tap = self._get_transformer_shift_tap_arrays()
+        reactance = np.fromiter((branch['reactance'] for branch in branches), float, count=len(branches))
 
-        self.phase_shift_array = phase_shift_array
+        ## non-transformer branches have shift 0, so their term is 0
+        self.phase_shift_array = -(1/reactance) * (np.deg2rad(shift)/tap)
         ## protect the array using numpy
         self.phase_shift_array.flags.writeable = False
 
 
+    def _set_unfiltered_lines(self):
+        self.branch_mask = np.arange(len(self.branch_limits_array))
+        self.branches_keys_masked = self.branches_keys
+        self.branchname_to_index_masked_map = self._branchname_to_index_map
+        self.PTDFM_masked = self.PTDFM
+        self.phase_shift_array_masked = self.phase_shift_array
+        self.branch_limits_array_masked = self.branch_limits_array
+
     def _get_filtered_lines(self, ptdf_options):
         if ptdf_options['branch_kv_threshold'] is None:
             ## Nothing to do
-            self.branch_mask = np.arange(len(self.branch_limits_array))
-            self.branches_keys_masked = self.branches_keys
-            self.branchname_to_index_masked_map = self._branchname_to_index_map
-            self.PTDFM_masked = self.PTDFM
-            self.phase_shift_array_masked = self.phase_shift_array
-            self.branch_limits_array_masked = self.branch_limits_array
+            self._set_unfiltered_lines()
             return
 
-        branches = self._branches
-        buses = self._buses
-        branch_mask = list()
         one = (ptdf_options['kv_threshold_type'] == 'one')
         kv_limit = ptdf_options['branch_kv_threshold']
 
-        for i, bn in enumerate(self.branches_keys):
-            branch = branches[bn]
-            fb = buses[branch['from_bus']]
-
-            fbt = True
-            ## NOTE: this warning will be printed only once if we just check the from_bus
-            if 'base_kv' not in fb:
+        for i in np.flatnonzero(np.isinf(self._bus_kv[self._from_idx])):
+            branch = self._branches[self.branches_keys[i]]
+            if 'base_kv' not in self._buses[branch['from_bus']]:
                 logger.warning("WARNING: did not find 'base_kv' for bus {}, considering it large for the purposes of filtering".format(branch['from_bus']))
-            elif fb['base_kv'] < kv_limit:
-                fbt = False
 
-            if fbt and one:
-                branch_mask.append(i)
-                continue
-
-            tb = buses[branch['to_bus']]
-            tbt = False
-            if ('base_kv' not in tb) or tb['base_kv'] >= kv_limit:
-                tbt = True
-
-            if fbt and tbt:
-                branch_mask.append(i)
-            elif one and tbt:
-                branch_mask.append(i)
+        ## per-bus bitmap, gathered onto the branch endpoints
+        kv_ok = self._bus_kv >= kv_limit
+        fbt = kv_ok[self._from_idx]
+        tbt = kv_ok[self._to_idx]
+        if one:
+            keep = fbt | tbt
+        else:
+            keep = fbt & tbt
+        if keep.all():
+            ## no branch is filtered out, so share the (read-only)
+            ## arrays instead of copying every row of PTDFM
+            self._set_unfiltered_lines()
+            return
+        branch_mask = np.flatnonzero(keep)
 
-        self.branch_mask = np.array(branch_mask)
-        self.branches_keys_masked = tuple(self.branches_keys[i] for i in self.branch_mask)
+        self.branch_mask = branch_mask
+        self.branches_keys_masked = tuple(compress(self.branches_keys, keep))
         self.branchname_to_index_masked_map = { bn : i for i,bn in enumerate(self.branches_keys_masked) }
         self.PTDFM_masked = self.PTDFM[branch_mask]
         self.phase_shift_array_masked = self.phase_shift_array[branch_mask]
@@ -1325,27 +1926,35 @@ class PTDFMatrix(_PTDFManagerBase):
             lazy_flow_tol = ptdf_options['lazy_rel_flow_tol']
 
             ## only enforce the relative and absolute, within tollerance
-            self.enforced_branch_limits = np.maximum(branch_limits*(1+rel_flow_tol), branch_limits+abs_flow_tol)
+            ## (computed in place to avoid full-length temporaries)
+            tmp = np.add(branch_limits, abs_flow_tol)
+            self.enforced_branch_limits = np.multiply(branch_limits, 1+rel_flow_tol)
+            np.maximum(self.enforced_branch_limits, tmp, out=self.enforced_branch_limits)
+
             ## make sure the lazy limits are a superset of the enforce limits
-            self.lazy_branch_limits = np.minimum(branch_limits*(1+lazy_flow_tol), self.enforced_branch_limits)
+            self.lazy_branch_limits = np.multiply(branch_limits, 1+lazy_flow_tol)
+            np.minimum(self.lazy_branch_limits, self.enforced_branch_limits, out=self.lazy_branch_limits)
+
             abs_max_limits_i = np.abs(interface_max_limits)
             abs_min_limits_i = np.abs(interface_min_limits)
 
-            self.enforced_interface_max_limits = \
-                np.maximum(interface_max_limits+rel_flow_tol*abs_max_limits_i,
-                            interface_max_limits+abs_flow_tol)
+            tmp = np.add(interface_max_limits, abs_flow_tol)
+            self.enforced_interface_max_limits = np.multiply(abs_max_limits_i, rel_flow_tol)
+            self.enforced_interface_max_limits += interface_max_limits
+            np.maximum(self.enforced_interface_max_limits, tmp, out=self.enforced_interface_max_limits)
 
-            self.enforced_interface_min_limits = \
-                np.minimum(interface_min_limits-rel_flow_tol*abs_min_limits_i,
-                            interface_min_limits-abs_flow_tol)
+            tmp = np.subtract(interface_min_limits, abs_flow_tol)
+            self.enforced_interface_min_limits = np.multiply(abs_min_limits_i, -rel_flow_tol)
+            self.enforced_interface_min_limits += interface_min_limits
+            np.minimum(self.enforced_interface_min_limits, tmp, out=self.enforced_interface_min_limits)
 
-            self.lazy_interface_max_limits = \
-                    np.minimum(interface_max_limits+lazy_flow_tol*abs_max_limits_i,
-                                self.enforced_interface_max_limits)
+            self.lazy_interface_max_limits = np.multiply(abs_max_limits_i, lazy_flow_tol, out=abs_max_limits_i)
+            self.lazy_interface_max_limits += interface_max_limits
+            np.minimum(self.lazy_interface_max_limits, self.enforced_interface_max_limits, out=self.lazy_interface_max_limits)
 
-            self.lazy_interface_min_limits = \
-                    np.maximum(interface_min_limits-lazy_flow_tol*abs_min_limits_i,
-                                self.enforced_interface_min_limits)
+            self.lazy_interface_min_limits = np.multiply(abs_min_limits_i, -lazy_flow_tol, out=abs_min_limits_i)
+            self.lazy_interface_min_limits += interface_min_limits
+            np.maximum(self.lazy_interface_min_limits, self.enforced_interface_min_limits, out=self.lazy_interface_min_limits)
 
     def get_branch_ptdf_iterator(self, branch_name):
         row_idx = self._branchname_to_index_map[branch_name]
@@ -1359,21 +1968,27 @@ class PTDFMatrix(_PTDFManagerBase):
         PTDF_row = self.PTDFM[row_idx]
         return np.abs(PTDF_row).max()
 
+    def get_branch_ptdf_data(self, branch_name):
+        '''
+        returns a PTDFRowData (buses, row, abs_max, const)
+        for a given branch_name
+        '''
+        row_idx = self._branchname_to_index_map[branch_name]
+        ## get the row slice
+        PTDF_row = self.PTDFM[row_idx]
+        return PTDFRowData(self.buses_keys, PTDF_row,
+                           np.abs(PTDF_row).max(),
+                           self._ptdf_const_array[row_idx])
+
     def get_branch_phase_shift(self, branch_name):
         return self.phase_shift_array[self._branchname_to_index_map[branch_name]]
 
     def get_branch_phi_adj(self, branch_name):
-        row_idx = self._branchname_to_index_map[branch_name]
-        ## get the row slice
-        PTDF_row = self.PTDFM[row_idx]
-        return PTDF_row.dot(self.phi_adjust_array)
+        return self._phi_adj_array[self._branchname_to_index_map[branch_name]]
 
     def get_branch_ptdf_const(self, branch_name):
-        row_idx = self._branchname_to_index_map[branch_name]
-        ## get the row slice
-        PTDF_row = self.PTDFM[row_idx]
-                ## phi adj                        +     phase shift
-        return PTDF_row.dot(self.phi_adjust_array)+self.phase_shift_array[row_idx]
+        ## phi adj + phase shift
+        return self._ptdf_const_array[self._branchname_to_index_map[branch_name]]
 
     def get_interface_const(self, interface_name):
         return self.PTDFM_I_const[self.interfacename_to_index_map[interface_name]]
@@ -1394,10 +2009,13 @@ class PTDFMatrix(_PTDFManagerBase):
         yield from self.buses_keys
 
     def calculate_PFV(self,mb):
-        NWV = np.fromiter((value(mb.p_nw[b]) for b in self.buses_keys), float, count=len(self.buses_keys))
+        NWV = self._get_nw_array(mb, 'p_nw', self.buses_keys)
         NWV += self.phi_adjust_array
     
-        PFV  = self.PTDFM_masked.dot(NWV)
+        ## take the product in the storage type of PTDFM, so
+        ## a reduced-precision PTDFM is not upcast on every call
+        PFV  = self.PTDFM_masked.dot(NWV.astype(self._dense_dtype, copy=False))
+        PFV  = PFV.astype(np.float64, copy=False)
         PFV += self.phase_shift_array_masked
     
         PFV_I = self.PTDFM_I.dot(NWV)
@@ -1413,17 +2031,17 @@ class PTDFLossesMatrix(PTDFMatrix):
         logger.info("Calculating PTDF Matrix")
         self._calculate_ptdf()
         self._calculate_phi_adjust()
-        self._calculate_phi_loss_constant()
-        self._calculate_phase_shift()
-        self._calculate_losses_phase_shift()
+        self._calculate_phase_shifts()
 
     def _calculate_ptdf(self):
         ptdf_r, ldf, ldf_c = tx_calc.calculate_ptdf_ldf(self._branches,self._buses,self.branches_keys,self.buses_keys,self._reference_bus,self._base_point,\
                                                         mapping_bus_to_idx=self._busname_to_index_map)
 
-        self.PTDFM = ptdf_r
-        self.LDF = ldf
-        self.LDF_C = ldf_c
+        self.PTDFM = np.ascontiguousarray(ptdf_r, dtype=self._dense_dtype)
+        self.LDF = np.ascontiguousarray(ldf, dtype=self._dense_dtype)
+        ## LDF_C comes back 2-D, (1, nbranch), when the base point
+        ## has no flows or losses; flatten so it is indexed by branch
+        self.LDF_C = np.ascontiguousarray(ldf_c, dtype=float).ravel()
 
         ## protect the arrays using numpy
         self.PTDFM.flags.writeable = False
@@ -1433,58 +2051,84 @@ class PTDFLossesMatrix(PTDFMatrix):
     def _calculate_phi_from_phi_to(self):
         return tx_calc.calculate_phi_constant(self._branches,self.branches_keys,self.buses_keys,ApproximationType.PTDF_LOSSES, mapping_bus_to_idx=self._busname_to_index_map)
 
-    def _calculate_phi_loss_constant(self):
+    ## the losses arrays below are only used by the losses
+    ## accessors, so each is calculated on first use
+
+    @_lazy_attribute
+    def phi_losses_adjust_array(self):
         phi_loss_from, phi_loss_to = tx_calc.calculate_phi_loss_constant(self._branches,self.branches_keys,self.buses_keys,ApproximationType.PTDF_LOSSES, mapping_bus_to_idx=self._busname_to_index_map)
 
         ## hold onto these for line outages
         self._phi_loss_from = phi_loss_from
         self._phi_loss_to = phi_loss_to
 
-        ## sum the across the columns, which are indexed by branch
-        phi_losses_adjust_array = phi_loss_from-phi_loss_to
-
-        ## sum across the rows to get the total impact, and convert
-        ## to dense for fast operations later
-        self.phi_losses_adjust_array = phi_losses_adjust_array.sum(axis=1).T.A[0]
+        ## sum across the columns, which are indexed by branch, to get
+        ## the total impact, and convert to dense for fast operations
+        ## later; summing each side first avoids the sparse subtraction
+        phi_losses_adjust_array = np.asarray(phi_loss_from.sum(axis=1)).ravel()
+        phi_losses_adjust_array -= np.asarray(phi_loss_to.sum(axis=1)).ravel()
 
         ## protect the array using numpy
-        self.phi_losses_adjust_array.flags.writeable = False
-
-    def _calculate_phase_shift(self):
-        
-        phase_shift_array = np.fromiter(( tx_calc.calculate_susceptance(branch) * (radians(branch['transformer_phase_shift'])/branch['transformer_tap_ratio']) 
-            if (branch['branch_type'] == 'transformer') 
-            else 0. 
-            for branch in (self._branches[bn] for bn in self.branches_keys)), float, count=len(self.branches_keys))
+        phi_losses_adjust_array.flags.writeable = False
+        return phi_losses_adjust_array
+
+    @_lazy_attribute
+    def _branch_phi_losses_adj(self):
+        ## phi losses adj for every branch, in one matrix-vector product
+        branch_phi_losses_adj = np.asarray(self.LDF@self.phi_losses_adjust_array).ravel()
+        branch_phi_losses_adj.flags.writeable = False
+        return branch_phi_losses_adj
+
+    @_lazy_attribute
+    def _branch_losses_const(self):
+        ## losses phase shift + LDF_C + phi losses adj
+        branch_losses_const = self.losses_phase_shift_array + self.LDF_C
+        branch_losses_const += self._branch_phi_losses_adj
+        branch_losses_const.flags.writeable = False
+        return branch_losses_const
+
+    @_lazy_attribute
+    def _ldf_abs_max(self):
+        ## the per-branch LDF abs max, in one pass over LDF
+        ldf_abs_max = np.abs(self.LDF).max(axis=1)
+        ldf_abs_max.flags.writeable = False
+        return ldf_abs_max
+
+    def _calculate_phase_shifts(self):
+        '''
+        gathers the branch data once and computes both the
+        flow and the losses phase shift arrays in one pass
+        '''
+        branches, shift, tap = self._get_transformer_shift_tap_arrays()
+        resistance = np.fromiter((branch['resistance'] for branch in branches), float, count=len(branches))
+        reactance = np.fromiter((branch['reactance'] for branch in branches), float, count=len(branches))
 
-        self.phase_shift_array = phase_shift_array
+        self.phase_shift_array, self.losses_phase_shift_array = \
+                tx_calc.calculate_transformer_phase_shift_terms(resistance, reactance, shift, tap)
 
-        ## protect the array using numpy
+        ## protect the arrays using numpy
         self.phase_shift_array.flags.writeable = False
-
-    def _calculate_losses_phase_shift(self):
-
-        losses_phase_shift_array = np.fromiter(( (tx_calc.calculate_conductance(branch)/branch['transformer_tap_ratio']) * radians(branch['transformer_phase_shift'])**2 
-            if branch['branch_type'] == 'transformer' 
-            else 0.
-            for branch in (self._branches[bn] for bn in self.branches_keys)), float, count=len(self.branches_keys))
-
-        self.losses_phase_shift_array = losses_phase_shift_array
-
-        ## protect the array using numpy
         self.losses_phase_shift_array.flags.writeable = False
 
     def get_branch_ldf_iterator(self, branch_name):
         row_idx = self._branchname_to_index_map[branch_name]
-        ## get the row slice
-        losses_row = self.LDF[row_idx]
+        ## LDF is a dense ndarray, so the row is a view; hand
+        ## back python floats rather than boxing each element
+        losses_row = self.LDF[row_idx].tolist()
         yield from zip(self.buses_keys, losses_row)
 
-    def get_branch_ldf_abs_max(self, branch_name):
+    def get_branch_ldf_data(self, branch_name):
+        '''
+        returns a PTDFRowData (buses, row, abs_max, const) of
+        the LDF for a given branch_name, with a single index lookup
+        '''
         row_idx = self._branchname_to_index_map[branch_name]
-        ## get the row slice
-        losses_row = self.LDF[row_idx]
-        return np.abs(losses_row).max()
+        return PTDFRowData(self.buses_keys, self.LDF[row_idx],
+                           self._ldf_abs_max[row_idx],
+                           self._branch_losses_const[row_idx])
+
+    def get_branch_ldf_abs_max(self, branch_name):
+        return self._ldf_abs_max[self._branchname_to_index_map[branch_name]]
 
     def get_branch_ldf_c(self, branch_name):
         return self.LDF_C[self._branchname_to_index_map[branch_name]]
@@ -1496,7 +2140,51 @@ class PTDFLossesMatrix(PTDFMatrix):
         return self.phi_losses_adjust_array[self._busname_to_index_map[bus_name]]
 
     def get_branch_phi_losses_adj(self, branch_name):
-        row_idx = self._branchname_to_index_map[branch_name]
-        ## get the row slice
-        losses_row = self.LDF[row_idx]
-        return losses_row.dot(self.phi_losses_adjust_array)
+        return self._branch_phi_losses_adj[self._branchname_to_index_map[branch_name]]
+
+    def get_branch_losses_const(self, branch_name):
+        '''
+        returns the constant term of branch_name 's losses
+        equation, i.e., its losses phase shift + LDF_C + phi
+        losses adj
+        '''
+        return self._branch_losses_const[self._branchname_to_index_map[branch_name]]
+
+    def get_all_branch_ldf_abs_max(self):
+        '''
+        returns the LDF row abs max for every branch,
+        indexed like branches_keys
+        '''
+        return self._ldf_abs_max
+
+    def get_all_branch_ldf_c(self):
+        '''
+        returns LDF_C for every branch, indexed like branches_keys
+        '''
+        return self.LDF_C
+
+    def get_all_branch_losses_phase_shift(self):
+        '''
+        returns the losses phase shift for every branch,
+        indexed like branches_keys
+        '''
+        return self.losses_phase_shift_array
+
+    def get_all_bus_phi_losses_adj(self):
+        '''
+        returns the phi losses adj for every bus,
+        indexed like buses_keys
+        '''
+        return self.phi_losses_adjust_array
+
+    def get_branches_phi_losses_adj(self, branch_names=None):
+        '''
+        returns the phi losses adj for branch_names as an array,
+        or for every branch (indexed like branches_keys) if
+        branch_names is None
+        '''
+        if branch_names is None:
+            return self._branch_phi_losses_adj
+        branch_map = self._branchname_to_index_map
+        row_idxs = np.fromiter((branch_map[bn] for bn in branch_names), np.intp, count=len(branch_names))
+        return self._branch_phi_losses_adj[row_idxs]
@@ -12,7 +12,10 @@ This module contains several helper functions and classes that are useful when
 modifying the data dictionary
 """
 
-import os, glob, json
+import os, glob, json, re, shelve, pickle, hashlib, types, contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 import numpy as np
 import matplotlib as mpl
@@ -26,10 +29,20 @@ import egret.data.test_utils as tu
 import egret.data.lopf_utils as lu
 import egret.models.tests.test_approximations as test
 from egret.data.model_data import ModelData
-from scipy.stats.mstats import gmean,tmean
+from scipy.stats.mstats import tmean
 from egret.parsers.matpower_parser import create_ModelData
 #from egret.data.data_utils_deprecated import create_dicts_of_lccm, create_dicts_of_ptdf, create_dicts_of_fdf
 import networkx, scipy
+try:
+    import orjson
+    orjson_available = True
+except ImportError:
+    orjson_available = False
+try:
+    import pyarrow
+    pyarrow_available = True
+except ImportError:
+    pyarrow_available = False
 
 # Functions to be summarized by averaging
 mean_functions = [tu.num_buses,
@@ -73,35 +86,49 @@ sum_functions = [tu.optimal,
                  tu.duals,
                  ]
 
+# Summary statistics reported for each function; any function not
+# listed here is summarized by its average
+_SUMMARIZERS = {'solve_time' : ['avg','geomean','max'],
+                'acpf_slack' : ['avg','max'],
+                'balance_slack' : ['avg','sum'],
+                'vm_viol_sum' : ['avg','sum'],
+                'thermal_viol_sum' : ['avg','sum'],
+                'vm_UB_viol_max' : ['avg','max'],
+                'vm_LB_viol_max' : ['avg','max'],
+                'vm_viol_max' : ['avg','max'],
+                'thermal_viol_max' : ['avg','max'],
+                'pf_error_1_norm' : ['sum'],
+                'qf_error_1_norm' : ['sum'],
+                'pf_error_inf_norm' : ['avg','max'],
+                'qf_error_inf_norm' : ['avg','max'],
+                }
+
 summary_functions = {}
 sf = summary_functions
 for func in mean_functions:
     key = func.__name__
-    sf[key] = {'function' : func, 'dtype' : 'float64'}
-    if 'solve_time' in key:
-        sf[key]['summarizers'] = ['avg','geomean','max']
-    elif 'pct' in key:
-        sf[key]['summarizers'] = ['avg','max']
-    elif 'avg' in key:
-        sf[key]['summarizers'] = ['avg','max']
-    elif 'max' in key:
-        sf[key]['summarizers'] = ['avg','max']
-    elif 'sum' in key:
-        sf[key]['summarizers'] = ['avg','sum']
-    elif '1_norm' in key:
-        sf[key]['summarizers'] = ['sum']
-    elif 'inf_norm' in key:
-        sf[key]['summarizers'] = ['avg','max']
-    else:
-        sf[key]['summarizers'] = ['avg']
+    sf[key] = {'function' : func, 'summarizers' : _SUMMARIZERS.get(key, ['avg']), 'dtype' : 'float64'}
 for func in sum_functions:
     key = func.__name__
     sf[key] = {'function' : func, 'summarizers' : ['sum'], 'dtype' : 'int64'}
-    if 'duals' in key:
-        sf[key]['dtype'] = 'object'
-sf['solve_time']['summarizers'] = ['avg','geomean','max']
-sf['acpf_slack']['summarizers'] = ['avg','max']
-sf['balance_slack']['summarizers'] = ['avg','sum']
+sf['duals']['dtype'] = 'object'
+
+# column dtypes of the summary data, cast together in one astype call
+SF_DTYPES = {key : fdict['dtype'] for key,fdict in summary_functions.items()}
+
+# base model and factor truncation labels found in model names
+_MODEL_RE = re.compile('(slopf|dlopf|clopf|plopf|ptdf|btheta)')
+_TRIM_RE = re.compile('(full|e4|e2)')
+
+def _gmean(a, axis=None):
+    '''
+    Geometric mean of positive values, without the input validation and
+    masking of scipy.stats.mstats.gmean
+    '''
+    a = np.asarray(a, dtype=float)
+    if axis is None and a.size == 0:
+        return np.nan
+    return np.exp(np.log(a).mean(axis=axis))
 
 def get_colors(map_name=None, trim=0.9):
 
@@ -117,7 +144,7 @@ def get_colors(map_name=None, trim=0.9):
         'cubehelix'
     ]
 
-    colors = cmap.get_cmap(name=map_name)
+    colors = plt.get_cmap(map_name)
 
     if map_name in trim_top:
         trim_colors = ListedColormap(colors(np.linspace(0,trim,256)))
@@ -127,11 +154,48 @@ def get_colors(map_name=None, trim=0.9):
 
     return colors
 
-def read_data_file(filename="case_data_all.csv"):
+def _read_csv(path, columns=None):
+    '''
+    Reads a csv file of summary data, parsing the known numeric summary
+    columns directly to their dtypes; the remaining columns are inferred.
+    If columns is given, only those columns (and the index) are parsed.
+    '''
+    kwargs = {'index_col' : 0}
+    if columns is not None:
+        kwargs['usecols'] = lambda c: c.startswith('Unnamed:') or c in columns
+    dtype = {col : dt for col,dt in SF_DTYPES.items() if dt != 'object'}
+
+    ## the pyarrow parser does not take a callable usecols
+    if pyarrow_available and columns is None:
+        try:
+            return pd.read_csv(path, dtype=dtype, engine='pyarrow', **kwargs)
+        except ValueError:
+            pass
+
+    ## fall back to inferring every dtype if a column does not fit its
+    ## summary dtype (e.g. a count column with missing values)
+    try:
+        return pd.read_csv(path, dtype=dtype, **kwargs)
+    except ValueError:
+        return pd.read_csv(path, **kwargs)
+
+def read_data_file(filename="case_data_all.csv", columns=None):
 
     source = lu.get_summary_file_location('data')
+    path = os.path.join(source, filename)
+
+    # prefer a typed parquet copy of a csv file, unless the csv is newer
+    root, ext = os.path.splitext(path)
+    parquet_path = root + '.parquet'
+    if pyarrow_available and ext == '.csv' and os.path.exists(parquet_path):
+        if not os.path.exists(path) or os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+            path = parquet_path
+
     try:
-        df_data = pd.read_csv(os.path.join(source, filename), index_col=0)
+        if path.endswith('.parquet'):
+            df_data = pd.read_parquet(path, engine='pyarrow', columns=columns)
+        else:
+            df_data = _read_csv(path, columns=columns)
     except FileNotFoundError:
         df_data = None
 
@@ -142,10 +206,13 @@ def save_data_file(df_data, filename=None):
     if filename is None:
         raise ValueError('Must supply filename in save_data_file.')
 
-    ## save DATA to csv
+    ## save DATA to parquet (requires pyarrow) or csv, by file extension
     print('...out: {}'.format(filename))
     destination = lu.get_summary_file_location('data')
-    df_data.to_csv(os.path.join(destination, filename))
+    if filename.endswith('.parquet'):
+        df_data.to_parquet(os.path.join(destination, filename), engine='pyarrow', compression='zstd')
+    else:
+        df_data.to_csv(os.path.join(destination, filename))
 
 def save_figure(filename=None):
 
@@ -158,10 +225,104 @@ def save_figure(filename=None):
     plt.savefig(os.path.join(destination, filename))
 
 
-def read_json_files(test_case):
+# Number of uncached solution files above which read_json_files and
+# read_solution_data, with parallel=True, read them in worker processes
+_parallel_read_threshold = 16
 
-    _, case = os.path.split(test_case)
-    case, _ = os.path.splitext(case)
+def _load_json(file):
+    '''
+    Loads a JSON file, decoding with orjson when it is available
+    '''
+    with open(file, 'rb') as f:
+        raw = f.read()
+    if orjson_available:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # e.g., NaN or Infinity values, which orjson rejects
+            pass
+    return json.loads(raw)
+
+def _code_bytes(code):
+    '''
+    Returns the bytecode, names, and constants of a code object,
+    including those of any nested functions, as bytes
+    '''
+    parts = [code.co_code, repr(code.co_names).encode()]
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            parts.append(_code_bytes(const))
+        elif isinstance(const, frozenset):
+            ## set order changes with the string hash seed
+            parts.append(repr(sorted(map(repr, const))).encode())
+        else:
+            parts.append(repr(const).encode())
+    return b'\0'.join(parts)
+
+def _function_key(func):
+    '''
+    Identifies a summary function by its module, name, and a hash of its
+    code, so cached records are recomputed when the function changes.
+    (Changes to the helpers it calls are not detected.)
+    '''
+    code = getattr(func, '__code__', None)
+    digest = None if code is None else hashlib.sha1(_code_bytes(code)).hexdigest()
+    return (getattr(func, '__module__', None), getattr(func, '__qualname__', repr(func)), digest)
+
+def _open_row_cache(use_cache=False):
+    '''
+    Opens the on-disk cache of read_json_files records, keyed by the
+    solution file path. Returns a throwaway dict if use_cache is False.
+    The cache is not safe for concurrent use by several processes.
+    '''
+    if not use_cache:
+        return contextlib.nullcontext(dict())
+    location = lu.get_summary_file_location('cache')
+    return shelve.open(os.path.join(location, 'json_rows'))
+
+def _picklable(obj):
+    '''
+    Returns True if obj can be sent to worker processes, e.g., False
+    for a lambda or a function defined inside another function
+    '''
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+def _compute_row(case, file, functions):
+    '''
+    Reads one solution file and returns its index and record of summary
+    data, computed by functions, a dict of column name to data generator
+    '''
+    md_dict = _load_json(file)
+    md = ModelData(md_dict)
+    idx = md.data['system']['filename']
+    mult = md.data['system']['mult']
+    name = idx.replace(case + '_','')
+    name = name.replace('_{0:04.0f}'.format(mult * 1000), '')
+    row = {}
+    row['case'] = case.replace('pglib_opf_','')
+    row['long_case'] = case
+    row['model'] = name
+    row['mult'] = mult
+    for col,data_generator in functions.items():
+        row[col] = data_generator(md)
+
+    return idx, row
+
+def read_json_files(test_case, use_cache=False, parallel=False):
+    '''
+    Reads the solution files of test_case into a DataFrame with one row
+    per file and one column per summary function. If use_cache is True,
+    the records are kept in an on-disk cache and reused for files, and
+    summary functions, which have not changed since the last read. If
+    parallel is True, larger sets of files are read in worker processes
+    (so a calling script needs an if __name__ == '__main__' guard).
+    '''
+
+    case = Path(test_case).stem
     case_folder = lu.get_solution_file_location(test_case)
     filename = case + "_*.json"
     file_list = glob.glob(os.path.join(case_folder, filename))
@@ -169,46 +330,49 @@ def read_json_files(test_case):
     if len(file_list)==0:
         return None
 
-    data = {}
-    for file in file_list:
-        md_dict = json.load(open(os.path.join(case_folder, file)))
-        md = ModelData(md_dict)
-        idx = md.data['system']['filename']
-        mult = md.data['system']['mult']
-        name = idx.replace(case + '_','')
-        name = name.replace('_{0:04.0f}'.format(mult * 1000), '')
-        data[idx] = {}
-        data[idx]['case'] = case.replace('pglib_opf_','')
-        data[idx]['long_case'] = case
-        data[idx]['model'] = name
-        data[idx]['mult'] = mult
-        for col,fdict in summary_functions.items():
-            data_generator = fdict['function']
-            data[idx][col] = data_generator(md)
-
-        # record lazy setting
-        if 'lazy' in name:
-            data[idx]['build_mode'] = 'lazy'
+    ## collect one record per file and build the frame in one call;
+    ## records of files unchanged since the last read, computed by the
+    ## same summary functions, come from the cache
+    cache_key = tuple((col, _function_key(fdict['function'])) for col, fdict in summary_functions.items())
+    with _open_row_cache(use_cache) as cache:
+        records = {}
+        stamps = {}
+        for file in file_list:
+            stat = os.stat(file)
+            stamps[file] = (stat.st_mtime_ns, stat.st_size, cache_key)
+            cached = cache.get(file)
+            if cached is not None and cached[0] == stamps[file]:
+                records[file] = cached[1:]
+
+        ## the remaining files are independent of each other, so
+        ## larger sets can be read in parallel worker processes; the
+        ## summary functions are sent to the workers, so they are
+        ## read serially if any of them cannot be pickled
+        missing = [file for file in file_list if file not in records]
+        functions = {col : fdict['function'] for col, fdict in summary_functions.items()}
+        if parallel and len(missing) >= _parallel_read_threshold and _picklable(functions):
+            with ProcessPoolExecutor() as executor:
+                computed = list(executor.map(_compute_row, repeat(case), missing,
+                                             repeat(functions), chunksize=8))
         else:
-            data[idx]['build_mode'] = 'default'
+            computed = [_compute_row(case, file, functions) for file in missing]
+        for file, (idx, row) in zip(missing, computed):
+            records[file] = (idx, row)
+            cache[file] = (stamps[file], idx, row)
 
-        # record factor truncation setting, if any
-        if any(e in name for e in ['e5','e4','e3','e2']):
-            data[idx]['trim'] = name[-2:]
-        else:
-            data[idx]['trim'] = 'full'
+    idx_list = [records[file][0] for file in file_list]
+    rows = [records[file][1] for file in file_list]
 
-        # record base model
-        base_model = name
-        setting_list = ['_lazy','_full','_e5','_e4','_e3','_e2']
-        remove_list = [s for s in setting_list if s in name]
-        for r in remove_list:
-            base_model = base_model.replace(r,'')
-        data[idx]['base_model'] = base_model
+    df_data = pd.DataFrame.from_records(rows, index=idx_list)
+    df_data = df_data.astype(SF_DTYPES)
+
+    # record the lazy setting, the factor truncation setting (if
+    # any), and the base model of every row at once
+    model = df_data['model']
+    df_data['build_mode'] = np.where(model.str.contains('lazy', regex=False), 'lazy', 'default')
+    df_data['trim'] = np.where(model.str.contains('e[2-5]'), model.str[-2:], 'full')
+    df_data['base_model'] = model.str.replace('_lazy|_full|_e[2-5]', '', regex=True)
 
-    df_data = pd.DataFrame(data).transpose()
-    for col,fdict in summary_functions.items():
-        df_data[col] = df_data[col].astype(fdict['dtype'])
     df_data = normalize_solve_time(df_data)
     df_data = normalize_total_cost(df_data)
 
@@ -216,11 +380,14 @@ def read_json_files(test_case):
 
 def update_case_data(case_list, tag=None):
 
-    data = pd.DataFrame(data=None)
+    frames = []
     for case in case_list:
         df = read_json_files(case)
         if df is not None:
-            data = pd.concat([data, df])
+            frames.append(df)
+    if not frames:
+        return
+    data = pd.concat(frames)
     if data.empty:
         return
 
@@ -234,12 +401,15 @@ def update_case_data(case_list, tag=None):
 
 def update_all_case_data(case_sets, tag=None):
 
-    data = pd.DataFrame(data=None)
+    frames = []
     for cs in case_sets:
         filename = 'case_data_' + cs + '.csv'
         df = read_data_file(filename=filename)
         if df is not None:
-            data = pd.concat([data, df])
+            frames.append(df)
+    if not frames:
+        return
+    data = pd.concat(frames)
     if data.empty:
         return
 
@@ -256,26 +426,25 @@ def nominal_case_data(column, tag=None):
     filename = 'case_data'
     if tag is not None:
         filename += '_' + tag
-    df = read_data_file(filename=filename + '.csv')
+    df = read_data_file(filename=filename + '.csv', columns=['case','model','mult',column])
     if df is None:
         return
 
     # Remove all rows with mult != 1.000
     df.drop(df[df['mult'] != 1.0].index, inplace=True)
 
-    idx_list = []
-    [idx_list.append(x) for x in df['case'].values if x not in idx_list]
-
     #col_list = []
     #[col_list.append(x) for x in df['model'].values if x not in col_list]
     col_list = ['slopf','dlopf_full','dlopf_lazy_e2','clopf_full','clopf_lazy_e2','plopf_full','plopf_lazy_e2','ptdf_full','ptdf_lazy_e2','btheta']
 
-    data = pd.DataFrame(data=None, index=idx_list, columns=col_list)
-    for index, row in df.iterrows():
-        idx = row['case']
-        col = row['model']
-        if col in col_list:
-            data.loc[idx, col] = row[column]
+    # reshape to one row per case (in order of appearance) and one column
+    # per model, keeping the last row of any repeated (case, model)
+    case_list = pd.unique(df['case'])
+    df = df.drop_duplicates(subset=['case','model'], keep='last')
+    data = df.pivot(index='case', columns='model', values=column)
+    data = data.reindex(index=case_list, columns=col_list)
+    data.index.name = None
+    data.columns.name = None
 
     data.sort_index(axis=1, inplace=True)
 
@@ -294,14 +463,16 @@ def nominal_all_data(case_keys, column='solve_time', function='gm'):
         if df is None:
             continue
 
+        # plain numpy reductions on the dense column values, which
+        # skip the masked array wrappers of scipy.stats.mstats
         for col in df.columns:
-            arr = df[col].dropna(0).values
+            arr = df[col].dropna().values.astype(float)
             if function=='gm':
-                f = gmean(arr)
+                f = _gmean(arr)
             elif function=='tm':
-                f = tmean(arr)
+                f = arr.mean()
             elif function=='max':
-                f = max(arr)
+                f = arr.max()
             else:
                 message = '{} not accepted. Use gm, tm, or max.'.format(function)
                 raise ValueError(message)
@@ -319,11 +490,10 @@ def filter_dataframe(df_data, data_filters=None):
     if data_filters is not None:
         for col,keepers in data_filters.items():
             if col in df_data.columns:
-                drop_rows = []
-                for idx,row in df_data.iterrows():
-                    if not any(k in row[col] for k in keepers):
-                        drop_rows.append(idx)
-                df_data = df_data.drop(drop_rows)
+                # keep rows where any keeper is a substring of the entry
+                pattern = '|'.join(re.escape(k) for k in keepers)
+                keep = df_data[col].astype(str).str.contains(pattern, regex=True, na=False)
+                df_data = df_data[keep]
 
     return df_data
 
@@ -346,8 +516,7 @@ def format_model_desc(obj, column_name=None):
             obj.columns = cols
             return obj
         else:
-            for i in obj.index:
-                obj.loc[i, column_name] = make_replacements(obj.loc[i,column_name])
+            obj[column_name] = obj[column_name].map(make_replacements)
             return obj
 
     elif isinstance(obj, list):
@@ -357,7 +526,7 @@ def format_model_desc(obj, column_name=None):
 
 
 def generate_boxplot(data_filters=None, data_name='solve_time', data_unit=None, order=None, category='model', hue=None,
-                         scale='linear', filename=None, sns_plot=sns.boxplot, palette=None, show_plot=True):
+                         scale='linear', filename=None, sns_plot=sns.boxplot, palette=None, show_plot=True, ax=None):
 
     if filename is None:
         filename = "all_summary_data.csv"
@@ -389,7 +558,9 @@ def generate_boxplot(data_filters=None, data_name='solve_time', data_unit=None,
     #ax = sns.stripplot(y=category, x=data_name, data=df_data, order=order, dodge=True, size=2.5)
     #ax = sns.boxplot(y=category, x=data_name, data=df_data, **settings)
     sns.set_theme(style="ticks")
-    ax = sns_plot(y=category, x=data_name, data=df_data, **settings)
+    # plot into the axes passed in, if any, so the caller can reuse one figure
+    reuse_ax = ax is not None
+    ax = sns_plot(y=category, x=data_name, data=df_data, ax=ax, **settings)
     ax.set_ylabel(category)
     if data_unit is None:
         ax.set_xlabel(data_name)
@@ -409,6 +580,8 @@ def generate_boxplot(data_filters=None, data_name='solve_time', data_unit=None,
 
     if show_plot:
         plt.show()
+    elif reuse_ax:
+        ax.clear()
     else:
         plt.close('all')
 
@@ -420,6 +593,12 @@ def generate_boxplots(show_plot=False):
     dense_list = ['dlopf','clopf','plopf','ptdf']
     case_sets = ['all','ieee','k','rte','sdet','tamu','pegase','misc']
 
+    # draw every boxplot on one figure, clearing it in between
+    ax = None
+    if not show_plot:
+        sns.set_theme(style="ticks")
+        fig, ax = plt.subplots()
+
     for cs in case_sets:
 
         # default mode results
@@ -432,7 +611,7 @@ def generate_boxplots(show_plot=False):
         filters['file_tag'] = cs + '_allbuilds'
         model_order = test.get_test_model_list()
         generate_boxplot(data_name='solve_time', data_unit='s', data_filters=filters, category='model', order=model_order,
-                         filename=filename, scale='log', sns_plot=sns.stripplot, palette='gnuplot', show_plot=show_plot)
+                         filename=filename, scale='log', sns_plot=sns.stripplot, palette='gnuplot', show_plot=show_plot, ax=ax)
 
         # default/lazy mode results
         filename = 'case_data_' + cs + '.csv'
@@ -441,7 +620,7 @@ def generate_boxplots(show_plot=False):
         filters['trim'] = ['full']
         filters['file_tag'] = cs + '_lazy_options'
         generate_boxplot(data_name='solve_time', data_unit='s', data_filters=filters, category='base_model', order=filters['base_model'],
-                         filename=filename, scale='linear', hue='build_mode', palette='gnuplot2', show_plot=show_plot)
+                         filename=filename, scale='linear', hue='build_mode', palette='gnuplot2', show_plot=show_plot, ax=ax)
 
         # factor tolerance results
         filename = 'case_data_' + cs + '.csv'
@@ -450,7 +629,7 @@ def generate_boxplots(show_plot=False):
         filters['build_mode'] = ['default']
         filters['file_tag'] = cs + '_trim_options'
         generate_boxplot(data_name='solve_time', data_unit='s', data_filters=filters, category='base_model', order=filters['base_model'],
-                         filename=filename, scale='linear', hue='trim', palette='gnuplot2', show_plot=show_plot)
+                         filename=filename, scale='linear', hue='trim', palette='gnuplot2', show_plot=show_plot, ax=ax)
 
         # factor tolerance results
         filename = 'case_data_' + cs + '.csv'
@@ -458,33 +637,50 @@ def generate_boxplots(show_plot=False):
         filters['model'] = ['acopf','slopf','dlopf_full','dlopf_lazy_e2','clopf_full','clopf_lazy_e2','plopf_full','plopf_lazy_e2','ptdf_full','ptdf_lazy_e2','btheta']
         filters['file_tag'] = cs + '_compare_simplified'
         generate_boxplot(data_name='solve_time', data_unit='s', data_filters=filters, category='model', order=filters['model'],
-                         filename=filename, scale='linear', sns_plot=sns.boxplot, palette='gnuplot2', show_plot=show_plot)
+                         filename=filename, scale='linear', sns_plot=sns.boxplot, palette='gnuplot2', show_plot=show_plot, ax=ax)
 
+    if ax is not None:
+        plt.close(fig)
 
 
 
-def generate_network_data(test_case, test_model_list, data_generator=None):
 
-    case_location = lu.get_solution_file_location(test_case)
-    src_folder, case_name = os.path.split(test_case)
-    case_name, ext = os.path.splitext(case_name)
+def generate_network_data(test_case, test_model_list, data_generator=None):
 
     if data_generator is None:
         data_generator = tu.thermal_viol
-    func_name = data_generator.__name__
 
-    df_data = pd.DataFrame(data=None)
+    generate_network_data_multi(test_case, test_model_list, [data_generator])
+
+
+def generate_network_data_multi(test_case, test_model_list, data_generators):
+    '''
+    Writes one network data file per data generator, reading the nominal
+    solution of each test model only once for all of the generators
+    '''
+    case_location = lu.get_solution_file_location(test_case)
+    case_name = Path(test_case).stem
+
+    frames = {data_generator.__name__ : [] for data_generator in data_generators}
     for test_model in test_model_list:
         try:
-            df_raw = read_nominal_data(case_location, test_model, data_generator=data_generator)
+            md = _load_nominal_model(case_location, test_model)
         except:
-            df_raw = pd.DataFrame(data=None, index=[test_model])
-        df_data = pd.concat([df_data, df_raw], sort=True)
-    df_data = df_data.transpose()
+            md = None
+        for data_generator in data_generators:
+            try:
+                df_raw = _nominal_data_frame(md, test_model, data_generator)
+            except:
+                df_raw = pd.DataFrame(data=None, index=[test_model])
+            frames[data_generator.__name__].append(df_raw)
 
-    ## save DATA to csv
-    filename = func_name + '_' + case_name + ".csv"
-    save_data_file(df_data, filename=filename)
+    for func_name, func_frames in frames.items():
+        df_data = pd.concat(func_frames, sort=True)
+        df_data = df_data.transpose()
+
+        ## save DATA to csv
+        filename = func_name + '_' + case_name + ".csv"
+        save_data_file(df_data, filename=filename)
 
 
 def generate_barplot(test_case, test_model_dict=None, data_name=None, units=None, file_tag=None, show_plot=False):
@@ -497,8 +693,7 @@ def generate_barplot(test_case, test_model_dict=None, data_name=None, units=None
         units = data_name + " (" + units + ")"
 
     def help_get_data(case):
-        src_folder, case_name = os.path.split(case)
-        case_name, ext = os.path.splitext(case_name)
+        case_name = Path(case).stem
         filename = data_name + "_" + case_name + ".csv"
         df_data = get_data(filename, test_model_dict=test_model_dict)
         if df_data.empty:
@@ -506,33 +701,24 @@ def generate_barplot(test_case, test_model_dict=None, data_name=None, units=None
         return df_data, case_name
 
     if isinstance(test_case, list):
-        df_data = pd.DataFrame(data=None)
+        frames = []
         for case in test_case:
             _df, _ = help_get_data(case)
-            df_data = df_data.append(_df, ignore_index=True)
+            frames.append(_df)
+        df_data = pd.concat(frames, ignore_index=True)
         case_name = 'summary'
     else:
         df_data, case_name = help_get_data(test_case)
 
     # median, mean, and maximum error statistics
-    models = ['slopf','dlopf','clopf','plopf','ptdf','btheta']
-    trims = ['full', 'e4', 'e2']
     labels = ['model','median','mean','max','trim']
-    summary = pd.DataFrame(data=None, columns=labels)
     data = df_data.fillna(0).abs()
-    for c in df_data.columns:
-        row = {}
-        model = [m for m in models if m in c][0]
-        if model in ['dlopf','clopf','plopf','ptdf']:
-            trim = [t for t in trims if t in c][0]
-        else:
-            trim = 'full'
-        row['model'] = model
-        row['median'] = data[c].median()
-        row['mean'] = data[c].mean()
-        row['max'] = data[c].max()
-        row['trim'] = trim
-        summary = summary.append(row, ignore_index=True)
+    stats = data.agg(['median','mean','max']).T
+    model = stats.index.str.extract(_MODEL_RE, expand=False)
+    trim = stats.index.str.extract(_TRIM_RE, expand=False)
+    trim = trim.where(model.isin(['dlopf','clopf','plopf','ptdf']), 'full')
+    summary = pd.DataFrame({'model' : model, 'median' : stats['median'].values, 'mean' : stats['mean'].values,
+                            'max' : stats['max'].values, 'trim' : trim}, columns=labels)
     summary = format_model_desc(summary, 'model')
 
     ## Create plots
@@ -585,18 +771,17 @@ def generate_heatmap(test_case, test_model_dict=None, data_name=None, index_name
     if df_data.empty:
         return
 
-    # sort by average absolute errors and display at most N rows
-    data = df_data.fillna(0)
+    # sort by average absolute errors, counting missing values
+    # as zero, and display at most N rows
+    data = df_data.to_numpy(dtype=float)
+    data = np.where(np.isnan(data), 0., data)
+    vmin = data.min()
+    vmax = data.max()
     if N is not None:
-        df_data['abs_max'] = data.abs().max(axis=1)
-        df_data = df_data.sort_values('abs_max', ascending=False)
-        df_data = df_data.drop('abs_max', axis=1)
-        df_data = df_data.head(50)
-        vmin = min(data.values.min(), -0.001)
-        vmax = max(data.values.max(), 0.001)
-    else:
-        vmin = data.values.min()
-        vmax = data.values.max()
+        order = np.argsort(-np.abs(data).max(axis=1), kind='stable')
+        df_data = df_data.iloc[order[:50]]
+        vmin = min(vmin, -0.001)
+        vmax = max(vmax, 0.001)
 
     kwargs={}
     cbar_dict = {}
@@ -646,8 +831,7 @@ def generate_plot_data(case_list):
     data_list = [tu.pf_error, tu.qf_error, tu.thermal_viol, tu.vm_viol, tu.lmp]
     tml = test.get_test_model_list()
     for c in case_list:
-        for d in data_list:
-            generate_network_data(c, tml, data_generator=d)
+        generate_network_data_multi(c, tml, data_list)
 
 
 def generate_barplots(case_list=None, list_name=None, show_plot=False):
@@ -708,17 +892,13 @@ def generate_sensitivity(test_case, model_dict, y_data='acpf_slack', y_units='MW
         print('...skipping sensitivity graph due to lack of data.')
         return
 
-    # create empty dataframe
-    idx_list = list(set(df.mult.values))
-    idx_list.sort()
-    df_data = pd.DataFrame(data=None, index=idx_list, columns=model_list)
-
-    # fill dataframe with data
-    for idx,row in df.iterrows():
-        model = row.model
-        x = row.mult
-        y = row[y_data]
-        df_data.loc[x,model] = y
+    # reshape to one row per demand multiplier and one column per model,
+    # keeping the last row of any repeated (mult, model)
+    df = df.drop_duplicates(subset=['mult','model'], keep='last')
+    df_data = df.pivot(index='mult', columns='model', values=y_data)
+    df_data = df_data.reindex(index=np.sort(pd.unique(df['mult'])), columns=model_list)
+    df_data.index.name = None
+    df_data.columns.name = None
 
     ## save DATA to csv
     filename = "sensitivity_" + case_name + "_" + y_data + ".csv"
@@ -748,7 +928,7 @@ def generate_sensitivity(test_case, model_dict, y_data='acpf_slack', y_units='MW
         else:
             ms['marker'] = None
         ms['fillstyle'] = 'none'
-        x = idx_list
+        x = df_data.index
         y = df_data[m]
         ax.plot(x, y, **ms)
 
@@ -792,7 +972,7 @@ def summarize_sensitivity(data_name, flag=None, show_plot=False):
     if 'pglib_opf_case300_ieee' in case_list:
         case_list.remove('pglib_opf_case300_ieee')
 
-    df = pd.DataFrame(data=None)
+    frames = []
     for case in case_list:
         filename = 'sensitivity_' + case + '_' + data_name + '.csv'
         _df = read_data_file(filename)
@@ -800,7 +980,8 @@ def summarize_sensitivity(data_name, flag=None, show_plot=False):
             _df.drop('acopf', axis=1, inplace=True)
         _df = _df.melt(var_name='model', value_name=data_name)
         _df['case'] = case[10:]
-        df = pd.concat([df, _df])
+        frames.append(_df)
+    df = pd.concat(frames)
 
     if flag is not None:
         filename = 'sensitivity_pglib_opf_' + flag + '_' + data_name + '.csv'
@@ -838,16 +1019,13 @@ def update_data_file(test_case):
     try:
         df1 = read_data_file(filename='case_data_all.csv')
     except:
-        df1 = pd.DataFrame(data=None)
+        df1 = None
 
     df2 = read_json_files(test_case)
 
-    # merge new data
-    new_index = list(set(list(df1.index.values) + list(df2.index.values)))
-    new_columns = list(set(list(df1.columns.values) + list(df2.columns.values)))
-    update = df1.reindex(index=new_index,columns=new_columns)
-    for idx,row in df2.iterrows():
-        update.loc[idx] = row
+    # merge new data, replacing any existing rows of the same solution file
+    update = pd.concat([df for df in (df1, df2) if df is not None])
+    update = update[~update.index.duplicated(keep='last')]
     update.sort_index(inplace=True)
 
     ## save DATA to csv
@@ -859,22 +1037,16 @@ def update_data_file(test_case):
 
 def create_table1_solverstatus(df, tag=None):
 
-    model_list = list(set(list(df.model.values)))
     desc_list = ['base_model','trim','build_mode']
     count_list = ['optimal','infeasible','duals','internalSolverError','maxIterations','maxTimeLimit','solverFailure']
-    df1 = pd.DataFrame(data=None, index=model_list, columns=desc_list+count_list)
-
-    # Table 1
-    for idx,row in df1.iterrows():
-        _df = df[df.model==idx]
-        dummy_row = _df.iloc[0]
-        for col in desc_list:
-            row[col] = dummy_row[col]
-        for col in count_list:
-            _col = _df[col]
-            _col[_col=='True'] = 1
-            _col[_col=='False'] = 0
-            row[col] = sum(_col.astype(int))
+
+    # Table 1: count the solver statuses of each model
+    counts = df.replace({col : {'True' : 1, 'False' : 0} for col in count_list})
+    counts = counts.astype({col : int for col in count_list})
+    agg_dict = {col : 'first' for col in desc_list}
+    agg_dict.update({col : 'sum' for col in count_list})
+    df1 = counts.groupby('model', sort=False).agg(agg_dict)
+    df1.index.name = None
     df1 = df1.sort_values(by=['base_model','build_mode','trim'], ascending=[1,1,0])
 
     ## save DATA to csv
@@ -886,21 +1058,17 @@ def create_table1_solverstatus(df, tag=None):
 
 def create_table2_timeandcost(df, tag=None):
 
-    model_list = list(set(list(df.model.values)))
     desc_list = ['base_model','trim','build_mode']
     gmean_list = ['solve_time_normalized','total_cost_normalized','acpf_slack','num_variables','num_constraints','num_nonzeros']
-    df2 = pd.DataFrame(data=None, index=model_list, columns=desc_list+gmean_list)
-
-    # Table 2
-    for idx, row in df2.iterrows():
-        _df = df[df.model == idx]
-        dummy_row = _df.iloc[0]
-        for col in desc_list:
-            row[col] = dummy_row[col]
-        for col in gmean_list:
-            df_nz = _df[_df[col]!=0]
-            array = abs(df_nz[col].dropna())
-            row[col] = gmean(array)
+
+    def nonzero_gmean(col):
+        return _gmean(abs(col[col!=0].dropna()))
+
+    # Table 2: geometric means of the nonzero values of each model
+    agg_dict = {col : 'first' for col in desc_list}
+    agg_dict.update({col : nonzero_gmean for col in gmean_list})
+    df2 = df.groupby('model', sort=False).agg(agg_dict)
+    df2.index.name = None
     df2 = df2.sort_values(by=['base_model','build_mode','trim'], ascending=[1,1,0])
 
     ## save DATA to csv
@@ -912,23 +1080,19 @@ def create_table2_timeandcost(df, tag=None):
 
 def create_table3_violations(df, tag=None):
 
-    model_list = list(set(list(df.model.values)))
     desc_list = ['base_model','trim','build_mode']
     tmean_list = ['vm_viol_sum','vm_viol_max','thermal_viol_sum','thermal_viol_max']
     max_list = tmean_list
-    df3_list = [c + '_avg' for c in tmean_list] + [c + '_max' for c in max_list]
-    df3 = pd.DataFrame(data=None, index=model_list, columns=desc_list+df3_list)
-
-    # Table 3
-    for idx, row in df3.iterrows():
-        _df = df[df.model == idx]
-        dummy_row = _df.iloc[0]
-        for col in desc_list:
-            row[col] = dummy_row[col]
-        for col in tmean_list:
-            row[col + '_avg'] = tmean(_df[col].dropna())
-        for col in max_list:
-            row[col + '_max'] = max(_df[col])
+
+    def dropna_tmean(col):
+        return tmean(col.dropna())
+
+    # Table 3: mean and maximum violations of each model
+    agg_dict = {col : (col, 'first') for col in desc_list}
+    agg_dict.update({col + '_avg' : (col, dropna_tmean) for col in tmean_list})
+    agg_dict.update({col + '_max' : (col, 'max') for col in max_list})
+    df3 = df.groupby('model', sort=False).agg(**agg_dict)
+    df3.index.name = None
     df3 = df3.sort_values(by=['base_model','build_mode','trim'], ascending=[1,1,0])
 
     ## save DATA to csv
@@ -941,36 +1105,24 @@ def create_table3_violations(df, tag=None):
 
 def create_table(df_in, col_name, max_buses=None, min_buses=None, tag=None):
 
-    model_list = list(set(list(df_in.model.values)))
+    model_list = pd.unique(df_in['model']).tolist()
     desc_list = ['base_model','trim','build_mode']
     case_list = lu.case_names
-    df_out = pd.DataFrame(data=None, index=model_list, columns=desc_list+case_list)
-
-    # Fill in table
-    for idx,row in df_out.iterrows():
-        _df = df_in[df_in.model==idx]
-        dummy_row = _df.iloc[0]
-        for col in desc_list:
-            row[col] = dummy_row[col]
-        for case in case_list:
-            _case = _df[_df.long_case==case]
-            if len(_case.index) == 1:
-                row[case] = _case.iloc[0][col_name]
-            elif len(_case.index) > 1:
-                _case = _case[_case.mult==1]
-                row[case] = _case.iloc[0][col_name]
-            else:
-                pass
+
+    # Fill in table with the value of each model and case: the only row
+    # if there is one, otherwise the row with nominal demand (mult == 1)
+    df_desc = df_in.groupby('model', sort=False)[desc_list].first()
+    num_rows = df_in.groupby(['model','long_case'])['mult'].transform('size')
+    df_case = df_in[(num_rows == 1) | (df_in['mult'] == 1)]
+    df_case = df_case.drop_duplicates(subset=['model','long_case'])
+    df_case = df_case.pivot(index='model', columns='long_case', values=col_name)
+    df_out = pd.concat([df_desc, df_case.reindex(columns=case_list)], axis=1)
+    df_out = df_out.reindex(index=model_list)
     df_out = df_out.sort_values(by=['base_model','build_mode','trim'], ascending=[1,1,0])
 
     # add short case name and num_bus to top two rows
-    df_top = pd.DataFrame(data=None, index=['case', 'num_buses'], columns=case_list)
-    for case in case_list:
-        _df = df_in[df_in.long_case==case]
-        if not _df.empty:
-            dummy_row = _df.iloc[0]
-            df_top.loc['case',case] = dummy_row['case']
-            df_top.loc['num_buses',case] = dummy_row['num_buses']
+    df_top = df_in.drop_duplicates(subset='long_case').set_index('long_case')
+    df_top = df_top[['case','num_buses']].T.reindex(columns=case_list)
     df_out = pd.concat([df_top, df_out], sort=False)
 
     # Find the columns where each value is null and drop from the dataframe
@@ -1027,7 +1179,7 @@ def normalize_solve_time(df_data, model_benchmark='acopf'):
     df_benchmark = df_benchmark.select_dtypes(include='number')
     arr = list(df_benchmark.solve_time.values)
     arr = [a for a in arr if a != 0]
-    gm_benchmark = gmean(arr)
+    gm_benchmark = _gmean(arr)
 
     df_data['solve_time_normalized'] = df_data['solve_time'] / gm_benchmark
     df_data['speedup'] = gm_benchmark / df_data['solve_time']
@@ -1040,57 +1192,81 @@ def normalize_total_cost(df_data, model_benchmark='acopf'):
     is_benchmark = df_data['model']==model_benchmark
     df_benchmark = df_data[is_benchmark]
 
-    model_list = list(set(df_data.model.values))
-    model_list.sort()
-
-    for m in model_list:
-        df_m = df_data[df_data.model==m]
-        for idx,row in df_m.iterrows():
-            mult = row.mult
-            tc1 = row.total_cost
-            df2 = df_benchmark[df_benchmark.mult==mult]
-            tc2 = df2.total_cost.values.item()
-            try:
-                val = tc1 / tc2
-            except:
-                val = None
-            df_data.loc[idx, 'total_cost_normalized'] = val
+    # look up the benchmark cost at the demand multiplier of every row
+    tc_benchmark = df_benchmark.set_index('mult')['total_cost']
+    df_data['total_cost_normalized'] = df_data['total_cost'] / df_data['mult'].map(tc_benchmark)
 
     return df_data
 
 
-def read_solution_data(case_folder, test_model, data_generator=tu.solve_time):
+def _compute_solution_row(case, test_model, data_generator, file):
+    '''
+    Reads one solution file and returns its index and record of data_generator data
+    '''
+    md_dict = _load_json(file)
+    md = ModelData(md_dict)
+    idx = md.data['system']['filename']
+    row = {}
+    row['case'] = case
+    row['model'] = test_model
+    row['mult'] = md.data['system']['mult']
+    row[data_generator.__name__] = data_generator(md)
+
+    return idx, row
+
+def read_solution_data(case_folder, test_model, data_generator=tu.solve_time, parallel=False):
+    '''
+    Reads data_generator's data from the test_model solution files in
+    case_folder. If parallel is True, larger sets of files are read in
+    worker processes (so a calling script needs an
+    if __name__ == '__main__' guard).
+    '''
     parent, case = os.path.split(case_folder)
     filename = case + "_" + test_model + "_*.json"
     file_list = glob.glob(os.path.join(case_folder, filename))
 
-    data = {}
-    data_type = data_generator.__name__
-    for file in file_list:
-        md_dict = json.load(open(os.path.join(case_folder, file)))
-        md = ModelData(md_dict)
-        idx = md.data['system']['filename']
-        data[idx] = {}
-        data[idx]['case'] = case
-        data[idx]['model'] = test_model
-        data[idx]['mult'] = md.data['system']['mult']
-        data[idx][data_type] = data_generator(md)
+    ## files are independent of each other, so larger sets can be read
+    ## in parallel worker processes, unless data_generator cannot be
+    ## pickled to send to them (e.g., a lambda)
+    if parallel and len(file_list) >= _parallel_read_threshold and _picklable(data_generator):
+        with ProcessPoolExecutor() as executor:
+            rows = list(executor.map(_compute_solution_row, repeat(case), repeat(test_model),
+                                     repeat(data_generator), file_list, chunksize=8))
+    else:
+        rows = [_compute_solution_row(case, test_model, data_generator, file) for file in file_list]
+    data = dict(rows)
 
     df_data = pd.DataFrame(data).transpose()
 
     return df_data
 
 def read_nominal_data(case_folder, test_model, data_generator=tu.thermal_viol):
+    md = _load_nominal_model(case_folder, test_model)
+    return _nominal_data_frame(md, test_model, data_generator)
+
+def _load_nominal_model(case_folder, test_model):
+    '''
+    Returns the ModelData of the nominal demand solution of test_model,
+    or None if its solution file cannot be read
+    '''
     parent, case = os.path.split(case_folder)
     ## assumed that detailed data is only needed for the nominal demand case
     filename = case + "_" + test_model + "_1000.json"
 
     try:
-        md_dict = json.load(open(os.path.join(case_folder, filename)))
+        md_dict = _load_json(os.path.join(case_folder, filename))
     except:
+        return None
+
+    return ModelData(md_dict)
+
+def _nominal_data_frame(md, test_model, data_generator):
+    '''
+    Returns the data_generator data of md as a one-row frame indexed by test_model
+    '''
+    if md is None:
         return pd.DataFrame(data=None, index=[test_model])
 
-    md = ModelData(md_dict)
     data = data_generator(md)
     cols = list(data.keys())
     new_cols = [int(c) for c in cols]
@@ -1106,24 +1282,19 @@ def generate_speedup_data(case_list=None, mean_data='solve_time_geomean', benchm
     if case_list is None:
         case_list = lu.case_names[:]
 
-    data_dict = {}
+    rows = []
     cases = []
     for case in case_list:
         try:
             input = "summary_data_" + case + ".csv"
             df_data = get_data(input)
-            models = list(df_data.index.values)
-            for m in models:
-                val = df_data.at[benchmark, mean_data] / df_data.at[m, mean_data]
-                if m in data_dict:
-                    data_dict[m].append(val)
-                else:
-                    data_dict[m] = [val]
+            rows.append(df_data.at[benchmark, mean_data] / df_data[mean_data])
             cases.append(case)
         except:
             pass
 
-    df_data = pd.DataFrame(data_dict,index=cases)
+    df_data = pd.DataFrame(rows, index=cases)
+    df_data.columns.name = None
     df_data.loc['AVERAGE'] = df_data.mean()
 
     ## save DATA to csv
@@ -1215,8 +1386,8 @@ def generate_sensitivity_data(test_case, test_model_list, data_generator=tu.acpf
         acopf_avg = sum(df_acopf[idx].values for idx in df_acopf) / len(df_acopf)
         print('data is nominal with acopf values averaging {}'.format(acopf_avg))
 
-    # empty dataframe to add data into
-    df_data = pd.DataFrame(data=None)
+    # dataframes to add data into
+    frames = []
 
     # iterate over test_models
     if 'acopf'  not in test_model_list:
@@ -1227,7 +1398,6 @@ def generate_sensitivity_data(test_case, test_model_list, data_generator=tu.acpf
 
         # calculate norm from df_diff columns
         data = {}
-        avg_ac_data = sum(df_acopf[idx].values for idx in df_acopf) / len(df_acopf)
         for col in df_approx:
             if data_is_vector is True:
                 data[col] = np.linalg.norm(df_approx[col].values - df_acopf[col].values, vector_norm)
@@ -1238,8 +1408,9 @@ def generate_sensitivity_data(test_case, test_model_list, data_generator=tu.acpf
 
         # record test_model column in DataFrame
         df_col = pd.DataFrame(data, index=[test_model])
-        df_data = pd.concat([df_data, df_col], sort=True)
+        frames.append(df_col)
 
+    df_data = pd.concat(frames, sort=True)
 
     ## save DATA as csv
     y_axis_data = data_generator.__name__
@@ -1255,14 +1426,19 @@ def generate_pareto_all_data(test_model_list, data_column='solve_time_normalized
     filename = "summary_data_*.csv"
     file_list = glob.glob(os.path.join(data_location, filename))
 
-    df_x = pd.DataFrame(data=None)
+    columns = []
     for file in file_list:
-        src_folder, case_name = os.path.split(file)
-        case_name, ext = os.path.splitext(case_name)
+        case_name = Path(file).stem
         case_name = case_name.replace('summary_data_pglib_opf_','')
 
         df_raw = get_data(file)
-        df_x[case_name] = df_raw[data_column]
+        columns.append(df_raw[data_column].rename(case_name))
+
+    # one column per test case, with rows for the models of the first file
+    if columns:
+        df_x = pd.concat(columns, axis=1).reindex(columns[0].index)
+    else:
+        df_x = pd.DataFrame(data=None)
 
     ## Add last colunm
     #   - try to use 'geomean' for normalized data (e.g. solve time) and 'avg' for arithmetic data
@@ -1271,10 +1447,10 @@ def generate_pareto_all_data(test_model_list, data_column='solve_time_normalized
 
     # remove test case if any model was AC-infeasible
     nullcol = df_x.columns[df_x.isnull().any()].to_list()
-    clean_data = df_x.drop(nullcol, axis=1)
-    if mean_type is 'geomean':
-        mean_data = gmean(clean_data, axis=1)
-    if mean_type is 'avg':
+    clean_data = df_x.drop(nullcol, axis=1).to_numpy(dtype=float)
+    if mean_type == 'geomean':
+        mean_data = _gmean(clean_data, axis=1)
+    if mean_type == 'avg':
         mean_data = tmean(clean_data, axis=1)
     df_x[data_column] = mean_data
 
@@ -1584,34 +1760,39 @@ def create_shell_list(G):
 
 
 def remove_unmonitored(G, md, s_tol=None, v_tol=None):
-    import math
 
     num_edges = networkx.number_of_edges(G)
     branches = dict(md.elements(element_type='branch'))
     buses = dict(md.elements(element_type='bus'))
 
+    def branch_array(key):
+        return np.fromiter((branch[key] for branch in branches.values()), float, count=len(branches))
+
+    def bus_array(key):
+        return np.fromiter((bus[key] for bus in buses.values()), float, count=len(buses))
+
     if s_tol is not None:
-        for k,branch in branches.items():
-            smax = branch['rating_long_term']
-            pf = branch['pf']
-            pt = branch['pt']
-            qf = branch['qf']
-            qt = branch['qt']
-            sp = math.sqrt(max(pf**2 + qf**2, pt**2 + qt**2))
-            slack = 1 - sp / smax
-            if slack > s_tol:
+        smax = branch_array('rating_long_term')
+        pf = branch_array('pf')
+        pt = branch_array('pt')
+        qf = branch_array('qf')
+        qt = branch_array('qt')
+        sp = np.sqrt(np.maximum(pf**2 + qf**2, pt**2 + qt**2))
+        slack = 1 - sp / smax
+        for k, unmonitored in zip(branches, slack > s_tol):
+            if unmonitored:
                 rm = list(G.edges('pf'+k, data=True))
                 G.remove_edges_from(rm)
                 rm = list(G.edges('qf'+k, data=True))
                 G.remove_edges_from(rm)
 
     if v_tol is not None:
-        for n,bus in buses.items():
-            vmax = bus['v_max']
-            vmin = bus['v_min']
-            vm = bus['vm']
-            slack = (vm - vmin) / (vmax - vmin)
-            if slack < v_tol or (1-slack) < v_tol:
+        vmax = bus_array('v_max')
+        vmin = bus_array('v_min')
+        vm = bus_array('vm')
+        slack = (vm - vmin) / (vmax - vmin)
+        for n, unmonitored in zip(buses, (slack < v_tol) | ((1-slack) < v_tol)):
+            if unmonitored:
                 rm = list(G.edges('vm'+n, data=True))
                 G.remove_edges_from(rm)
 
@@ -1624,17 +1805,20 @@ def remove_truncate(G, md, tol=None):
     branches = dict(md.elements(element_type='branch'))
     buses = dict(md.elements(element_type='bus'))
 
+    def truncated(factors):
+        # names of the factors that are small relative to the largest one
+        abs_factors = np.abs(np.fromiter(factors.values(), float, count=len(factors)))
+        is_small = abs_factors / abs_factors.max() < tol
+        return [n for n, small in zip(factors, is_small) if small]
+
     if tol is not None:
         for k, branch in branches.items():
-            maxP = max([abs(df) for df in branch['ptdf'].values()])
-            maxQ = max([abs(df) for df in branch['qtdf'].values()])
-            remove_p = [('pf'+k, 'pg'+n) for n,df in branch['ptdf'].items() if abs(df)/maxP < tol]
-            remove_q = [('qf'+k, 'qg'+n) for n,df in branch['qtdf'].items() if abs(df)/maxQ < tol]
+            remove_p = [('pf'+k, 'pg'+n) for n in truncated(branch['ptdf'])]
+            remove_q = [('qf'+k, 'qg'+n) for n in truncated(branch['qtdf'])]
             G.remove_edges_from(remove_p)
             G.remove_edges_from(remove_q)
         for m, bus in buses.items():
-            maxV = max([abs(df) for df in bus['vdf'].values()])
-            remove_v = [('pg'+n, 'vm'+m) for n,df in bus['vdf'].items() if abs(df)/maxV < tol]
+            remove_v = [('pg'+n, 'vm'+m) for n in truncated(bus['vdf'])]
             G.remove_edges_from(remove_v)
 
     rm_edges = num_edges - networkx.number_of_edges(G)
@@ -130,16 +130,18 @@ def solve_time(md):
 
 def num_buses(md):
 
-    bus_attrs = md.attributes(element_type='bus')
-    val = len(bus_attrs['names'])
+    # count the elements directly; md.attributes would transpose
+    # every attribute of every bus just to read off the names
+    val = sum(1 for _ in md.elements(element_type='bus'))
 
     return val
 
 
 def num_branches(md):
 
-    branch_attrs = md.attributes(element_type='branch')
-    val = len(branch_attrs['names'])
+    # count the elements directly; md.attributes would transpose
+    # every attribute of every branch just to read off the names
+    val = sum(1 for _ in md.elements(element_type='branch'))
 
     return val
 
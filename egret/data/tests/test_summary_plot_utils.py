@@ -0,0 +1,425 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+'''
+Tests the summary_plot_utils tables and data frames against reference
+implementations of the original row-by-row loops, on a small synthetic
+case data frame with repeated and missing (case, model, mult) rows
+'''
+import os
+import json
+import math
+import copy
+
+import pytest
+import numpy as np
+import pandas as pd
+import networkx
+import matplotlib
+matplotlib.use('Agg')
+from scipy.stats.mstats import gmean, tmean
+
+import egret.data.lopf_utils as lu
+import egret.data.summary_plot_utils as spu
+from egret.data.model_data import ModelData
+
+desc_list = ['base_model','trim','build_mode']
+count_list = ['optimal','infeasible','duals','internalSolverError','maxIterations','maxTimeLimit','solverFailure']
+gmean_list = ['solve_time_normalized','total_cost_normalized','acpf_slack','num_variables','num_constraints','num_nonzeros']
+tmean_list = ['vm_viol_sum','vm_viol_max','thermal_viol_sum','thermal_viol_max']
+
+# (model, base_model, trim, build_mode)
+models = [('acopf', 'acopf', 'full', 'default'),
+          ('slopf', 'slopf', 'full', 'default'),
+          ('dlopf_full', 'dlopf', 'full', 'default'),
+          ('dlopf_lazy_e2', 'dlopf', 'e2', 'lazy'),
+          ('btheta', 'btheta', 'full', 'default'),
+          ]
+# (case, long_case, num_buses)
+cases = [('case5_pjm', 'pglib_opf_case5_pjm', 5),
+         ('case14_ieee', 'pglib_opf_case14_ieee', 14),
+         ('case24_ieee_rts', 'pglib_opf_case24_ieee_rts', 24),
+         ]
+mults = [0.9, 1.0, 1.1]
+
+# rows left out of, and rows repeated in, the synthetic case data;
+# every (model, case) with more than one row keeps a mult == 1 row
+missing = {('case14_ieee', 'btheta', m) for m in mults} | \
+          {('case24_ieee_rts', 'dlopf_lazy_e2', 1.1)} | \
+          {('case24_ieee_rts', 'slopf', m) for m in (1.0, 1.1)}
+repeated = [('case5_pjm', 'dlopf_full', 1.0),
+            ('case5_pjm', 'slopf', 1.0),
+            ('case14_ieee', 'slopf', 0.9),
+            ('case24_ieee_rts', 'btheta', 1.1),
+            ]
+
+
+def _case_data():
+    rng = np.random.default_rng(0)
+    rows = []
+    def _row(case, long_case, num_buses, model, base_model, trim, build_mode, mult):
+        row = {'case' : case, 'long_case' : long_case, 'model' : model, 'mult' : mult,
+               'num_buses' : num_buses, 'base_model' : base_model, 'trim' : trim, 'build_mode' : build_mode}
+        for col in count_list:
+            row[col] = bool(rng.random() < 0.7)
+        for col in gmean_list + tmean_list + ['solve_time', 'total_cost', 'balance_slack', 'speedup']:
+            row[col] = rng.lognormal()
+        ## some zero and missing values
+        row['acpf_slack'] = [0., np.nan, rng.lognormal()][int(rng.integers(3))]
+        row['vm_viol_max'] = [np.nan, rng.lognormal()][int(rng.integers(2))]
+        return row
+    for case, long_case, num_buses in cases:
+        for model, base_model, trim, build_mode in models:
+            for mult in mults:
+                if (case, model, mult) in missing:
+                    continue
+                rows.append(_row(case, long_case, num_buses, model, base_model, trim, build_mode, mult))
+                if (case, model, mult) in repeated:
+                    rows.append(_row(case, long_case, num_buses, model, base_model, trim, build_mode, mult))
+    index = ['{}_{}_{:04.0f}_{}'.format(r['long_case'], r['model'], 1000*r['mult'], i) for i, r in enumerate(rows)]
+    return pd.DataFrame(rows, index=index)
+
+
+@pytest.fixture
+def summary_dir(tmp_path, monkeypatch):
+    def get_summary_file_location(folder):
+        location = os.path.join(str(tmp_path), folder)
+        os.makedirs(location, exist_ok=True)
+        return location
+    monkeypatch.setattr(lu, 'get_summary_file_location', get_summary_file_location)
+    return get_summary_file_location('data')
+
+
+@pytest.fixture
+def case_data(summary_dir):
+    df = _case_data()
+    for filename in ('case_data.csv', 'case_data_all.csv'):
+        df.to_csv(os.path.join(summary_dir, filename))
+    return pd.read_csv(os.path.join(summary_dir, 'case_data.csv'), index_col=0)
+
+
+def _read_output(summary_dir, filename):
+    return pd.read_csv(os.path.join(summary_dir, filename), index_col=0)
+
+def _round_trip(df, summary_dir):
+    path = os.path.join(summary_dir, '_expected.csv')
+    df.to_csv(path)
+    return pd.read_csv(path, index_col=0)
+
+def _assert_output_equal(summary_dir, filename, expected):
+    pd.testing.assert_frame_equal(_read_output(summary_dir, filename),
+                                  _round_trip(expected, summary_dir),
+                                  check_dtype=False)
+
+
+## reference implementations of the original loops
+def _sort_desc(df):
+    return df.sort_values(by=['base_model','build_mode','trim'], ascending=[1,1,0])
+
+def _reference_table1(df):
+    model_list = list(set(df.model.values))
+    df1 = pd.DataFrame(data=None, index=model_list, columns=desc_list+count_list)
+    for idx in model_list:
+        _df = df[df.model==idx]
+        dummy_row = _df.iloc[0]
+        for col in desc_list:
+            df1.loc[idx, col] = dummy_row[col]
+        for col in count_list:
+            _col = _df[col].replace({'True' : 1, 'False' : 0})
+            df1.loc[idx, col] = sum(_col.astype(int))
+    return _sort_desc(df1)
+
+def _reference_table2(df):
+    model_list = list(set(df.model.values))
+    df2 = pd.DataFrame(data=None, index=model_list, columns=desc_list+gmean_list)
+    for idx in model_list:
+        _df = df[df.model == idx]
+        dummy_row = _df.iloc[0]
+        for col in desc_list:
+            df2.loc[idx, col] = dummy_row[col]
+        for col in gmean_list:
+            df_nz = _df[_df[col]!=0]
+            df2.loc[idx, col] = gmean(abs(df_nz[col].dropna()))
+    return _sort_desc(df2)
+
+def _reference_table3(df):
+    model_list = list(set(df.model.values))
+    df3_list = [c + '_avg' for c in tmean_list] + [c + '_max' for c in tmean_list]
+    df3 = pd.DataFrame(data=None, index=model_list, columns=desc_list+df3_list)
+    for idx in model_list:
+        _df = df[df.model == idx]
+        dummy_row = _df.iloc[0]
+        for col in desc_list:
+            df3.loc[idx, col] = dummy_row[col]
+        for col in tmean_list:
+            df3.loc[idx, col + '_avg'] = tmean(_df[col].dropna())
+        ## the builtin max over a column with NaN values depended on the row order
+        for col in tmean_list:
+            df3.loc[idx, col + '_max'] = _df[col].max()
+    return _sort_desc(df3)
+
+def _reference_table(df_in, col_name):
+    model_list = list(set(df_in.model.values))
+    case_list = lu.case_names
+    df_out = pd.DataFrame(data=None, index=model_list, columns=desc_list+case_list)
+    for idx in model_list:
+        _df = df_in[df_in.model==idx]
+        dummy_row = _df.iloc[0]
+        for col in desc_list:
+            df_out.loc[idx, col] = dummy_row[col]
+        for case in case_list:
+            _case = _df[_df.long_case==case]
+            if len(_case.index) == 1:
+                df_out.loc[idx, case] = _case.iloc[0][col_name]
+            elif len(_case.index) > 1:
+                _case = _case[_case.mult==1]
+                df_out.loc[idx, case] = _case.iloc[0][col_name]
+    df_out = _sort_desc(df_out)
+
+    df_top = pd.DataFrame(data=None, index=['case', 'num_buses'], columns=case_list)
+    for case in case_list:
+        _df = df_in[df_in.long_case==case]
+        if not _df.empty:
+            dummy_row = _df.iloc[0]
+            df_top.loc['case',case] = dummy_row['case']
+            df_top.loc['num_buses',case] = dummy_row['num_buses']
+    df_out = pd.concat([df_top, df_out], sort=False)
+
+    empty_cols = [col for col in df_out.columns if df_out[col].isnull().all()]
+    return df_out.drop(empty_cols, axis=1)
+
+def _reference_nominal_case_data(df, column):
+    df = df[df['mult'] == 1.0]
+    idx_list = []
+    [idx_list.append(x) for x in df['case'].values if x not in idx_list]
+    col_list = ['slopf','dlopf_full','dlopf_lazy_e2','clopf_full','clopf_lazy_e2','plopf_full','plopf_lazy_e2','ptdf_full','ptdf_lazy_e2','btheta']
+    data = pd.DataFrame(data=None, index=idx_list, columns=col_list)
+    for index, row in df.iterrows():
+        if row['model'] in col_list:
+            data.loc[row['case'], row['model']] = row[column]
+    return data.sort_index(axis=1)
+
+def _reference_sensitivity(df, case_name, model_list, y_data):
+    df = df[df.long_case==case_name]
+    df = df[df.model.isin(model_list)]
+    idx_list = sorted(set(df.mult.values))
+    df_data = pd.DataFrame(data=None, index=idx_list, columns=model_list)
+    for idx, row in df.iterrows():
+        df_data.loc[row.mult, row.model] = row[y_data]
+    return df_data
+
+def _reference_normalize_solve_time(df_data, model_benchmark='acopf'):
+    df_benchmark = df_data[df_data.model==model_benchmark]
+    arr = [a for a in df_benchmark.solve_time.values if a != 0]
+    gm_benchmark = gmean(arr)
+    df_data['solve_time_normalized'] = df_data['solve_time'] / gm_benchmark
+    df_data['speedup'] = gm_benchmark / df_data['solve_time']
+    return df_data
+
+def _reference_normalize_total_cost(df_data, model_benchmark='acopf'):
+    df_data = df_data.sort_values(by='mult')
+    df_benchmark = df_data[df_data['model']==model_benchmark]
+    for idx, row in df_data.iterrows():
+        tc2 = df_benchmark[df_benchmark.mult==row.mult].total_cost.values.item()
+        df_data.loc[idx, 'total_cost_normalized'] = row.total_cost / tc2
+    return df_data
+
+def _reference_model_desc(name):
+    build_mode = 'lazy' if 'lazy' in name else 'default'
+    if any(e in name for e in ['e5','e4','e3','e2']):
+        trim = name[-2:]
+    else:
+        trim = 'full'
+    base_model = name
+    for r in [s for s in ['_lazy','_full','_e5','_e4','_e3','_e2'] if s in name]:
+        base_model = base_model.replace(r,'')
+    return base_model, trim, build_mode
+
+
+def test_case_data_has_repeated_and_missing_rows(case_data):
+    keys = case_data.groupby(['case','model','mult']).size()
+    assert (keys > 1).sum() == len(repeated)
+    assert len(keys) == len(cases)*len(models)*len(mults) - len(missing)
+
+
+def test_create_table1_solverstatus(summary_dir, case_data):
+    spu.create_table1_solverstatus(case_data)
+    _assert_output_equal(summary_dir, 'table1_solverstatus.csv', _reference_table1(case_data))
+
+
+def test_create_table2_timeandcost(summary_dir, case_data):
+    spu.create_table2_timeandcost(case_data)
+    _assert_output_equal(summary_dir, 'table2_timeandcost.csv', _reference_table2(case_data))
+
+
+def test_create_table3_violations(summary_dir, case_data):
+    spu.create_table3_violations(case_data)
+    _assert_output_equal(summary_dir, 'table3_violations.csv', _reference_table3(case_data))
+
+
+@pytest.mark.parametrize('col_name', ['acpf_slack', 'solve_time'])
+def test_create_table(summary_dir, case_data, col_name):
+    spu.create_table(case_data, col_name)
+    _assert_output_equal(summary_dir, 'table_' + col_name + '.csv', _reference_table(case_data, col_name))
+
+
+@pytest.mark.parametrize('column', ['solve_time', 'speedup'])
+def test_nominal_case_data(summary_dir, case_data, column):
+    spu.nominal_case_data(column)
+    _assert_output_equal(summary_dir, 'case_data_' + column + '.csv',
+                         _reference_nominal_case_data(case_data, column))
+
+
+@pytest.mark.parametrize('long_case', [c[1] for c in cases])
+def test_generate_sensitivity(summary_dir, case_data, long_case):
+    model_dict = {'slopf' : True, 'dlopf_full' : True, 'dlopf_lazy_e2' : False, 'btheta' : True}
+    model_list = [m for m, v in model_dict.items() if v]
+    spu.generate_sensitivity(long_case, model_dict, y_data='acpf_slack', show_plot=False)
+    _assert_output_equal(summary_dir, 'sensitivity_' + long_case + '_acpf_slack.csv',
+                         _reference_sensitivity(case_data, long_case, model_list, 'acpf_slack'))
+
+
+@pytest.mark.parametrize('long_case', [c[1] for c in cases])
+def test_normalize(case_data, long_case):
+    df = case_data[case_data.long_case == long_case].drop(columns=['solve_time_normalized','total_cost_normalized','speedup'])
+    ## one benchmark row per demand multiplier
+    df = df[~((df.model == 'acopf') & df.duplicated(subset=['model','mult']))]
+
+    expected = _reference_normalize_total_cost(_reference_normalize_solve_time(df.copy()))
+    result = spu.normalize_total_cost(spu.normalize_solve_time(df.copy()))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_read_json_files(tmp_path, summary_dir, monkeypatch):
+    long_case = 'pglib_opf_case5_pjm'
+    folder = tmp_path / 'solutions'
+    folder.mkdir()
+    model_names = ['acopf', 'slopf', 'dlopf_full', 'dlopf_lazy_e2', 'clopf_lazy_e4', 'plopf_e5', 'ptdf_lazy_full']
+    for i, model in enumerate(model_names):
+        for mult in mults:
+            filename = '{}_{}_{:04.0f}'.format(long_case, model, 1000*mult)
+            md_dict = {'elements' : {}, 'system' : {'filename' : filename, 'mult' : mult,
+                                                     'solve_time' : 1. + i + mult, 'total_cost' : 100.*(1. + i*mult)}}
+            with open(os.path.join(str(folder), filename + '.json'), 'w') as f:
+                json.dump(md_dict, f)
+
+    def solve_time(md):
+        return md.data['system']['solve_time']
+    def total_cost(md):
+        return md.data['system']['total_cost']
+    monkeypatch.setattr(lu, 'get_solution_file_location', lambda test_case: str(folder))
+    monkeypatch.setattr(spu, 'summary_functions', {'solve_time' : {'function' : solve_time, 'summarizers' : ['avg'], 'dtype' : 'float64'},
+                                                   'total_cost' : {'function' : total_cost, 'summarizers' : ['avg'], 'dtype' : 'float64'}})
+    monkeypatch.setattr(spu, 'SF_DTYPES', {'solve_time' : 'float64', 'total_cost' : 'float64'})
+
+    df = spu.read_json_files(long_case)
+    assert len(df.index) == len(model_names)*len(mults)
+    for name, row in df.iterrows():
+        assert (row['base_model'], row['trim'], row['build_mode']) == _reference_model_desc(row['model'])
+
+    expected = df.drop(columns=['solve_time_normalized','speedup','total_cost_normalized'])
+    expected = _reference_normalize_total_cost(_reference_normalize_solve_time(expected))
+    pd.testing.assert_frame_equal(df.sort_index(), expected.sort_index()[df.columns], check_dtype=False)
+
+
+def _graph_data():
+    rng = np.random.default_rng(1)
+    bus_names = ['b{}'.format(i) for i in range(6)]
+    branch_names = ['l{}'.format(i) for i in range(8)]
+    buses = {}
+    for n in bus_names:
+        vmin, vmax = 0.95, 1.05
+        buses[n] = {'v_min' : vmin, 'v_max' : vmax, 'vm' : rng.uniform(vmin, vmax),
+                    'vdf' : {m : rng.normal() for m in bus_names}}
+    branches = {}
+    for k in branch_names:
+        branches[k] = {'rating_long_term' : 2., 'pf' : rng.normal(), 'pt' : rng.normal(),
+                       'qf' : 0.5*rng.normal(), 'qt' : 0.5*rng.normal(),
+                       'ptdf' : {n : rng.normal() for n in bus_names},
+                       'qtdf' : {n : rng.normal() for n in bus_names}}
+    md = ModelData({'elements' : {'bus' : buses, 'branch' : branches}, 'system' : {}})
+
+    G = networkx.Graph()
+    for k in branch_names:
+        for n in bus_names:
+            G.add_edge('pf'+k, 'pg'+n)
+            G.add_edge('qf'+k, 'qg'+n)
+    for m in bus_names:
+        for n in bus_names:
+            G.add_edge('pg'+n, 'vm'+m)
+    return G, md
+
+def _reference_remove_unmonitored(G, md, s_tol=None, v_tol=None):
+    branches = dict(md.elements(element_type='branch'))
+    buses = dict(md.elements(element_type='bus'))
+    if s_tol is not None:
+        for k,branch in branches.items():
+            sp = math.sqrt(max(branch['pf']**2 + branch['qf']**2, branch['pt']**2 + branch['qt']**2))
+            if 1 - sp / branch['rating_long_term'] > s_tol:
+                G.remove_edges_from(list(G.edges('pf'+k, data=True)))
+                G.remove_edges_from(list(G.edges('qf'+k, data=True)))
+    if v_tol is not None:
+        for n,bus in buses.items():
+            slack = (bus['vm'] - bus['v_min']) / (bus['v_max'] - bus['v_min'])
+            if slack < v_tol or (1-slack) < v_tol:
+                G.remove_edges_from(list(G.edges('vm'+n, data=True)))
+
+def _reference_remove_truncate(G, md, tol=None):
+    branches = dict(md.elements(element_type='branch'))
+    buses = dict(md.elements(element_type='bus'))
+    if tol is not None:
+        for k, branch in branches.items():
+            maxP = max([abs(df) for df in branch['ptdf'].values()])
+            maxQ = max([abs(df) for df in branch['qtdf'].values()])
+            G.remove_edges_from([('pf'+k, 'pg'+n) for n,df in branch['ptdf'].items() if abs(df)/maxP < tol])
+            G.remove_edges_from([('qf'+k, 'qg'+n) for n,df in branch['qtdf'].items() if abs(df)/maxQ < tol])
+        for m, bus in buses.items():
+            maxV = max([abs(df) for df in bus['vdf'].values()])
+            G.remove_edges_from([('pg'+n, 'vm'+m) for n,df in bus['vdf'].items() if abs(df)/maxV < tol])
+
+def _edge_set(G):
+    return {frozenset(e) for e in G.edges()}
+
+
+@pytest.mark.parametrize('s_tol, v_tol', [(0.3, None), (None, 0.2), (0.3, 0.2)])
+def test_remove_unmonitored(s_tol, v_tol):
+    G, md = _graph_data()
+    G_ref = copy.deepcopy(G)
+    spu.remove_unmonitored(G, md, s_tol=s_tol, v_tol=v_tol)
+    _reference_remove_unmonitored(G_ref, md, s_tol=s_tol, v_tol=v_tol)
+    assert _edge_set(G) == _edge_set(G_ref)
+    assert G.number_of_edges() < _graph_data()[0].number_of_edges()
+
+
+@pytest.mark.parametrize('tol', [0.1, 0.5])
+def test_remove_truncate(tol):
+    G, md = _graph_data()
+    G_ref = copy.deepcopy(G)
+    spu.remove_truncate(G, md, tol=tol)
+    _reference_remove_truncate(G_ref, md, tol=tol)
+    assert _edge_set(G) == _edge_set(G_ref)
+    assert G.number_of_edges() < _graph_data()[0].number_of_edges()
+
+
+def test_read_data_file_csv(summary_dir, case_data):
+    df = spu.read_data_file('case_data.csv')
+    pd.testing.assert_frame_equal(df, case_data, check_dtype=False)
+    columns = ['case','model','mult','solve_time']
+    df = spu.read_data_file('case_data.csv', columns=columns)
+    pd.testing.assert_frame_equal(df, case_data[columns], check_dtype=False)
+    assert spu.read_data_file('no_such_file.csv') is None
+
+
+def test_parquet_round_trip(summary_dir, case_data):
+    pytest.importorskip('pyarrow')
+    spu.save_data_file(case_data, filename='case_data.parquet')
+    pd.testing.assert_frame_equal(spu.read_data_file('case_data.parquet'), case_data)
+    ## a parquet copy is preferred to an older csv of the same name
+    os.utime(os.path.join(summary_dir, 'case_data.csv'), (0, 0))
+    pd.testing.assert_frame_equal(spu.read_data_file('case_data.csv'), case_data)
@@ -20,6 +20,7 @@ from egret.data.data_utils import zip_items
 from pyomo.core.util import quicksum
 from pyomo.core.expr.numeric_expr import LinearExpression
 from collections import OrderedDict
+from itertools import compress
 from pyomo.contrib.fbbt.fbbt import fbbt
 import warnings
 import logging
@@ -658,9 +659,7 @@ def get_power_flow_expr_ptdf_approx(model, branch_name, PTDF, rel_ptdf_tol=None,
     if abs_ptdf_tol is None:
         abs_ptdf_tol = 0.
 
-    const = PTDF.get_branch_ptdf_const(branch_name)
-
-    max_coef = PTDF.get_branch_ptdf_abs_max(branch_name)
+    buses, ptdf_row, max_coef, const = PTDF.get_branch_ptdf_data(branch_name)
 
     ptdf_tol = max(abs_ptdf_tol, rel_ptdf_tol*max_coef) 
     ## NOTE: It would be easy to hold on to the 'ptdf' dictionary here,
@@ -671,7 +670,7 @@ def get_power_flow_expr_ptdf_approx(model, branch_name, PTDF, rel_ptdf_tol=None,
     ## to build these dense constraints much faster
     coef_list = []
     var_list = []
-    for bus_name, coef in PTDF.get_branch_ptdf_iterator(branch_name):
+    for bus_name, coef in zip(buses, ptdf_row):
         if abs(coef) >= ptdf_tol:
             coef_list.append(coef)
             var_list.append(m_p_nw[bus_name])
@@ -779,6 +778,9 @@ def declare_eq_branch_power_qtdf_approx(model, index_set, PTDF=None, rel_ptdf_to
     if PTDF is None:
         return
 
+    ## calculate all the rows we need at once
+    PTDF._get_qtdf_rows(con_set)
+
     for branch_name in con_set:
         expr = \
             get_power_flow_expr_qtdf_approx(m, branch_name, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol)
@@ -798,22 +800,16 @@ def get_branch_loss_expr_ptdf_approx(model, branch_name, PTDF, rel_ptdf_tol=None
     if abs_ptdf_tol is None:
         abs_ptdf_tol = 0.
 
-    const = PTDF.get_branch_losses_phase_shift(branch_name)
-    const += PTDF.get_branch_ldf_c(branch_name)
-    const += PTDF.get_branch_phi_losses_adj(branch_name)
-
-    max_coef = PTDF.get_branch_ldf_abs_max(branch_name)
+    buses, ldf_row, max_coef, const = PTDF.get_branch_ldf_data(branch_name)
 
     ptdf_tol = max(abs_ptdf_tol, rel_ptdf_tol*max_coef) 
     m_p_nw = model.p_nw
     ## if model.p_nw is Var, we can use LinearExpression
-    ## to build these dense constraints much faster
-    coef_list = []
-    var_list = []
-    for bus_name, coef in PTDF.get_branch_ldf_iterator(branch_name):
-        if abs(coef) >= ptdf_tol:
-            coef_list.append(coef)
-            var_list.append(m_p_nw[bus_name])
+    ## to build these dense constraints much faster;
+    ## select the coefficients over the tolerance at once
+    keep = abs(ldf_row) >= ptdf_tol
+    coef_list = ldf_row[keep].tolist()
+    var_list = [ m_p_nw[bus_name] for bus_name in compress(buses, keep) ]
 
     if isinstance(m_p_nw, pe.Var):
         expr = LinearExpression(linear_vars=var_list, linear_coefs=coef_list, constant=const)
@@ -908,6 +904,9 @@ def declare_eq_branch_loss_plf_approx(model, index_set, PTDF=None, rel_ptdf_tol=
     if PTDF is None:
         return
 
+    ## calculate all the rows we need at once
+    PTDF._get_pldf_rows(con_set)
+
     for branch_name in con_set:
         expr = \
             get_branch_pfl_expr_approx(m, branch_name, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol)
@@ -937,6 +936,9 @@ def declare_eq_branch_loss_qlf_approx(model, index_set, PTDF=None, rel_ptdf_tol=
     if PTDF is None:
         return
 
+    ## calculate all the rows we need at once
+    PTDF._get_qldf_rows(con_set)
+
     for branch_name in con_set:
         expr = \
             get_branch_qfl_expr_approx(m, branch_name, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol)
@@ -642,6 +642,9 @@ def declare_eq_bus_vm_approx(model, index_set, PTDF=None, rel_ptdf_tol=None, abs
     if PTDF is None:
         return
 
+    ## calculate all the rows we need at once
+    PTDF._get_vdf_rows(con_set)
+
     for bus_name in con_set:
         expr = \
             get_vm_expr_ptdf_approx(m, bus_name, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol)
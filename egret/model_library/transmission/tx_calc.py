@@ -22,6 +22,16 @@ import networkx as nx
 from math import cos, sin
 from egret.model_library.defn import BasePointType, ApproximationType
 from egret.common.log import logger
+try:
+    import scikits.umfpack as umfpack
+    umfpack_available = True
+except ImportError:
+    umfpack_available = False
+try:
+    import pypardiso
+    pypardiso_available = True
+except ImportError:
+    pypardiso_available = False
 
 def calculate_conductance(branch):
     rs = branch['resistance']
@@ -35,6 +45,20 @@ def calculate_susceptance(branch):
     return -xs / (rs**2 + xs**2)
 
 
+def calculate_transformer_phase_shift_terms(resistance, reactance, shift, tap):
+    '''
+    Computes, for arrays of branch resistances, reactances,
+    phase shifts (in degrees), and tap ratios, the phase shift terms
+    of the real power flow, b*(phi/tau), and of the real power
+    losses, (g/tau)*phi**2, in one pass sharing the intermediates
+    '''
+    denom = resistance**2 + reactance**2
+    phi = np.deg2rad(shift)
+    flow_terms = (-reactance / denom) * (phi/tap)
+    losses_terms = ((resistance / denom)/tap) * phi**2
+    return flow_terms, losses_terms
+
+
 def calculate_y_matrix_from_branch(branch):
     rs = branch['resistance']
     xs = branch['reactance']
@@ -548,14 +572,20 @@ def calculate_phase_shift_flow_adjuster(branches, index_set_branch):
 
     idx_col = 0
 
+    shift = []
+    tap = []
+
     for idx_row, branch_name in enumerate(index_set_branch):
         branch = branches[branch_name]
         if branch['branch_type'] == 'transformer' and branch['transformer_phase_shift'] != 0.:
-            val = -(1./branch['reactance']) * (math.radians(branch['transformer_phase_shift'])/branch['transformer_tap_ratio'])
-
             row.append(idx_row)
             col.append(idx_col)
-            data.append(val)
+            data.append(-(1./branch['reactance']))
+            shift.append(branch['transformer_phase_shift'])
+            tap.append(branch['transformer_tap_ratio'])
+
+    ## convert the phase shifts to radians all at once
+    data = np.array(data) * (np.deg2rad(shift)/np.array(tap))
 
     phase_shift_flow_adjuster = sp.coo_matrix((data, (row,col)), shape=(_len_branch,1))
     return phase_shift_flow_adjuster.tocsc()
@@ -575,6 +605,7 @@ def calculate_phi_constant(branches,index_set_branch,index_set_bus,approximation
     row_to = []
     col = []
     data = []
+    shift = []
 
     for idx_col, branch_name in enumerate(index_set_branch):
         branch = branches[branch_name]
@@ -582,17 +613,17 @@ def calculate_phi_constant(branches,index_set_branch,index_set_bus,approximation
         to_bus = branch['to_bus']
 
         if branch['branch_type'] == 'transformer':
-            shift = math.radians(branch['transformer_phase_shift'])
+            shift.append(branch['transformer_phase_shift'])
         else: # shift == 0
             continue
 
-        b = _get_susceptance(branch, approximation_type)
-        b *= shift
-
         row_from.append(mapping_bus_to_idx[from_bus])
         row_to.append(mapping_bus_to_idx[to_bus])
         col.append(idx_col)
-        data.append(b)
+        data.append(_get_susceptance(branch, approximation_type))
+
+    ## convert the phase shifts to radians all at once
+    data = np.array(data) * np.deg2rad(shift)
 
     phi_from = sp.coo_matrix((data,(row_from,col)), shape=(_len_bus,_len_branch))
     phi_to = sp.coo_matrix((data,(row_to,col)), shape=(_len_bus,_len_branch))
@@ -611,8 +642,8 @@ def calculate_phi_adjust(branches,index_set_branch,index_set_bus,approximation_t
     _len_branch = len(index_set_branch)
 
     row = []
-    col = []
-    data = []
+    b = []
+    shift = []
 
     for idx_col, branch_name in enumerate(index_set_branch):
         branch = branches[branch_name]
@@ -620,20 +651,21 @@ def calculate_phi_adjust(branches,index_set_branch,index_set_bus,approximation_t
         to_bus = branch['to_bus']
 
         if branch['branch_type'] == 'transformer' and branch['transformer_phase_shift'] != 0.:
-            shift = math.radians(branch['transformer_phase_shift'])
+            shift.append(branch['transformer_phase_shift'])
         else: # shift == 0
             continue
 
-        b = _get_susceptance(branch, approximation_type)
-        b *= shift
-
         row.append(mapping_bus_to_idx[from_bus])
-        col.append(0)
-        data.append(b)
-
         row.append(mapping_bus_to_idx[to_bus])
-        col.append(0)
-        data.append(-b)
+        b.append(_get_susceptance(branch, approximation_type))
+
+    ## convert the phase shifts to radians all at once; each
+    ## transformer has a from entry and a (negated) to entry
+    b = np.array(b) * np.deg2rad(shift)
+    data = np.empty(2*len(b))
+    data[0::2] = b
+    data[1::2] = -b
+    col = np.zeros(len(data), dtype=int)
 
     phi_adjust = sp.coo_matrix((data,(row,col)), shape=(_len_bus,1))
 
@@ -655,6 +687,7 @@ def calculate_phi_loss_constant(branches,index_set_branch,index_set_bus,approxim
     row_to = []
     col = []
     data = []
+    shift = []
 
     for idx_col, branch_name in enumerate(index_set_branch):
         branch = branches[branch_name]
@@ -662,23 +695,27 @@ def calculate_phi_loss_constant(branches,index_set_branch,index_set_bus,approxim
         to_bus = branch['to_bus']
 
         tau = 1.0
-        shift = 0.0
         if branch['branch_type'] == 'transformer':
             tau = branch['transformer_tap_ratio']
-            shift = math.radians(branch['transformer_phase_shift'])
+            shift.append(branch['transformer_phase_shift'])
+        else:
+            shift.append(0.)
 
         g = 0.
         if approximation_type == ApproximationType.PTDF:
             r = branch['resistance']
-            g = (1/r)*(1/tau)*shift**2
+            g = (1/r)*(1/tau)
         elif approximation_type == ApproximationType.PTDF_LOSSES:
-            g = calculate_conductance(branch)*(1/tau)*shift**2
+            g = calculate_conductance(branch)*(1/tau)
 
         row_from.append(mapping_bus_to_idx[from_bus])
         row_to.append(mapping_bus_to_idx[to_bus])
         col.append(idx_col)
         data.append(g)
 
+    ## convert the phase shifts to radians all at once
+    data = np.array(data) * np.deg2rad(shift)**2
+
     phi_loss_from = sp.coo_matrix((data,(row_from,col)),shape=(_len_bus,_len_branch))
     phi_loss_to = sp.coo_matrix((data,(row_to,col)),shape=(_len_bus,_len_branch))
 
@@ -849,13 +886,68 @@ def _calculate_K0_const_qloss(branches,buses,index_set_branch,base_point=BasePoi
     return K0_const
 
 
+class _FactorizationAdapter:
+    '''
+    Makes a factorization from another sparse linear solver
+    look like a scipy SuperLU object, i.e., provides
+    solve(rhs, trans) for one or many right-hand sides
+    '''
+    def __init__(self, solve, shape, multiple_rhs=True):
+        self._solve = solve
+        self.shape = shape
+        self._multiple_rhs = multiple_rhs
+
+    def solve(self, rhs, trans='N'):
+        if rhs.ndim == 2 and not self._multiple_rhs:
+            return np.column_stack([ self._solve(rhs[:,j], trans) for j in range(rhs.shape[1]) ])
+        return self._solve(rhs, trans)
+
+def factorize_ptdf_matrix(M, linear_solver='superlu'):
+    '''
+    Factorizes the (symmetric) matrix M = A^T B_d A with the reference
+    bus removed, using the sparse linear solver linear_solver, which
+    can be one of 'superlu' (scipy), 'umfpack' (scikits.umfpack),
+    or 'pardiso' (pypardiso)
+    '''
+    if linear_solver == 'superlu':
+        return scipy.sparse.linalg.splu(M)
+    if linear_solver == 'umfpack':
+        if not umfpack_available:
+            raise ImportError("linear_solver 'umfpack' requires scikits.umfpack")
+        ## UmfpackLU.solve has no transposed solve, so we
+        ## keep the UMFPACK context and pick the system to solve
+        M = M.tocsc()
+        if M.indices.dtype == np.int32 and M.indptr.dtype == np.int32:
+            context = umfpack.UmfpackContext('di')
+        else:
+            M.indices = M.indices.astype(np.int64)
+            M.indptr = M.indptr.astype(np.int64)
+            context = umfpack.UmfpackContext('dl')
+        context.numeric(M)
+        systems = { 'N' : umfpack.UMFPACK_A, 'T' : umfpack.UMFPACK_At }
+        def _solve(rhs, trans):
+            rhs = np.ascontiguousarray(rhs, dtype=np.float64)
+            return context.solve(systems[trans], M, rhs, autoTranspose=False)
+        return _FactorizationAdapter(_solve, M.shape, multiple_rhs=False)
+    if linear_solver == 'pardiso':
+        if not pypardiso_available:
+            raise ImportError("linear_solver 'pardiso' requires pypardiso")
+        M = M.tocsr()
+        solver = pypardiso.PyPardisoSolver()
+        solver.factorize(M)
+        ## M is symmetric, so the transposed solve is the same
+        return _FactorizationAdapter(lambda rhs, trans: solver.solve(M, rhs), M.shape)
+    raise ValueError(f"Unrecognized linear_solver {linear_solver}; "
+                      "must be one of 'superlu', 'umfpack', or 'pardiso'")
+
 def calculate_ptdf_factorization(branches,buses,index_set_branch,index_set_bus,reference_bus,
                                  base_point=BasePointType.FLATSTART,
                                  contingencies=None,
                                  mapping_bus_to_idx=None,
                                  mapping_branch_to_idx=None,
                                  interfaces=None,
-                                 index_set_interface=None):
+                                 index_set_interface=None,
+                                 linear_solver='superlu'):
 
     if interfaces is None:
         assert index_set_interface is None
@@ -897,8 +989,15 @@ def calculate_ptdf_factorization(branches,buses,index_set_branch,index_set_bus,r
     # bus removed
     M = At_masked@B_dA
 
+    ## the contingency compensators are built
+    ## from the SuperLU factors
+    if contingencies and linear_solver != 'superlu':
+        logger.warning("WARNING: contingencies require the 'superlu' linear_solver, "
+                       "ignoring linear_solver={}".format(linear_solver))
+        linear_solver = 'superlu'
+
     ## LU factorization
-    MLU_MP = scipy.sparse.linalg.splu(M)
+    MLU_MP = factorize_ptdf_matrix(M, linear_solver)
 
     if contingencies:
         #TODO: (FDF factorization) need to use MLU_MP from basic DC power flow, not from linearized AC
@@ -1128,6 +1227,22 @@ class _ContingencyCompensator:
     @property
     def Pc(self):
         return self._global()._Pc
+    @property
+    def perm_r(self):
+        return self._global()._perm_r
+    @property
+    def perm_c(self):
+        return self._global()._perm_c
+
+def _permutation_indices(P):
+    '''
+    returns perm such that P[i, perm[i]] == 1 for the
+    permutation matrix P
+    '''
+    P = P.tocoo()
+    perm = np.empty(P.shape[0], dtype=np.int64)
+    perm[P.row] = P.col
+    return perm
 
 class _ContingencyCompensators(abc.Mapping):
     def __init__(self, compensators, L, U, Pr, Pc):
@@ -1138,6 +1253,10 @@ class _ContingencyCompensators(abc.Mapping):
         self._U = U
         self._Pr = Pr
         self._Pc = Pc
+        ## index forms of the permutations, so x@Pc is
+        ## y[perm_c] = x and Pr.T@x is x[perm_r]
+        self._perm_r = _permutation_indices(Pr.T)
+        self._perm_c = _permutation_indices(Pc)
 
     def __getitem__(self, key):
         return self._compensators[key]
@@ -1160,7 +1279,70 @@ class _ContingencyCompensators(abc.Mapping):
     @property
     def Pc(self): 
         return self._Pc
-
+    @property
+    def perm_r(self):
+        return self._perm_r
+    @property
+    def perm_c(self):
+        return self._perm_c
+
+
+def _calculate_permutation_matrices(MLU_MP):
+    _bus_len = MLU_MP.shape[0]
+    ## each column has a single entry, so the CSC arrays can be built
+    ## directly (and are canonical) rather than converted from COO;
+    ## Pr has Pr[perm_r[j], j] == 1 and Pc has Pc[i, perm_c[i]] == 1
+    indptr = np.arange(_bus_len+1)
+    Pr = sp.csc_matrix((np.ones(_bus_len), MLU_MP.perm_r, indptr), shape=(_bus_len,_bus_len), copy=False)
+    Pc = sp.csc_matrix((np.ones(_bus_len), np.argsort(MLU_MP.perm_c), indptr), shape=(_bus_len,_bus_len), copy=False)
+    Pr.has_canonical_format = True
+    Pc.has_canonical_format = True
+    return Pr, Pc
+
+def _factor_triangular(T):
+    ## shouldn't need to re-order
+    splu_options = {
+                     "Equil":False,
+                     "ColPerm":"NATURAL",
+                     #"DiagPivotThresh":0.0,
+                   }
+    return sp.linalg.splu(T,options=splu_options)
+
+class _TriangularLU:
+    '''
+    Stands in for a scipy SuperLU object, given its
+    (picklable) L and U factors and row and column
+    permutations, such that A = Pr.T @ (L @ U) @ Pc.T
+    '''
+    def __init__(self, L, U, perm_r, perm_c):
+        self.L = L
+        self.U = U
+        self.perm_r = perm_r
+        self.perm_c = perm_c
+        self.shape = L.shape
+        self._L_factor = _factor_triangular(L)
+        self._U_factor = _factor_triangular(U)
+
+    def solve(self, rhs, trans='N'):
+        y = np.empty(np.shape(rhs), dtype=np.float64)
+        if trans == 'N':
+            y[self.perm_r] = rhs
+            return self._U_factor.solve(self._L_factor.solve(y))[self.perm_c]
+        y[self.perm_c] = rhs
+        return self._L_factor.solve(self._U_factor.solve(y, 'T'), 'T')[self.perm_r]
+
+def rebuild_contingency_compensators(MLU, compensator_data):
+    '''
+    Rebuilds the contingency compensators from the
+    factorization MLU and a dictionary mapping contingency
+    names to their (M, c, W, Wbar, phi_compensator,
+    VA_compensator, branch_out) data
+    '''
+    Pr, Pc = _calculate_permutation_matrices(MLU)
+    compensators = { cn : _ContingencyCompensator(*data) for cn, data in compensator_data.items() }
+    return _ContingencyCompensators(compensators=compensators,
+                                    L=_factor_triangular(MLU.L), U=_factor_triangular(MLU.U),
+                                    Pr=Pr, Pc=Pc)
 
 def precompute_contingency_matricies( graph, MLU_MP, A, Bd,\
                                       mapping_bus_to_idx,  mapping_branch_to_idx, 
@@ -1193,17 +1375,10 @@ def precompute_contingency_matricies( graph, MLU_MP, A, Bd,\
     
     ## things for every possible modification
     _bus_len = A.shape[1]
-    Pr = sp.csc_matrix((np.ones(_bus_len), (MLU_MP.perm_r, np.arange(_bus_len))))
-    Pc = sp.csc_matrix((np.ones(_bus_len), (np.arange(_bus_len), MLU_MP.perm_c)))
+    Pr, Pc = _calculate_permutation_matrices(MLU_MP)
 
-    ## shouldn't need to re-order
-    splu_options = {
-                     "Equil":False,
-                     "ColPerm":"NATURAL",
-                     #"DiagPivotThresh":0.0,
-                   }
-    L_factor = sp.linalg.splu(MLU_MP.L,options=splu_options)
-    U_factor = sp.linalg.splu(MLU_MP.U,options=splu_options)
+    L_factor = _factor_triangular(MLU_MP.L)
+    U_factor = _factor_triangular(MLU_MP.U)
 
     buff = np.zeros((_bus_len,1))
 
@@ -1302,7 +1477,74 @@ def _calculate_interface_matrix(interfaces, index_set_interface, mapping_branch_
     return I
 
 
-def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.FLATSTART,sparse_index_set_branch=None,mapping_bus_to_idx=None):
+## use the cycle-space PTDF calculation when the number of
+## independent cycles is below this fraction of the number of buses
+_cycle_space_ratio = 0.35
+
+def _spanning_tree_mask(A):
+    '''
+    returns a boolean mask over the columns (branches) of the
+    adjacency matrix A for a spanning tree of the network
+    '''
+    A = A.tocsc()
+    A.sort_indices()
+    parent = list(range(A.shape[0]))
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    tree = np.zeros(A.shape[1], dtype=bool)
+    for e in range(A.shape[1]):
+        u, v = A.indices[A.indptr[e]:A.indptr[e+1]]
+        ru, rv = _find(u), _find(v)
+        if ru != rv:
+            parent[ru] = rv
+            tree[e] = True
+    return tree
+
+def _calculate_ptdf_cycle_space(J, A, ref_bus_mask):
+    '''
+    Calculates the dense PTDF matrix (with the reference bus column
+    removed) by the cycle-space formulation: the injections are first
+    balanced by flows on a spanning tree, which are then corrected by
+    loop flows around a cycle basis so the result satisfies KVL. This
+    requires solving a system the size of the number of independent
+    cycles rather than the number of buses.
+
+    Returns None if J is not a diagonal scaling of A^T (i.e., of
+    the form B_d A^T), in which case this formulation does not apply.
+    '''
+    A = A.tocsc()
+    At = A.T.tocsr()
+    ## branch weights, s.t. J = diag(w) A^T
+    w = np.asarray(J.multiply(At).sum(axis=1)).ravel() / np.asarray(abs(At).sum(axis=1)).ravel()
+    if not np.all(w != 0.):
+        return None
+    J_w = sp.diags(w)@At
+    if abs(J - J_w).max() > 1e-10*abs(J).max():
+        return None
+
+    tree = _spanning_tree_mask(A)
+    A_r = A[ref_bus_mask,:]
+
+    ## tree flows balancing a unit injection at each bus
+    n_r = A_r.shape[0]
+    F0 = np.zeros((A.shape[1], n_r))
+    tree_LU = scipy.sparse.linalg.splu(A_r[:,tree].tocsc())
+    F0[tree] = tree_LU.solve(np.eye(n_r))
+
+    ## cycle basis: each non-tree branch closed by tree flows
+    not_tree = np.flatnonzero(~tree)
+    C = -(A_r[:,not_tree].T@F0.T).T
+    C[not_tree, np.arange(len(not_tree))] += 1.
+
+    ## loop flows y s.t. C^T X (F0 - C y) = 0, X = diag(1/w)
+    XC = C/w[:,None]
+    Y = np.linalg.solve(C.T@XC, XC.T@F0)
+    return F0 - C@Y
+
+def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.FLATSTART,sparse_index_set_branch=None,mapping_bus_to_idx=None,cycle_space=False):
     """
     Calculates the sensitivity of the voltage angle to real power injections
     Parameters
@@ -1325,6 +1567,10 @@ def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,b
     mapping_bus_to_idx: dict
         A map from bus names to indices for matrix construction. If None,
         will be inferred from index_set_bus.
+    cycle_space: bool
+        If True, a dense PTDF matrix of a connected network with few
+        independent cycles relative to its buses is calculated in cycle
+        space; if False (default), the bus-angle system is always solved
     """
     _len_bus = len(index_set_bus)
 
@@ -1359,14 +1605,19 @@ def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,b
         # (B_d A) with reference bus column removed
         B_dA = J[:,ref_bus_mask].A
 
-        if connected:
+        PTDF = None
+        if cycle_space and connected and (_len_branch - _len_bus + 1) < _cycle_space_ratio*_len_bus:
+            ## few cycles relative to buses, so the cycle-space
+            ## system is (much) smaller than J0
+            PTDF = _calculate_ptdf_cycle_space(J, A, ref_bus_mask)
+        if PTDF is None and connected:
             try:
                 PTDF = np.linalg.solve(J0.T.A, B_dA.T).T
             except np.linalg.LinAlgError:
                 logger.warning("Matrix not invertible. Calculating pseudo-inverse instead.")
                 SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
                 PTDF = np.matmul(B_dA,SENSI)
-        else:
+        elif PTDF is None:
             logger.warning("Using pseudo-inverse method as network is disconnected")
             SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
             PTDF = np.matmul(B_dA,SENSI)
@@ -0,0 +1,538 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+'''
+ptdf_utils and ptdf_options tester
+'''
+import os
+import copy
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pyomo.environ as pe
+import egret.model_library.transmission.tx_calc as tx_calc
+import egret.data.ptdf_utils as ptdf_utils
+from egret.data.model_data import ModelData
+from egret.model_library.defn import BasePointType
+from egret.common.lazy_ptdf_utils import populate_default_ptdf_options
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+case300 = os.path.join(current_dir, 'transmission_test_instances', 'dcopf_losses_solution_files',
+                       'pglib_opf_case300_ieee_ptdf_dcopf_losses_solution.json')
+scuc_masked = os.path.join(current_dir, 'uc_test_instances', 'test_scuc_masked.json')
+
+
+def _spanning_tree(branches, buses):
+    '''
+    returns the names of the branches of a spanning tree of the network
+    '''
+    parent = {b : b for b in buses}
+    def _find(b):
+        while parent[b] != b:
+            parent[b] = parent[parent[b]]
+            b = parent[b]
+        return b
+    tree = []
+    for bn, branch in branches.items():
+        f, t = _find(branch['from_bus']), _find(branch['to_bus'])
+        if f != t:
+            parent[f] = t
+            tree.append(bn)
+    return tree
+
+
+class TestCycleSpacePTDF(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        md = ModelData.read(case300)
+        self.branches = dict(md.elements(element_type='branch'))
+        self.buses = dict(md.elements(element_type='bus'))
+        self.reference_bus = md.data['system']['reference_bus']
+        self.tree = _spanning_tree(self.branches, self.buses)
+
+    def _calculate_ptdf(self, branches, cycle_space):
+        return tx_calc.calculate_ptdf(branches, self.buses, tuple(branches), tuple(self.buses),
+                                      self.reference_bus, BasePointType.FLATSTART, cycle_space=cycle_space)
+
+    def _check_cycle_space(self, branches):
+        '''
+        checks the cycle-space PTDF matrix is calculated and matches the primal one
+        '''
+        cycle_space_ptdfs = []
+        def _cycle_space(*args, **kwargs):
+            PTDF = tx_calc_cycle_space(*args, **kwargs)
+            cycle_space_ptdfs.append(PTDF)
+            return PTDF
+        tx_calc_cycle_space = tx_calc._calculate_ptdf_cycle_space
+
+        with mock.patch.object(tx_calc, '_calculate_ptdf_cycle_space', _cycle_space):
+            PTDF_cycle = self._calculate_ptdf(branches, cycle_space=True)
+        self.assertEqual(len(cycle_space_ptdfs), 1)
+        self.assertIsNotNone(cycle_space_ptdfs[0])
+
+        with mock.patch.object(tx_calc, '_calculate_ptdf_cycle_space', _cycle_space):
+            PTDF_primal = self._calculate_ptdf(branches, cycle_space=False)
+        self.assertEqual(len(cycle_space_ptdfs), 1)
+
+        np.testing.assert_allclose(PTDF_cycle, PTDF_primal, rtol=0., atol=1e-10)
+
+    def test_radial(self):
+        branches = {bn : self.branches[bn] for bn in self.tree}
+        self._check_cycle_space(branches)
+
+    def test_weakly_meshed(self):
+        tree = set(self.tree)
+        not_tree = [bn for bn in self.branches if bn not in tree][:40]
+        branches = {bn : branch for bn, branch in self.branches.items() if bn in tree or bn in not_tree}
+        self._check_cycle_space(branches)
+
+    def test_meshed(self):
+        ## case300 has too many cycles for the default ratio
+        with mock.patch.object(tx_calc, '_cycle_space_ratio', 1.):
+            self._check_cycle_space(self.branches)
+
+    def test_cycle_space_ptdf_option(self):
+        branches = {bn : self.branches[bn] for bn in self.tree}
+        PTDFMs = {}
+        ## off by default
+        self.assertFalse(populate_default_ptdf_options({})['cycle_space_ptdf'])
+        for cycle_space in (True, False):
+            ptdf_options = populate_default_ptdf_options({'cycle_space_ptdf' : cycle_space})
+            with mock.patch.object(tx_calc, '_calculate_ptdf_cycle_space',
+                                   wraps=tx_calc._calculate_ptdf_cycle_space) as cycle_space_calc:
+                PTDF = ptdf_utils.PTDFMatrix(branches, self.buses, self.reference_bus,
+                                             BasePointType.FLATSTART, ptdf_options)
+            self.assertEqual(cycle_space_calc.called, cycle_space)
+            PTDFMs[cycle_space] = PTDF.PTDFM
+        np.testing.assert_allclose(PTDFMs[True], PTDFMs[False], rtol=0., atol=1e-10)
+
+
+def _net_withdrawal_block(buses_keys):
+    '''
+    returns a block with a p_nw variable populated with
+    a (deterministic) net withdrawal at every bus
+    '''
+    m = pe.ConcreteModel()
+    m.p_nw = pe.Var(buses_keys, initialize={ b : np.sin(i) for i, b in enumerate(buses_keys) })
+    return m
+
+
+class TestSavedFactorization(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        md = ModelData.read(scuc_masked)
+        self.branches = dict(md.elements(element_type='branch'))
+        self.buses = dict(md.elements(element_type='bus'))
+        self.contingencies = dict(md.elements(element_type='contingency'))
+        self.reference_bus = md.data['system']['reference_bus']
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, 'factorization.pickle')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _virtual_ptdf(self, branches):
+        ptdf_options = populate_default_ptdf_options({'save_factorization_path' : self.path})
+        return ptdf_utils.VirtualPTDFMatrix(branches, self.buses, self.reference_bus,
+                                            BasePointType.FLATSTART, ptdf_options,
+                                            contingencies=self.contingencies)
+
+    def test_round_trip(self):
+        PTDF = self._virtual_ptdf(self.branches)
+        self.assertTrue(os.path.isfile(self.path))
+
+        with mock.patch.object(tx_calc, 'calculate_ptdf_factorization') as calc_factorization:
+            PTDF_loaded = self._virtual_ptdf(self.branches)
+        calc_factorization.assert_not_called()
+        self.assertIsInstance(PTDF_loaded.MLU, tx_calc._TriangularLU)
+        self.assertEqual(PTDF.contingency_compensators.keys(), PTDF_loaded.contingency_compensators.keys())
+
+        for bn in PTDF.branches_keys_masked:
+            np.testing.assert_allclose(PTDF_loaded.get_branch_ptdf_data(bn).row,
+                                       PTDF.get_branch_ptdf_data(bn).row, rtol=0., atol=1e-10)
+
+        for cn in PTDF.contingency_compensators:
+            for bn in PTDF.branches_keys_masked[::5]:
+                np.testing.assert_allclose(
+                        [ v for _,v in PTDF_loaded.get_contingency_branch_ptdf_iterator(cn, bn) ],
+                        [ v for _,v in PTDF.get_contingency_branch_ptdf_iterator(cn, bn) ],
+                        rtol=0., atol=1e-10)
+
+        m = _net_withdrawal_block(PTDF.buses_keys)
+        PFV, PFV_I, VA = PTDF.calculate_masked_PFV(m)
+        PFV_loaded, PFV_I_loaded, VA_loaded = PTDF_loaded.calculate_masked_PFV(m)
+        np.testing.assert_allclose(PFV_loaded, PFV, rtol=0., atol=1e-10)
+        np.testing.assert_allclose(VA_loaded, VA, rtol=0., atol=1e-10)
+
+        PFV_deltas = dict(PTDF.calculate_masked_PFV_deltas(PFV, VA))
+        PFV_deltas_loaded = dict(PTDF_loaded.calculate_masked_PFV_deltas(PFV_loaded, VA_loaded))
+        self.assertEqual(PFV_deltas.keys(), PFV_deltas_loaded.keys())
+        for cn, PFV_delta in PFV_deltas.items():
+            np.testing.assert_allclose(PFV_deltas_loaded[cn], PFV_delta, rtol=0., atol=1e-10)
+
+    def test_topology_mismatch(self):
+        self._virtual_ptdf(self.branches)
+
+        branches = copy.deepcopy(self.branches)
+        next(iter(branches.values()))['reactance'] *= 2.
+
+        ## a factorization for another network is never unpickled
+        with mock.patch.object(ptdf_utils.pickle, 'load') as pickle_load, \
+             mock.patch.object(tx_calc, 'calculate_ptdf_factorization',
+                               wraps=tx_calc.calculate_ptdf_factorization) as calc_factorization:
+            self._virtual_ptdf(branches)
+        pickle_load.assert_not_called()
+        calc_factorization.assert_called_once()
+
+
+class TestNetWithdrawals(unittest.TestCase):
+
+    def test_updated_net_withdrawals(self):
+        md = ModelData.read(scuc_masked)
+        PTDF = ptdf_utils.VirtualPTDFMatrix(dict(md.elements(element_type='branch')),
+                                            dict(md.elements(element_type='bus')),
+                                            md.data['system']['reference_bus'],
+                                            BasePointType.FLATSTART, populate_default_ptdf_options({}))
+        m = _net_withdrawal_block(PTDF.buses_keys)
+        m_new = _net_withdrawal_block(PTDF.buses_keys)
+        for i, b in enumerate(PTDF.buses_keys):
+            m_new.p_nw[b].value = np.cos(i)
+        PFV_new = PTDF.calculate_PFV(m_new)[0]
+
+        ## new values of the same variables
+        PTDF.calculate_PFV(m)
+        for b in PTDF.buses_keys:
+            m.p_nw[b].value = m_new.p_nw[b].value
+        np.testing.assert_allclose(PTDF.calculate_PFV(m)[0], PFV_new, rtol=0., atol=1e-12)
+
+        ## a replaced component
+        m_orig = _net_withdrawal_block(PTDF.buses_keys)
+        PFV_orig = PTDF.calculate_PFV(m_orig)[0]
+        m.del_component(m.p_nw)
+        m.p_nw = pe.Param(PTDF.buses_keys, initialize={ b : m_orig.p_nw[b].value for b in PTDF.buses_keys })
+        np.testing.assert_allclose(PTDF.calculate_PFV(m)[0], PFV_orig, rtol=0., atol=1e-12)
+
+
+class TestMaskedPFVDelta(unittest.TestCase):
+
+    def test_without_csr_matvec(self):
+        md = ModelData.read(scuc_masked)
+        PTDF = ptdf_utils.VirtualPTDFMatrix(dict(md.elements(element_type='branch')),
+                                            dict(md.elements(element_type='bus')),
+                                            md.data['system']['reference_bus'],
+                                            BasePointType.FLATSTART, populate_default_ptdf_options({}),
+                                            contingencies=dict(md.elements(element_type='contingency')))
+        m = _net_withdrawal_block(PTDF.buses_keys)
+        PFV, PFV_I, VA = PTDF.calculate_masked_PFV(m)
+
+        for cn in PTDF.contingency_compensators:
+            PFV_delta = PTDF.calculate_masked_PFV_delta(cn, PFV, VA)
+            with mock.patch.object(ptdf_utils, 'csr_matvec_available', False):
+                PFV_delta_fallback = PTDF.calculate_masked_PFV_delta(cn, PFV, VA)
+            np.testing.assert_allclose(PFV_delta_fallback, PFV_delta, rtol=0., atol=1e-12)
+
+
+def _phase_shifter_ptdf():
+    '''
+    returns a VirtualPTDFMatrix for test_scuc_masked with two of its
+    contingency branches made phase shifters, one monitored and one
+    not, and a kV threshold which leaves about half the branches monitored
+    '''
+    md = ModelData.read(scuc_masked)
+    branches = dict(md.elements(element_type='branch'))
+    buses = dict(md.elements(element_type='bus'))
+    for i, bus_name in enumerate(sorted(buses)):
+        buses[bus_name]['base_kv'] = 138. if i % 4 == 0 else 230.
+    for bn in ('A2', 'A5'):
+        branches[bn].update(branch_type='transformer', transformer_tap_ratio=1., transformer_phase_shift=10.)
+
+    ptdf_options = populate_default_ptdf_options({'branch_kv_threshold' : 200., 'kv_threshold_type' : 'both'})
+    return ptdf_utils.VirtualPTDFMatrix(branches, buses, md.data['system']['reference_bus'],
+                                        BasePointType.FLATSTART, ptdf_options,
+                                        contingencies=dict(md.elements(element_type='contingency')))
+
+
+class TestContingencyRows(unittest.TestCase):
+
+    def test_precompute_contingency_rows(self):
+        PTDF = _phase_shifter_ptdf()
+        pairs = [ (cn, bn) for cn in PTDF.contingency_compensators
+                           for bn in PTDF.branches_keys_masked ]
+        expected = { key : PTDF._get_contingency_row(*key).copy() for key in pairs }
+        expected_abs_max = dict(PTDF._contingency_abs_max)
+
+        PTDF._contingency_rows.clear()
+        PTDF._contingency_abs_max.clear()
+        PTDF.precompute_contingency_rows(max_workers=4)
+        self.assertEqual(set(PTDF._contingency_rows.keys()), set(pairs))
+        for key in pairs:
+            np.testing.assert_allclose(PTDF._contingency_rows[key], expected[key], rtol=0., atol=1e-10)
+            self.assertAlmostEqual(PTDF._contingency_abs_max[key], expected_abs_max[key], places=10)
+
+    def test_batched_contingency_rows(self):
+        PTDF = _phase_shifter_ptdf()
+        pairs = [ (cn, bn) for cn in PTDF.contingency_compensators
+                           for bn in PTDF.branches_keys_masked[::3] ]
+        expected = { key : PTDF._get_contingency_row(*key).copy() for key in pairs }
+
+        PTDF._contingency_rows.clear()
+        PTDF._get_contingency_rows(pairs)
+        for key in pairs:
+            np.testing.assert_allclose(PTDF._contingency_rows[key], expected[key], rtol=0., atol=1e-10)
+
+
+class TestPFVDeltas(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.PTDF = _phase_shifter_ptdf()
+        self.m = _net_withdrawal_block(self.PTDF.buses_keys)
+
+    def _check_PFV_deltas(self, masked, contingencies=None, chunk_size=64):
+        PTDF = self.PTDF
+        PFV, PFV_I, VA = PTDF._calculate_PFV(self.m, masked)
+        PFV_deltas = dict(PTDF._calculate_PFV_deltas(PFV, VA, masked, contingencies=contingencies,
+                                                     chunk_size=chunk_size))
+        if contingencies is None:
+            contingencies = list(PTDF.contingency_compensators)
+        self.assertEqual(list(PFV_deltas), list(contingencies))
+        for cn in contingencies:
+            np.testing.assert_allclose(PFV_deltas[cn], PTDF._calculate_PFV_delta(cn, PFV, VA, masked),
+                                       rtol=0., atol=1e-10)
+
+    def test_phase_shifters(self):
+        compensators = self.PTDF.contingency_compensators
+        shifted = [ compensators[cn].branch_out for cn in compensators
+                    if compensators[cn].VA_compensator is not None ]
+        self.assertEqual(sorted(shifted), ['A2', 'A5'])
+        self.assertNotIn('A2', self.PTDF.branchname_to_index_masked_map)
+        self.assertIn('A5', self.PTDF.branchname_to_index_masked_map)
+
+    def test_masked(self):
+        self._check_PFV_deltas(masked=True)
+        self._check_PFV_deltas(masked=True, chunk_size=5)
+        PFV, PFV_I, VA = self.PTDF.calculate_masked_PFV(self.m)
+        for cn, PFV_delta in self.PTDF.calculate_masked_PFV_deltas(PFV, VA):
+            np.testing.assert_allclose(PFV_delta, self.PTDF.calculate_masked_PFV_delta(cn, PFV, VA),
+                                       rtol=0., atol=1e-10)
+
+    def test_unmasked(self):
+        self._check_PFV_deltas(masked=False)
+        self._check_PFV_deltas(masked=False, chunk_size=5)
+
+    def test_contingency_subset(self):
+        contingencies = ['A5', 'A1', 'A2']
+        self._check_PFV_deltas(masked=True, contingencies=contingencies, chunk_size=2)
+        self._check_PFV_deltas(masked=False, contingencies=contingencies, chunk_size=2)
+
+
+class TestRowCacheSize(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        md = ModelData.read(scuc_masked)
+        branches = dict(md.elements(element_type='branch'))
+        buses = dict(md.elements(element_type='bus'))
+        contingencies = dict(md.elements(element_type='contingency'))
+        reference_bus = md.data['system']['reference_bus']
+
+        self.PTDFs = {}
+        for row_cache_size in (None, 1):
+            ptdf_options = populate_default_ptdf_options({'row_cache_size' : row_cache_size})
+            self.PTDFs[row_cache_size] = ptdf_utils.VirtualPTDFMatrix(branches, buses, reference_bus,
+                                                                      BasePointType.FLATSTART, ptdf_options,
+                                                                      contingencies=contingencies)
+        PTDF = self.PTDFs[None]
+        self.contingency_pairs = [ (cn, bn) for cn in PTDF.contingency_compensators
+                                            for bn in PTDF.branches_keys_masked[::7] ]
+
+    def _model(self, PTDF):
+        m = _net_withdrawal_block(PTDF.buses_keys)
+        m.x = pe.Var()
+        m.ineq_branch_thermal_bounds = pe.Constraint(PTDF.branches_keys_masked[::3], rule=lambda m, bn: m.x <= 1)
+        m.ineq_pf_contingency_branch_thermal_bounds = pe.Constraint(self.contingency_pairs[::2],
+                                                                    rule=lambda m, cn, bn: m.x <= 1)
+        m.bal = pe.Constraint(expr=m.x >= 0)
+        m.dual = pe.Suffix(direction=pe.Suffix.IMPORT)
+        for i, constr in enumerate(m.component_data_objects(pe.Constraint)):
+            m.dual[constr] = np.cos(i)
+        return m
+
+    def test_ptdf_rows(self):
+        PTDF, PTDF_bounded = self.PTDFs[None], self.PTDFs[1]
+        ## the second pass recomputes the evicted rows
+        for _ in range(2):
+            for bn in PTDF.branches_keys_masked:
+                row_data = PTDF.get_branch_ptdf_data(bn)
+                row_data_bounded = PTDF_bounded.get_branch_ptdf_data(bn)
+                np.testing.assert_allclose(row_data_bounded.row, row_data.row, rtol=0., atol=1e-12)
+                self.assertAlmostEqual(row_data_bounded.abs_max, row_data.abs_max, places=12)
+                self.assertAlmostEqual(row_data_bounded.const, row_data.const, places=12)
+                self.assertLessEqual(len(PTDF_bounded._ptdf_rows), 1)
+
+    def test_contingency_rows(self):
+        PTDF, PTDF_bounded = self.PTDFs[None], self.PTDFs[1]
+        for _ in range(2):
+            for cn, bn in self.contingency_pairs:
+                np.testing.assert_allclose(
+                        [ v for _,v in PTDF_bounded.get_contingency_branch_ptdf_iterator(cn, bn) ],
+                        [ v for _,v in PTDF.get_contingency_branch_ptdf_iterator(cn, bn) ],
+                        rtol=0., atol=1e-12)
+                self.assertLessEqual(len(PTDF_bounded._contingency_rows), 1)
+
+    def test_lmp_and_contingency_flows(self):
+        PTDF, PTDF_bounded = self.PTDFs[None], self.PTDFs[1]
+        m = self._model(PTDF)
+        for _ in range(2):
+            np.testing.assert_allclose(PTDF_bounded.calculate_LMP(m, m.dual, m.bal),
+                                       PTDF.calculate_LMP(m, m.dual, m.bal), rtol=0., atol=1e-10)
+            flows = PTDF.calculate_monitored_contingency_flows(m)
+            flows_bounded = PTDF_bounded.calculate_monitored_contingency_flows(m)
+            self.assertEqual(flows.keys(), flows_bounded.keys())
+            for key, flow in flows.items():
+                self.assertAlmostEqual(flows_bounded[key], flow, places=10)
+
+
+class TestDensePTDFDtype(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        md = ModelData.read(case300)
+        self.branches = dict(md.elements(element_type='branch'))
+        self.buses = dict(md.elements(element_type='bus'))
+        self.reference_bus = md.data['system']['reference_bus']
+
+    def _ptdfs(self, ptdf_class, base_point):
+        PTDFs = {}
+        for dtype in ('float64', 'float32'):
+            ptdf_options = populate_default_ptdf_options({'dense_ptdf_dtype' : dtype})
+            PTDFs[dtype] = ptdf_class(self.branches, self.buses, self.reference_bus,
+                                      base_point, ptdf_options)
+        self.assertEqual(PTDFs['float32'].PTDFM.dtype, np.float32)
+        return PTDFs['float64'], PTDFs['float32']
+
+    def test_ptdf_matrix(self):
+        PTDF, PTDF32 = self._ptdfs(ptdf_utils.PTDFMatrix, BasePointType.FLATSTART)
+        np.testing.assert_allclose(PTDF32.PTDFM, PTDF.PTDFM, rtol=0., atol=1e-6)
+
+        m = _net_withdrawal_block(PTDF.buses_keys)
+        PFV, PFV_I = PTDF.calculate_PFV(m)
+        PFV32, PFV_I32 = PTDF32.calculate_PFV(m)
+        self.assertEqual(PFV32.dtype, np.float64)
+        np.testing.assert_allclose(PFV32, PFV, rtol=1e-5, atol=1e-5)
+
+        for bn in PTDF.branches_keys[::10]:
+            self.assertAlmostEqual(PTDF32.get_branch_ptdf_abs_max(bn), PTDF.get_branch_ptdf_abs_max(bn), places=6)
+            self.assertAlmostEqual(PTDF32.get_branch_ptdf_const(bn), PTDF.get_branch_ptdf_const(bn), places=5)
+
+    def test_ptdf_losses_matrix(self):
+        PTDF, PTDF32 = self._ptdfs(ptdf_utils.PTDFLossesMatrix, BasePointType.SOLUTION)
+        self.assertEqual(PTDF32.LDF.dtype, np.float32)
+        np.testing.assert_allclose(PTDF32.PTDFM, PTDF.PTDFM, rtol=0., atol=1e-6)
+        np.testing.assert_allclose(PTDF32.LDF, PTDF.LDF, rtol=0., atol=1e-6)
+
+
+class TestLossFactorResiduals(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        md = ModelData.read(case300)
+        branches = dict(md.elements(element_type='branch'))
+        buses = dict(md.elements(element_type='bus'))
+        self.FDF = ptdf_utils.VirtualFDFpqMatrix(branches, buses, md.data['system']['reference_bus'],
+                                                 BasePointType.SOLUTION, populate_default_ptdf_options({}))
+        self.rows = self.FDF.branches_keys_masked[::10]
+
+    def test_lossfactor_residuals(self):
+        FDF = self.FDF
+        factor = np.array([ v for _,v in FDF.get_lossfactor_iterator() ])
+        factor_adj = np.zeros(len(FDF.buses_keys))
+        offset_adj = 0.
+        for bn in self.rows:
+            factor_adj[FDF.ref_bus_mask] += [ v for _,v in FDF.get_branch_pldf_iterator(bn) ]
+            offset_adj += FDF.get_branch_pldf_const(bn)
+        FDF._update_lossfactor_residuals()
+        np.testing.assert_allclose([ v for _,v in FDF.get_lossfactor_resid_iterator() ],
+                                   factor - factor_adj, rtol=0., atol=1e-10)
+        self.assertAlmostEqual(FDF.get_lossoffset_resid(), FDF.get_lossoffset() - offset_adj, places=10)
+
+    def test_qlossfactor_residuals(self):
+        FDF = self.FDF
+        factor = np.array([ v for _,v in FDF.get_qlossfactor_iterator() ])
+        factor_adj = np.zeros(len(FDF.buses_keys))
+        offset_adj = 0.
+        for bn in self.rows:
+            factor_adj += [ v for _,v in FDF.get_branch_qldf_iterator(bn) ]
+            offset_adj += FDF.get_branch_qldf_const(bn)
+        FDF._update_qlossfactor_residuals()
+        np.testing.assert_allclose([ v for _,v in FDF.get_qlossfactor_resid_iterator() ],
+                                   factor - factor_adj, rtol=0., atol=1e-10)
+        self.assertAlmostEqual(FDF.get_qlossoffset_resid(), FDF.get_qlossoffset() - offset_adj, places=10)
+
+
+class TestLinearSolver(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        md = ModelData.read(scuc_masked)
+        self.branches = dict(md.elements(element_type='branch'))
+        self.buses = dict(md.elements(element_type='bus'))
+        self.reference_bus = md.data['system']['reference_bus']
+
+    def _virtual_ptdf(self, linear_solver):
+        ptdf_options = populate_default_ptdf_options({'linear_solver' : linear_solver})
+        return ptdf_utils.VirtualPTDFMatrix(self.branches, self.buses, self.reference_bus,
+                                            BasePointType.FLATSTART, ptdf_options)
+
+    def test_superlu(self):
+        PTDF = self._virtual_ptdf('superlu')
+        self.assertTrue(hasattr(PTDF.MLU, 'perm_r'))
+
+    def test_missing_backend(self):
+        with mock.patch.object(tx_calc, 'umfpack_available', False):
+            with self.assertRaises(ImportError):
+                self._virtual_ptdf('umfpack')
+        with mock.patch.object(tx_calc, 'pypardiso_available', False):
+            with self.assertRaises(ImportError):
+                self._virtual_ptdf('pardiso')
+
+    def _check_backend(self, linear_solver):
+        '''
+        checks the PTDF rows, which use transposed solves, and
+        the flows, which use non-transposed solves, against superlu
+        '''
+        PTDF = self._virtual_ptdf('superlu')
+        PTDF_backend = self._virtual_ptdf(linear_solver)
+        for bn in PTDF.branches_keys_masked:
+            np.testing.assert_allclose(PTDF_backend.get_branch_ptdf_data(bn).row,
+                                       PTDF.get_branch_ptdf_data(bn).row, rtol=0., atol=1e-8)
+        m = _net_withdrawal_block(PTDF.buses_keys)
+        for PFV_backend, PFV in zip(PTDF_backend.calculate_PFV(m), PTDF.calculate_PFV(m)):
+            np.testing.assert_allclose(PFV_backend, PFV, rtol=0., atol=1e-8)
+
+    @unittest.skipUnless(tx_calc.umfpack_available, "scikits.umfpack not available")
+    def test_umfpack(self):
+        self._check_backend('umfpack')
+
+    @unittest.skipUnless(tx_calc.pypardiso_available, "pypardiso not available")
+    def test_pardiso(self):
+        self._check_backend('pardiso')
+
+    def test_unknown_solver(self):
+        with self.assertRaises(ValueError):
+            self._virtual_ptdf('mumps')
+
+
+if __name__ == '__main__':
+    unittest.main()